@@ -0,0 +1,101 @@
+"""
+Upstream SSE ayrıştırma mikro benchmark'ı: eski yol (httpx aiter_lines + 'data: ' kontrolü
++ json.loads) ile services.sse.SSEDecoder + fast_json.loads yolunu kaydedilmiş OpenRouter
+akışları üzerinde karşılaştırır. Akış, ağdan geliyormuş gibi rastgele byte sınırlarından bölünür.
+
+Kullanım (backend dizininden):
+    python -m bench.bench_sse_parser --repeat 200
+    python -m bench.bench_sse_parser --file kayit1.sse --file kayit2.sse --chunk-size 512
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import httpx
+from services.sse import aiter_sse_data, DONE
+from services.fast_json import loads
+
+DEFAULT_FILE = os.path.join(os.path.dirname(__file__), "data", "openrouter_stream.sse")
+
+
+def split_chunks(raw: bytes, chunk_size: int, seed: int) -> list[bytes]:
+    """Ham akışı ortalama chunk_size büyüklüğünde, rastgele sınırlardan böler."""
+    rng = random.Random(seed)
+    chunks, position = [], 0
+    while position < len(raw):
+        size = rng.randint(1, chunk_size * 2)
+        chunks.append(raw[position:position + size])
+        position += size
+    return chunks
+
+
+class ReplayStream(httpx.AsyncByteStream):
+    def __init__(self, chunks: list[bytes]):
+        self.chunks = chunks
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def _response(chunks: list[bytes]) -> httpx.Response:
+    return httpx.Response(200, headers={"content-type": "text/event-stream"}, stream=ReplayStream(chunks))
+
+
+async def parse_baseline(chunks: list[bytes]) -> int:
+    tokens = 0
+    async for line in _response(chunks).aiter_lines():
+        if not line.strip() or not line.startswith('data: '): continue
+        data_str = line[6:]
+        if data_str == '[DONE]': continue
+        delta = json.loads(data_str).get("choices", [{}])[0].get("delta", {})
+        if delta.get("reasoning") or delta.get("content"): tokens += 1
+    return tokens
+
+
+async def parse_fast(chunks: list[bytes]) -> int:
+    tokens = 0
+    async for data in aiter_sse_data(_response(chunks).aiter_bytes()):
+        if data == DONE: continue
+        delta = ((loads(data).get("choices") or [{}])[0]).get("delta") or {}
+        if delta.get("reasoning") or delta.get("content"): tokens += 1
+    return tokens
+
+
+async def run(parser, streams: list[list[bytes]], repeat: int) -> dict:
+    tokens = 0
+    cpu_start = time.process_time()
+    for _ in range(repeat):
+        for chunks in streams:
+            tokens += await parser(chunks)
+    cpu = time.process_time() - cpu_start
+    return {
+        "mode": parser.__name__.removeprefix("parse_"),
+        "tokens": tokens,
+        "cpu_us_per_token": round(cpu / tokens * 1e6, 3),
+        "cpu_seconds": round(cpu, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", action="append", help="Kaydedilmiş SSE akışı (birden çok verilebilir)")
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--chunk-size", type=int, default=256, help="Ortalama ağ parçası boyutu (byte)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    streams = []
+    for index, path in enumerate(args.file or [DEFAULT_FILE]):
+        with open(path, "rb") as f:
+            streams.append(split_chunks(f.read(), args.chunk_size, args.seed + index))
+
+    for mode in (parse_baseline, parse_fast):
+        print(json.dumps(asyncio.run(run(mode, streams, args.repeat))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+WebSocket çerçeveleme benchmark'ı: token başına send_json (eski yol) ile CoalescingWriter'ı
+gerçek bir uvicorn sunucusu üzerinden karşılaştırır. Sunucu ayrı bir süreçte çalışır; --streams
+eşzamanlı websockets istemcisi bağlanır ve sunucu her birine --tokens olay akıtır. Çerçeve başına
+ASGI/WebSocket maliyeti (Starlette send yolu, uvicorn çerçeveleme, soket yazımı) ölçüme dahildir.
+
+Ölçülenler: sunucu sürecinin token başına CPU süresi (process_time farkı), istemcilere ulaşan
+çerçeve sayısı, çerçeve başına token ve toplam süre. Her mod --repeats kez, sırayla çalıştırılır.
+
+Kullanım (backend dizininden):
+    python -m bench.bench_ws_writer --streams 200 --tokens 300 --interval-ms 5 --repeats 3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import httpx
+import websockets
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from services.ws_writer import CoalescingWriter
+
+app = FastAPI()
+
+
+@app.get("/cpu")
+def server_cpu():
+    return {"cpu": time.process_time()}
+
+
+@app.websocket("/ws/{mode}")
+async def stream_tokens(websocket: WebSocket, mode: str, tokens: int, interval_ms: float, window_ms: float, max_bytes: int):
+    await websocket.accept()
+    writer = CoalescingWriter(websocket, window_ms=window_ms, max_bytes=max_bytes) if mode == "coalesced" else None
+    interval = interval_ms / 1000
+    try:
+        for index in range(tokens):
+            event = {"type": "reasoning" if index < tokens // 4 else "chat_message", "content": f" token{index}", "seq": index + 1}
+            if writer is None:
+                await websocket.send_json(event)
+            else:
+                await writer.send(event)
+            await asyncio.sleep(interval)
+        if writer is None:
+            await websocket.send_json({"type": "stream_end"})
+        else:
+            await writer.send({"type": "stream_end"})
+        await websocket.receive_text()  # istemci kapatana kadar bekle
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def _client(url: str) -> tuple[int, int]:
+    frames = tokens = 0
+    async with websockets.connect(url, max_size=None) as ws:
+        while True:
+            event = json.loads(await ws.recv())
+            frames += 1
+            if event["type"] == "stream_end":
+                return frames, tokens
+            tokens += event["content"].count(" token")
+
+
+async def run(base_url: str, mode: str, args) -> dict:
+    ws_url = base_url.replace("http://", "ws://")
+    query = f"tokens={args.tokens}&interval_ms={args.interval_ms}&window_ms={args.window_ms}&max_bytes={args.max_bytes}"
+    async with httpx.AsyncClient(base_url=base_url) as http:
+        cpu_start = (await http.get("/cpu")).json()["cpu"]
+        wall_start = time.perf_counter()
+        results = await asyncio.gather(*(_client(f"{ws_url}/ws/{mode}?{query}") for _ in range(args.streams)))
+        wall = time.perf_counter() - wall_start
+        cpu = (await http.get("/cpu")).json()["cpu"] - cpu_start
+    frames = sum(result[0] for result in results)
+    tokens = sum(result[1] for result in results)
+    return {
+        "mode": mode,
+        "frames": frames,
+        "tokens_received": tokens,
+        "tokens_per_frame": round(tokens / frames, 2),
+        "server_cpu_us_per_token": round(cpu / tokens * 1e6, 2),
+        "frames_per_sec": round(frames / wall, 1),
+        "wall_seconds": round(wall, 3),
+    }
+
+
+async def _wait_ready(base_url: str):
+    async with httpx.AsyncClient(base_url=base_url) as http:
+        for _ in range(100):
+            try:
+                (await http.get("/cpu")).raise_for_status()
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError("Benchmark server did not start")
+
+
+async def main_async(args):
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "bench.bench_ws_writer:app", "--port", str(args.port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    try:
+        await _wait_ready(base_url)
+        runs = {"baseline": [], "coalesced": []}
+        for _ in range(args.repeats):
+            for mode in runs:
+                result = await run(base_url, mode, args)
+                runs[mode].append(result)
+                print(json.dumps(result))
+        summary = {
+            mode: {"median_server_cpu_us_per_token": statistics.median(r["server_cpu_us_per_token"] for r in results),
+                   "median_frames": statistics.median(r["frames"] for r in results)}
+            for mode, results in runs.items()
+        }
+        print(json.dumps({"summary": summary}))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--tokens", type=int, default=300)
+    parser.add_argument("--interval-ms", type=float, default=5.0, help="Upstream token arası süre")
+    parser.add_argument("--window-ms", type=float, default=30.0)
+    parser.add_argument("--max-bytes", type=int, default=4096)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8790)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+Sohbet döngüsü yük testi. N eşzamanlı WebSocket istemcisi /ws/chat/new ile oturum açar ve her biri
+art arda --turns mesaj gönderir; ardından /api/sessions ve /api/sessions/{id} uçlarına eşzamanlı
+okuma istekleri atılır. İstemci tarafında tur süresi, TTFT (mesaj gönderiminden ilk metin
+olayına) ve p50/p99 ölçülür. Sunucu tarafı sayılar /metrics'in test öncesi/sonrası farkından
+hesaplanır: tur başına DB sorgusu (özetleme worker'larının boşta yaptığı sorgular çıkarılarak)
+ve açık bağlantı başına bellek (RSS artışı / bağlantı).
+
+Upstream olarak bench/mock_openrouter.py kullanılır; sonuçlar ağdan ve gerçek modelden bağımsızdır.
+
+Kullanım (backend dizininden):
+    python -m bench.mock_openrouter --port 8799 --tokens 100 --tokens-per-second 100 &
+    OPENROUTER_API_URL=http://127.0.0.1:8799/api/v1/chat/completions \\
+        DATABASE_URL=sqlite+aiosqlite:///./bench.db uvicorn main:app --port 8000 &
+    python -m bench.load_test --url http://127.0.0.1:8000 --clients 50 --turns 5
+    python -m bench.load_test --clients 200 --mock-url http://127.0.0.1:8799 --mock-config '{"rate_limit_rate": 0.05}'
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import httpx
+import websockets
+
+TEXT_EVENTS = {"chat_message", "reasoning", "image"}
+
+
+def percentile(values: list[float], pct: float) -> float | None:
+    """En yakın sıra (nearest-rank) yüzdeliği."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize_ms(values: list[float]) -> dict:
+    def ms(value):
+        return None if value is None else round(value * 1000, 1)
+    return {
+        "count": len(values),
+        "p50_ms": ms(percentile(values, 50)),
+        "p90_ms": ms(percentile(values, 90)),
+        "p99_ms": ms(percentile(values, 99)),
+        "max_ms": ms(max(values) if values else None),
+    }
+
+
+def parse_metrics(text: str) -> dict[str, float]:
+    """Prometheus metin formatını 'isim{etiketler}' -> değer sözlüğüne çevirir."""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        name, _, value = line.rpartition(" ")
+        samples[name] = float(value.replace("+Inf", "inf"))
+    return samples
+
+
+def metric_total(samples: dict[str, float], name: str) -> float:
+    """Bir metriğin tüm etiket kombinasyonlarının toplamı."""
+    return sum(value for key, value in samples.items() if key == name or key.startswith(name + "{"))
+
+
+def metric_by_label(samples: dict[str, float], name: str) -> dict[str, float]:
+    """Tek etiketli bir metriğin etiket değeri -> değer sözlüğü."""
+    return {
+        key[len(name) + 1:-1].split("=", 1)[1].strip('"'): value
+        for key, value in samples.items() if key.startswith(name + "{")
+    }
+
+
+async def scrape(client: httpx.AsyncClient) -> dict[str, float]:
+    response = await client.get("/metrics")
+    response.raise_for_status()
+    return parse_metrics(response.text)
+
+
+class ChatClient:
+    def __init__(self, ws_url: str, model: str | None):
+        self.ws_url = ws_url
+        self.model = model
+        self.websocket = None
+        self.session_id: int | None = None
+        self.turn_seconds: list[float] = []
+        self.ttft_seconds: list[float] = []
+        self.errors: list[str] = []
+        self.response_chars = 0
+
+    async def connect(self):
+        query = f"?model={self.model}" if self.model else ""
+        self.websocket = await websockets.connect(f"{self.ws_url}/ws/chat/new{query}", max_size=None)
+        while self.session_id is None:
+            event = json.loads(await self.websocket.recv())
+            if event["type"] == "session_created":
+                self.session_id = event["session_id"]
+            elif event["type"] == "error":
+                raise RuntimeError(event["message"])
+
+    async def turn(self, message: str):
+        started = time.perf_counter()
+        first_token_at = None
+        await self.websocket.send(json.dumps({"type": "message", "content": message, "images": []}))
+        while True:
+            event = json.loads(await self.websocket.recv())
+            event_type = event["type"]
+            if event_type in TEXT_EVENTS:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                self.response_chars += len(event.get("content", ""))
+            elif event_type == "error":
+                self.errors.append(event["message"])
+            elif event_type == "stream_end":
+                break
+        if first_token_at is not None:
+            self.ttft_seconds.append(first_token_at - started)
+            self.turn_seconds.append(time.perf_counter() - started)
+
+    async def run(self, turns: int, message: str):
+        for index in range(turns):
+            await self.turn(f"{message} ({index + 1})")
+
+    async def close(self):
+        if self.websocket is not None:
+            await self.websocket.close()
+
+
+async def hit_session_api(http: httpx.AsyncClient, session_ids: list[int], requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    timings: dict[str, list[float]] = {"list": [], "messages": []}
+    failures = 0
+
+    async def one(index: int):
+        nonlocal failures
+        kind = "list" if index % 2 == 0 else "messages"
+        path = "/api/sessions" if kind == "list" else f"/api/sessions/{session_ids[index % len(session_ids)]}"
+        async with semaphore:
+            started = time.perf_counter()
+            response = await http.get(path)
+            timings[kind].append(time.perf_counter() - started)
+            if response.status_code != 200:
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(requests)))
+    wall = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "failures": failures,
+        "requests_per_second": round(requests / wall, 1) if wall else None,
+        "list_sessions": summarize_ms(timings["list"]),
+        "session_messages": summarize_ms(timings["messages"]),
+    }
+
+
+async def run(args) -> dict:
+    ws_url = args.url.replace("http://", "ws://").replace("https://", "wss://")
+    limits = httpx.Limits(max_connections=args.api_concurrency, max_keepalive_connections=args.api_concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=60, limits=limits) as http:
+        if args.mock_url and args.mock_config:
+            (await http.post(f"{args.mock_url}/_mock/config", json=json.loads(args.mock_config))).raise_for_status()
+
+        # Boştaki sorgu hızı (özetleme worker'larının kuyruk yoklaması); tur başına sorgudan çıkarılır
+        idle_start = await scrape(http)
+        await asyncio.sleep(args.idle_sample_seconds)
+        idle_end = await scrape(http)
+        idle_query_rate = (metric_total(idle_end, "db_queries_total") - metric_total(idle_start, "db_queries_total")) / args.idle_sample_seconds
+
+        # 1) Bağlantılar: tümü açılıp oturumlar oluşturulunca RSS farkı ölçülür
+        before_connect = idle_end
+        clients = [ChatClient(ws_url, args.model) for _ in range(args.clients)]
+        connect_started = time.perf_counter()
+        await asyncio.gather(*(client.connect() for client in clients))
+        connect_seconds = time.perf_counter() - connect_started
+        after_connect = await scrape(http)
+        rss_delta = metric_total(after_connect, "process_resident_memory_bytes") - metric_total(before_connect, "process_resident_memory_bytes")
+
+        # 2) Sohbet turları: her istemci turlarını sırayla, istemciler eşzamanlı
+        turns_started = time.perf_counter()
+        try:
+            await asyncio.gather(*(client.run(args.turns, args.message) for client in clients))
+        finally:
+            turns_wall = time.perf_counter() - turns_started
+            after_turns = await scrape(http)
+
+        # 3) Oturum API'leri
+        session_ids = [client.session_id for client in clients]
+        api = await hit_session_api(http, session_ids, args.api_requests, args.api_concurrency) if args.api_requests else None
+
+        await asyncio.gather(*(client.close() for client in clients))
+
+        if args.mock_url:
+            mock_stats = (await http.get(f"{args.mock_url}/_mock/stats")).json()
+        else:
+            mock_stats = None
+
+    turn_seconds = [value for client in clients for value in client.turn_seconds]
+    ttft_seconds = [value for client in clients for value in client.ttft_seconds]
+    errors = [error for client in clients for error in client.errors]
+    completed = len(turn_seconds)
+    queries = metric_total(after_turns, "db_queries_total") - metric_total(after_connect, "db_queries_total")
+    queries -= idle_query_rate * turns_wall
+    queries_by_operation = {
+        label: value - metric_by_label(after_connect, "db_queries_total").get(label, 0)
+        for label, value in metric_by_label(after_turns, "db_queries_total").items()
+    }
+
+    return {
+        "clients": args.clients,
+        "turns_per_client": args.turns,
+        "connect_seconds": round(connect_seconds, 3),
+        "turns_completed": completed,
+        "turn_errors": len(errors),
+        "error_samples": sorted(set(errors))[:5],
+        "wall_seconds": round(turns_wall, 3),
+        "turns_per_second": round(completed / turns_wall, 2) if turns_wall else None,
+        "response_chars_per_second": round(sum(client.response_chars for client in clients) / turns_wall) if turns_wall else None,
+        "ttft": summarize_ms(ttft_seconds),
+        "turn_latency": summarize_ms(turn_seconds),
+        "db_queries_per_turn": round(queries / completed, 2) if completed else None,
+        "db_queries_by_operation": {label: round(value) for label, value in queries_by_operation.items() if value},
+        "idle_queries_per_second": round(idle_query_rate, 2),
+        "memory_per_connection_kib": round(rss_delta / args.clients / 1024, 1) if args.clients else None,
+        "server_rss_mib": round(metric_total(after_turns, "process_resident_memory_bytes") / 2**20, 1),
+        "session_api": api,
+        "mock": mock_stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Backend adresi")
+    parser.add_argument("--clients", type=int, default=20, help="Eşzamanlı WebSocket istemcisi")
+    parser.add_argument("--turns", type=int, default=3, help="İstemci başına mesaj")
+    parser.add_argument("--message", default="Merhaba, bu bir yük testi mesajı.")
+    parser.add_argument("--model", default=None, help="Oturumların modeli (varsayılan: sunucunun varsayılanı)")
+    parser.add_argument("--api-requests", type=int, default=200, help="Oturum API'lerine atılacak istek (0 = atla)")
+    parser.add_argument("--api-concurrency", type=int, default=20)
+    parser.add_argument("--idle-sample-seconds", type=float, default=2.0)
+    parser.add_argument("--mock-url", default=None, help="Sahte OpenRouter adresi (ayar ve sayaçlar için)")
+    parser.add_argument("--mock-config", default=None, help='Test öncesi sahte sunucuya gönderilecek JSON ayarlar')
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
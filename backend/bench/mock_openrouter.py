@@ -0,0 +1,143 @@
+"""
+Yük testleri için yerel sahte OpenRouter sunucusu. /api/v1/chat/completions isteklerine gerçek
+API ile aynı SSE biçiminde (": OPENROUTER PROCESSING" yorumu, delta parçaları, usage, [DONE]) cevap
+verir. Token sayısı ve hızı, ilk token gecikmesi, reasoning ve görsel parçaları, hata ve 429 oranları
+ayarlanabilir. stream=false istekleri (özetleme çağrıları) tek bir JSON cevabı alır.
+
+Kullanım (backend dizininden):
+    python -m bench.mock_openrouter --port 8799 --tokens 200 --tokens-per-second 80 --reasoning-tokens 20
+    OPENROUTER_API_URL=http://127.0.0.1:8799/api/v1/chat/completions uvicorn main:app --port 8000
+
+Ayarlar çalışırken POST /_mock/config ile değiştirilebilir, sayaçlar GET /_mock/stats ile okunur.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# 1x1 şeffaf PNG: görsel üreten modellerin data URL'li parçalarını taklit eder
+PIXEL_PNG = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+
+
+class MockSettings:
+    def __init__(self):
+        self.tokens = 100
+        self.tokens_per_second = 50.0
+        self.first_token_ms = 200.0
+        self.reasoning_tokens = 0
+        self.image_rate = 0.0
+        self.error_rate = 0.0
+        self.rate_limit_rate = 0.0
+        self.retry_after_seconds = 1.0
+
+    def update(self, values: dict):
+        for key, value in values.items():
+            if not hasattr(self, key):
+                raise KeyError(key)
+            setattr(self, key, type(getattr(self, key))(value))
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+settings = MockSettings()
+stats = {"requests": 0, "streams": 0, "errors": 0, "rate_limited": 0, "active_streams": 0, "tokens_sent": 0}
+rng = random.Random()
+app = FastAPI()
+
+
+def _sse(data: dict) -> str:
+    return "data: " + json.dumps(data, separators=(",", ":")) + "\n\n"
+
+
+def _usage(body: dict, completion_tokens: int) -> dict:
+    prompt_tokens = len(json.dumps(body.get("messages", []))) // 4
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+
+async def _stream(body: dict):
+    stats["streams"] += 1
+    stats["active_streams"] += 1
+    interval = 1 / settings.tokens_per_second if settings.tokens_per_second > 0 else 0
+    try:
+        yield ": OPENROUTER PROCESSING\n\n"
+        await asyncio.sleep(settings.first_token_ms / 1000)
+        for index in range(settings.reasoning_tokens):
+            yield _sse({"choices": [{"delta": {"reasoning": f"think{index} "}}]})
+            await asyncio.sleep(interval)
+        for index in range(settings.tokens):
+            yield _sse({"choices": [{"delta": {"content": f" tok{index}"}}]})
+            stats["tokens_sent"] += 1
+            await asyncio.sleep(interval)
+        if "image" in body.get("model", "") or rng.random() < settings.image_rate:
+            yield _sse({"choices": [{"delta": {"images": [{"type": "image_url", "image_url": {"url": PIXEL_PNG}}]}}]})
+        yield _sse({"choices": [{"delta": {}, "finish_reason": "stop"}], "usage": _usage(body, settings.reasoning_tokens + settings.tokens)})
+        yield "data: [DONE]\n\n"
+    finally:
+        stats["active_streams"] -= 1
+
+
+@app.post("/api/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    roll = rng.random()
+    if roll < settings.rate_limit_rate:
+        stats["rate_limited"] += 1
+        return JSONResponse(
+            {"error": {"code": 429, "message": "Rate limit exceeded (mock)"}},
+            status_code=429, headers={"retry-after": str(settings.retry_after_seconds)},
+        )
+    if roll < settings.rate_limit_rate + settings.error_rate:
+        stats["errors"] += 1
+        return JSONResponse({"error": {"code": 502, "message": "Upstream provider error (mock)"}}, status_code=502)
+
+    if body.get("stream"):
+        return StreamingResponse(_stream(body), media_type="text/event-stream")
+
+    await asyncio.sleep(settings.first_token_ms / 1000)
+    content = json.dumps({"summary": "mock profile", "generated_at": int(time.time())})
+    return {"choices": [{"message": {"role": "assistant", "content": content}}], "usage": _usage(body, len(content) // 4)}
+
+
+@app.post("/_mock/config")
+async def update_config(request: Request):
+    try:
+        settings.update(await request.json())
+    except (KeyError, TypeError, ValueError) as e:
+        return JSONResponse({"error": f"invalid setting: {e}"}, status_code=400)
+    return settings.as_dict()
+
+
+@app.get("/_mock/stats")
+async def get_stats():
+    return {**stats, "settings": settings.as_dict()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--tokens", type=int, default=settings.tokens, help="Cevap başına içerik token'ı")
+    parser.add_argument("--tokens-per-second", type=float, default=settings.tokens_per_second, help="0 = beklemeden")
+    parser.add_argument("--first-token-ms", type=float, default=settings.first_token_ms)
+    parser.add_argument("--reasoning-tokens", type=int, default=settings.reasoning_tokens)
+    parser.add_argument("--image-rate", type=float, default=settings.image_rate, help="Görsel parçası eklenen cevap oranı")
+    parser.add_argument("--error-rate", type=float, default=settings.error_rate, help="502 dönen istek oranı")
+    parser.add_argument("--rate-limit-rate", type=float, default=settings.rate_limit_rate, help="429 dönen istek oranı")
+    parser.add_argument("--retry-after-seconds", type=float, default=settings.retry_after_seconds)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    rng.seed(args.seed)
+    settings.update({key: value for key, value in vars(args).items() if hasattr(settings, key)})
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Yönetim komutları (backend dizininden çalıştırılır).
+
+    python cli.py export --out backup.ndjson.gz
+    python cli.py export --session-id 12 --session-id 15 --out -
+    python cli.py export --created-after 2026-01-01 --created-before 2026-02-01 --out january.ndjson
+    python cli.py import backup.ndjson.gz --keep-ids --rebuild-indexes
+
+Döküm, mesajların referans verdiği görselleri (blob deposundaki içerikleri) base64 "blob" satırları olarak
+içerir; içe aktarım bunları hedefin blob deposuna (BLOB_STORE_DIR) yazar. Görsel içeren dökümler bu yüzden
+metinden belirgin şekilde büyük olabilir.
+
+Döküm ayrıca oturumların kullanıcılarına ait hafıza profillerini içerir; hedefte aynı kullanıcının profili
+zaten varsa mevcut profil korunur.
+
+İçe aktarım --batch-size satırlık partiler halinde commit edilir, uygulama çalışırken de yapılabilir.
+Yarıda kalan içe aktarımda commit edilmiş partiler veritabanında kalır; hata mesajı yazılan satır
+sayılarını ve id kaymalarını loglar. Büyük içe aktarımlarda --rebuild-indexes mesaj index'lerini ve
+arama index'ini yükleme boyunca kaldırıp sonunda (hata olsa da) tek seferde kurar; bu sürede index'li
+sorgular yavaşlar. İçe aktarım yalnızca buradan yapılır, HTTP üzerinden sunulmaz.
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import sys
+from datetime import datetime
+import database
+from services.logger import setup_logging, shutdown_logging
+from services.transfer import export_ndjson, import_ndjson, aiter_lines, IMPORT_BATCH_ROWS
+
+READ_CHUNK_BYTES = 1 << 20
+
+
+def _open(path: str, mode: str):
+    if path == "-":
+        return sys.stdout.buffer if "w" in mode else sys.stdin.buffer
+    if path.endswith(".gz"):
+        return gzip.open(path, mode, compresslevel=6)
+    return open(path, mode)
+
+
+async def _read_chunks(handle):
+    # Dosya okuma bloklayıcıdır; büyük parçalar halinde thread'de yapılır
+    while chunk := await asyncio.to_thread(handle.read, READ_CHUNK_BYTES):
+        yield chunk
+
+
+async def run_export(args):
+    handle = _open(args.out, "wb")
+    try:
+        async with database.AsyncSessionLocal() as db:
+            async for chunk in export_ndjson(db, args.session_id, args.created_after, args.created_before):
+                handle.write(chunk)
+    finally:
+        if handle is not sys.stdout.buffer:
+            handle.close()
+
+
+async def run_import(args):
+    handle = _open(args.file, "rb")
+    try:
+        result = await import_ndjson(
+            aiter_lines(_read_chunks(handle)),
+            keep_ids=args.keep_ids, rebuild_indexes=args.rebuild_indexes, batch_size=args.batch_size,
+        )
+    finally:
+        if handle is not sys.stdin.buffer:
+            handle.close()
+    print(json.dumps(result, indent=2))
+
+
+async def run(args):
+    await database.init_models()
+    try:
+        await args.handler(args)
+    finally:
+        await database.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(required=True)
+
+    export = commands.add_parser("export", help="Oturumları NDJSON olarak dışa aktar")
+    export.add_argument("--out", default="-", help="Çıktı dosyası (.gz ise sıkıştırılır, - = stdout)")
+    export.add_argument("--session-id", type=int, action="append", help="Yalnızca bu oturum (tekrarlanabilir)")
+    export.add_argument("--created-after", type=datetime.fromisoformat, help="Bu zamanda ya da sonrasında oluşturulanlar")
+    export.add_argument("--created-before", type=datetime.fromisoformat, help="Bu zamandan önce oluşturulanlar")
+    export.set_defaults(handler=run_export)
+
+    load = commands.add_parser("import", help="NDJSON dökümünü içe aktar")
+    load.add_argument("file", help="Döküm dosyası (.gz olabilir, - = stdin)")
+    load.add_argument("--keep-ids", action="store_true", help="Id'leri koru (boş veritabanına geri yükleme)")
+    load.add_argument("--rebuild-indexes", action="store_true", help="Index'leri yükleme sonunda yeniden kur")
+    load.add_argument("--batch-size", type=int, default=IMPORT_BATCH_ROWS)
+    load.set_defaults(handler=run_import)
+
+    args = parser.parse_args()
+    setup_logging()
+    try:
+        asyncio.run(run(args))
+    finally:
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,81 @@ from dotenv import load_dotenv
 load_dotenv()
 
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
+# Yük testlerinde yerel sahte sunucuya (bench/mock_openrouter.py) yönlendirmek için değiştirilebilir
+OPENROUTER_API_URL = os.getenv("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions")
 DEFAULT_MODEL_NAME = os.getenv("MODEL_NAME", "google/gemini-2.0-flash-001")
 MEMORY_CHARACTER_LIMIT = int(os.getenv("MEMORY_CHARACTER_LIMIT", "2000"))
 SUMMARIZER_MODEL = os.getenv("SUMMARIZER_MODEL", "google/gemini-2.5-flash")
+
+# Loglama ve izleme: TRACE_REQUESTS=true her sohbet turunun aşama span'lerini tek satır olarak loglar
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+TRACE_REQUESTS = os.getenv("TRACE_REQUESTS", "false").lower() == "true"
+
+# OpenRouter HTTP istemcisi (bağlantı havuzu) ayarları
+UPSTREAM_HTTP2 = os.getenv("UPSTREAM_HTTP2", "true").lower() == "true"
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+UPSTREAM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "60"))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "10"))
+UPSTREAM_DEFAULT_TIMEOUT = float(os.getenv("UPSTREAM_DEFAULT_TIMEOUT", "300"))
+
+# WebSocket token birleştirme: metin parçaları bu pencere (ms) ya da byte eşiği dolunca tek çerçevede gönderilir.
+# WS_COALESCE_WINDOW_MS=0 her parçayı ayrı gönderir.
+WS_COALESCE_WINDOW_MS = float(os.getenv("WS_COALESCE_WINDOW_MS", "30"))
+WS_COALESCE_MAX_BYTES = int(os.getenv("WS_COALESCE_MAX_BYTES", "4096"))
+
+# Devam ettirilebilir akışlar: üretim soketten bağımsız bir görevde çalışır ve olaylar sıra numarasıyla
+# sınırlı bir tamponda tutulur; yeniden bağlanan istemci son gördüğü sıradan devam eder.
+STREAM_REPLAY_BUFFER_EVENTS = int(os.getenv("STREAM_REPLAY_BUFFER_EVENTS", "2048"))
+# Biten akış bu süre (saniye) boyunca geç bağlanan istemciler için saklanır
+STREAM_RETENTION_SECONDS = float(os.getenv("STREAM_RETENTION_SECONDS", "120"))
+# Kapanışta devam eden üretimlerin bitmesi için beklenen süre
+STREAM_SHUTDOWN_GRACE_SECONDS = float(os.getenv("STREAM_SHUTDOWN_GRACE_SECONDS", "30"))
+
+# Görseller için içerik adresli blob deposu (yerel dosya sistemi)
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", "./blobs")
+# Tek bir görselin çözülmüş en büyük boyutu (bayt)
+BLOB_MAX_BYTES = int(os.getenv("BLOB_MAX_BYTES", str(10 * 1024 * 1024)))
+
+# Sunucu tarafı konuşma geçmişi önbelleği (LRU + TTL)
+HISTORY_CACHE_MAX_SESSIONS = int(os.getenv("HISTORY_CACHE_MAX_SESSIONS", "1000"))
+HISTORY_CACHE_TTL_SECONDS = float(os.getenv("HISTORY_CACHE_TTL_SECONDS", "1800"))
+
+# Oturum sonu hafıza özetleme kuyruğu
+SUMMARY_DEBOUNCE_SECONDS = float(os.getenv("SUMMARY_DEBOUNCE_SECONDS", "15"))
+SUMMARY_WORKER_CONCURRENCY = int(os.getenv("SUMMARY_WORKER_CONCURRENCY", "2"))
+SUMMARY_JOB_MAX_ATTEMPTS = int(os.getenv("SUMMARY_JOB_MAX_ATTEMPTS", "5"))
+SUMMARY_JOB_RETRY_BASE_SECONDS = float(os.getenv("SUMMARY_JOB_RETRY_BASE_SECONDS", "30"))
+SUMMARY_JOB_POLL_INTERVAL = float(os.getenv("SUMMARY_JOB_POLL_INTERVAL", "2"))
+# 'running' durumunda bu süreden uzun kalan iş (çöken worker) yeniden alınır
+SUMMARY_JOB_LEASE_SECONDS = float(os.getenv("SUMMARY_JOB_LEASE_SECONDS", "600"))
+
+# Eski biçimli mesajların (JSON metin content) yapılandırılmış kolonlara arka planda taşınması
+MESSAGE_MIGRATION_BATCH_SIZE = int(os.getenv("MESSAGE_MIGRATION_BATCH_SIZE", "500"))
+# Partiler arası bekleme (saniye): taşıma, canlı sohbet trafiğiyle veritabanı için yarışmasın
+MESSAGE_MIGRATION_PAUSE_SECONDS = float(os.getenv("MESSAGE_MIGRATION_PAUSE_SECONDS", "0.2"))
+
+# Sohbet yazmaları (mesajlar, oturum aktivitesi) tüm oturumlar için ortak toplu transaction'larda commit edilir.
+# İlk yazmadan sonra bu kadar (saniye) beklenir; bu pencerede gelenler aynı commit'e girer.
+PERSISTENCE_FLUSH_INTERVAL = float(os.getenv("PERSISTENCE_FLUSH_INTERVAL", "0.01"))
+PERSISTENCE_MAX_BATCH = int(os.getenv("PERSISTENCE_MAX_BATCH", "500"))
+
+# Hafıza profili önbelleği: sürüm kolonu en fazla bu aralıkla (saniye) kontrol edilir
+PROFILE_CACHE_CHECK_INTERVAL = float(os.getenv("PROFILE_CACHE_CHECK_INTERVAL", "5"))
+PROFILE_CACHE_MAX_USERS = int(os.getenv("PROFILE_CACHE_MAX_USERS", "10000"))
+# Hafıza profilleri oturumun user_id'sine (istemcinin client_id'si) bağlıdır. client_id göndermeyen eski
+# istemcilerin oturumları ve önceki tek paylaşımlı profil (id=1) bu kullanıcıya aittir.
+DEFAULT_USER_ID = "default"
+# Yükseltilmiş kurulumlarda client_id ile gelen ilk istemci (henüz profili yoksa) eski "default" profili
+# ve client_id'siz eski oturumları devralır; böylece tek kullanıcılı kurulumun hafızası kaybolmaz.
+ADOPT_LEGACY_PROFILE = os.getenv("ADOPT_LEGACY_PROFILE", "true").lower() == "true"
+# Eşzamanlı güncellemede profil birleştirilip yeniden yazılmaya en fazla bu kadar denenir
+PROFILE_WRITE_MAX_ATTEMPTS = int(os.getenv("PROFILE_WRITE_MAX_ATTEMPTS", "5"))
+
+# Sohbet içi kayan özet: her N mesajlık tamamlanmış blok arka planda özete katlanır
+ROLLING_SUMMARY_BLOCK_SIZE = int(os.getenv("ROLLING_SUMMARY_BLOCK_SIZE", "10"))
+ROLLING_SUMMARY_MAX_TOKENS = int(os.getenv("ROLLING_SUMMARY_MAX_TOKENS", "1024"))
+
 # Desteklenen modeller
 AVAILABLE_MODELS = {
     "google/gemini-2.0-flash-001": "Google Gemini 2.0 Flash",
@@ -28,20 +99,51 @@ REASONING_MODELS_MAX_TOKENS = {
     "openai/gpt-5": 32000,
 }
 
-# Uygulama genelinde kullanılacak model (başlangıç değeri)
-# Bu değişkeni bir sınıf içinde yönetmek, global state'i azaltır.
-class AppState:
-    def __init__(self):
-        self.current_model = DEFAULT_MODEL_NAME
+# Model bazında okuma zaman aşımı (saniye). Listede olmayanlar UPSTREAM_DEFAULT_TIMEOUT kullanır.
+MODEL_TIMEOUTS = {
+    SUMMARIZER_MODEL: 120.0,
+}
+
+# Birebir aynı istekler için cevap önbelleği (bellek içi LRU + veritabanı, TTL'li).
+# Sadece listedeki modeller için açıktır; "*" tüm modeller, boş bırakılırsa kapalı.
+RESPONSE_CACHE_MODELS = {model.strip() for model in os.getenv("RESPONSE_CACHE_MODELS", "").split(",") if model.strip()}
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "86400"))
+RESPONSE_CACHE_MEMORY_ENTRIES = int(os.getenv("RESPONSE_CACHE_MEMORY_ENTRIES", "512"))
+RESPONSE_CACHE_PERSISTENT = os.getenv("RESPONSE_CACHE_PERSISTENT", "true").lower() == "true"
 
-    def set_model(self, model_id: str):
-        if model_id in AVAILABLE_MODELS:
-            self.current_model = model_id
-            print(f"✅ Model seçildi: {AVAILABLE_MODELS[model_id]} ({model_id})")
-            return True
-        return False
+# Upstream zamanlayıcısı: model başına eşzamanlı akış ve token/dakika bütçesi.
+# Listelerde olmayan modeller varsayılanları kullanır; UPSTREAM_MODEL_TOKENS_PER_MINUTE=0 hız sınırı koymaz.
+UPSTREAM_MODEL_MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MODEL_MAX_CONCURRENCY", "16"))
+UPSTREAM_MODEL_TOKENS_PER_MINUTE = int(os.getenv("UPSTREAM_MODEL_TOKENS_PER_MINUTE", "0"))
+MODEL_MAX_CONCURRENCY = {
+    SUMMARIZER_MODEL: 4,
+}
+MODEL_TOKENS_PER_MINUTE = {}
+# Kuyrukta bekleme üst sınırları: dolu kuyruk yeni isteği hemen reddeder, uzun bekleyen istek zaman aşımına uğrar
+UPSTREAM_MAX_QUEUE_PER_MODEL = int(os.getenv("UPSTREAM_MAX_QUEUE_PER_MODEL", "200"))
+UPSTREAM_MAX_QUEUE_WAIT_SECONDS = float(os.getenv("UPSTREAM_MAX_QUEUE_WAIT_SECONDS", "60"))
+# Bütçeden düşülen tahmini cevap token'ı (gerçek kullanım akış bitince mutabık kılınır)
+UPSTREAM_EXPECTED_COMPLETION_TOKENS = int(os.getenv("UPSTREAM_EXPECTED_COMPLETION_TOKENS", "512"))
+# 429'da Retry-After yoksa modelin kuyruğu bu kadar (saniye) duraklatılır
+UPSTREAM_RATE_LIMIT_BACKOFF_SECONDS = float(os.getenv("UPSTREAM_RATE_LIMIT_BACKOFF_SECONDS", "5"))
 
-    def get_model(self) -> str:
-        return self.current_model
+# Modellerin context window boyutları (token). Listede olmayanlar DEFAULT_CONTEXT_WINDOW kullanır.
+MODEL_CONTEXT_WINDOWS = {
+    "google/gemini-2.0-flash-001": 1048576,
+    "openai/gpt-5": 400000,
+    "openai/gpt-4.1-mini": 1047576,
+    "google/gemini-2.5-flash-image-preview": 32768,
+    "qwen/qwen3-coder": 262144,
+    "openai/gpt-4-turbo": 128000,
+}
+DEFAULT_CONTEXT_WINDOW = int(os.getenv("DEFAULT_CONTEXT_WINDOW", "32768"))
+# Cevap için ayrılan token (REASONING_MODELS_MAX_TOKENS'ta olmayan modeller için)
+DEFAULT_RESPONSE_TOKEN_RESERVE = int(os.getenv("DEFAULT_RESPONSE_TOKEN_RESERVE", "4096"))
+# Opsiyonel üst sınır: büyük context'li modellerde de prompt'u (maliyet/gecikme için) sınırlar. 0 = sınırsız
+MAX_PROMPT_TOKENS = int(os.getenv("MAX_PROMPT_TOKENS", "0"))
+# Kırpılan token'ların kazandırdığı TTFT tahmini için yaklaşık prefill hızı
+PREFILL_TOKENS_PER_SECOND = float(os.getenv("PREFILL_TOKENS_PER_SECOND", "5000"))
 
-app_state = AppState()
\ No newline at end of file
+# Sohbet geçmişinde tam metin arama. Postgres metin arama yapılandırması ('simple' dil bağımsızdır;
+# tek dilli kurulumlarda örn. 'turkish' kök bulma yapar). Değişirse index yeniden kurulur.
+SEARCH_TEXT_CONFIG = os.getenv("SEARCH_TEXT_CONFIG", "simple")
@@ -1,27 +1,78 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import event, inspect, text
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine, async_sessionmaker
+from sqlalchemy.orm import declarative_base
 from dotenv import load_dotenv
+from services.logger import get_logger
+from services.metrics import DB_QUERIES_TOTAL
 
 load_dotenv()
+logger = get_logger("database")
 
 DB_USER = os.getenv("POSTGRES_USER", "admin")
 DB_PASSWORD = os.getenv("POSTGRES_PASSWORD", "admin")
 DB_NAME = os.getenv("POSTGRES_DB", "ai_chat_db")
-DB_HOST = "db"  # Docker Compose'daki servis adımız
+DB_HOST = os.getenv("POSTGRES_HOST", "db")  # Docker Compose'daki servis adımız
 
-# Docker içindeki backend, 'db' host adıyla veritabanına erişecek
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:5432/{DB_NAME}"
+# Docker içindeki backend, 'db' host adıyla veritabanına erişecek.
+# Testler için DATABASE_URL ile örn. "sqlite+aiosqlite:///./test.db" verilebilir.
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:5432/{DB_NAME}"
+)
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Async engine: commit'ler event loop'u bloklamaz, diğer soketlerin token akışı durmaz
+engine = create_async_engine(DATABASE_URL, pool_pre_ping=True)
+# expire_on_commit=False: commit sonrası nesne alanları lazy-load gerektirmeden okunabilir
+AsyncSessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False, autoflush=False)
 Base = declarative_base()
 
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    # Tur başına sorgu sayısı /metrics üzerinden izlenebilsin (bench/load_test.py bunu kullanır)
+    DB_QUERIES_TOTAL.inc(operation=statement.split(None, 1)[0].lower())
+
+def _upgrade_existing_tables(sync_conn):
+    """
+    create_all var olan tablolara yeni kolon ve index eklemez. Modele sonradan eklenen
+    (nullable ya da server_default'lu) kolonları ALTER TABLE ile, eksik index'leri de
+    CREATE INDEX ile ekleyen hafif bir migration.
+    """
+    inspector = inspect(sync_conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=sync_conn.dialect)}"
+            if column.server_default is not None:
+                ddl += f" DEFAULT {column.server_default.arg}"
+            sync_conn.execute(text(ddl))
+            logger.info("🛠️ Kolon eklendi: %s.%s", table.name, column.name)
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(sync_conn)
+                logger.info("🛠️ Index eklendi: %s", index.name)
+
+async def init_models():
+    """Veritabanı tablolarını oluşturur (eğer yoksa) ve eksik kolon/index'leri ekler."""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_upgrade_existing_tables)
+
+def dialect_insert(db):
+    """Oturumun (ya da bağlantının) veritabanına uygun insert() (on_conflict_do_update/do_nothing destekli) fonksiyonunu döndürür."""
+    dialect = db.dialect if isinstance(db, AsyncConnection) else db.bind.dialect
+    if dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
 # Veritabanı bağlantısını almak için bir helper fonksiyon
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
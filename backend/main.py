@@ -1,15 +1,84 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import models
 import database
 from routers import models as models_router
 from routers import sessions as sessions_router
 from routers import chat as chat_router
+from routers import blobs as blobs_router
+from routers import search as search_router
+from routers import transfer as transfer_router
+from services.upstream_client import upstream
+from services.scheduler import upstream_scheduler
+from services.token_budget import budget_stats
+from services.response_cache import response_cache
+from services.summary_queue import summary_workers
+from services.stream_manager import stream_manager
+from services.persistence import persistence
+from services.message_migration import message_migration
+from services.search import search_index
+from services.history_store import history_cache
+from services.logger import setup_logging, shutdown_logging
+from services.metrics import registry
 
-# Veritabanı tablolarını oluştur (eğer yoksa)
-models.Base.metadata.create_all(bind=database.engine)
+# Loglar kuyruk üzerinden ayrı bir thread'de yazılır; event loop stderr'e yazarken bloklanmaz
+setup_logging()
 
-app = FastAPI()
+# Mevcut istatistik sayaçları /metrics üzerinden de okunabilsin
+registry.gauge("upstream_requests_total", "Requests sent to OpenRouter.", lambda: upstream.requests_total, kind="counter")
+registry.gauge("upstream_connections_opened_total", "TCP connections opened to OpenRouter.", lambda: upstream.connections_opened, kind="counter")
+registry.gauge(
+    "upstream_scheduler_active", "Upstream requests currently holding a scheduler slot.",
+    lambda: {(model,): lane["active"] for model, lane in upstream_scheduler.stats()["models"].items()}, ("model",),
+)
+registry.gauge(
+    "upstream_scheduler_queued", "Upstream requests waiting for a scheduler slot.",
+    lambda: {(model,): lane["queued"] for model, lane in upstream_scheduler.stats()["models"].items()}, ("model",),
+)
+registry.gauge("upstream_scheduler_rejected_total", "Requests rejected by the upstream scheduler.", lambda: upstream_scheduler.rejected_total, kind="counter")
+registry.gauge("upstream_rate_limited_total", "429 responses received from OpenRouter.", lambda: upstream_scheduler.rate_limited_total, kind="counter")
+registry.gauge("context_requests_trimmed_total", "Prompts trimmed to fit the model context budget.", lambda: budget_stats["requests_trimmed"], kind="counter")
+registry.gauge("context_tokens_trimmed_total", "Estimated tokens dropped by context trimming.", lambda: budget_stats["tokens_trimmed"], kind="counter")
+registry.gauge("response_cache_lookups_total", "Response cache lookups.", lambda: response_cache.lookups, kind="counter")
+registry.gauge(
+    "response_cache_hits_total", "Response cache hits by tier.",
+    lambda: {("memory",): response_cache.memory_hits, ("persistent",): response_cache.persistent_hits}, ("tier",), kind="counter",
+)
+registry.gauge("response_cache_latency_saved_seconds_total", "Generation time saved by response cache hits.", lambda: response_cache.latency_saved_seconds, kind="counter")
+registry.gauge("history_cache_sessions", "Sessions held in the in-process history cache.", lambda: len(history_cache))
+registry.gauge("active_generations", "Reply generations currently running.", lambda: stream_manager.running_count())
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Veritabanı tablolarını oluştur (eğer yoksa)
+    await database.init_models()
+    # Tam metin arama: SQLite'ta FTS5 tablosu, Postgres'te (arka planda) GIN index
+    await search_index.start()
+    # Sohbet mesajları ve oturum aktivitesi tüm oturumlar için ortak toplu transaction'larda yazılır
+    await persistence.start()
+    # OpenRouter bağlantı havuzu uygulama ömrü boyunca tek bir istemcide tutulur
+    await upstream.start()
+    # Kalıcı özetleme kuyruğunu işleyen worker'lar
+    await summary_workers.start()
+    # Eski biçimli (JSON metin) mesajlar arka planda yapılandırılmış kolonlara taşınır
+    await message_migration.start()
+    try:
+        yield
+    finally:
+        # Devam eden cevaplar bitip kaydedilsin diye upstream istemcisinden önce beklenir
+        await stream_manager.stop()
+        # Bitirilen cevaplar ve sırada kalan tüm yazmalar commit edilir
+        await persistence.stop()
+        await message_migration.stop()
+        await search_index.stop()
+        await summary_workers.stop()
+        await upstream.close()
+        await database.engine.dispose()
+        shutdown_logging()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,7 +92,30 @@ app.add_middleware(
 app.include_router(models_router.router)
 app.include_router(sessions_router.router)
 app.include_router(chat_router.router)
+app.include_router(blobs_router.router)
+app.include_router(search_router.router)
+app.include_router(transfer_router.router)
 
 @app.get("/")
 def read_root():
-    return {"message": "AI Chat API is running."}
\ No newline at end of file
+    return {"message": "AI Chat API is running."}
+
+@app.get("/api/upstream/stats")
+def get_upstream_stats():
+    """OpenRouter bağlantı havuzu sayaçlarını ve zamanlayıcı kuyruk durumunu döndürür."""
+    return {**upstream.stats(), "scheduler": upstream_scheduler.stats()}
+
+@app.get("/api/context/stats")
+def get_context_stats():
+    """Context bütçesi kırpmalarının sayaçlarını ve tahmini TTFT kazancını döndürür."""
+    return budget_stats
+
+@app.get("/api/cache/stats")
+def get_response_cache_stats():
+    """Cevap önbelleğinin isabet oranını ve kazandırdığı tahmini gecikmeyi döndürür."""
+    return response_cache.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Aşama süreleri, TTFT, token hızı ve istatistik sayaçlarını Prometheus metin formatında döndürür."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
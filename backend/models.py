@@ -1,25 +1,46 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Boolean, Integer, SmallInteger, String, Text, DateTime, ForeignKey, Index, JSON
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from database import Base
+from config import DEFAULT_USER_ID
+from services.message_format import STRUCTURED_FORMAT
 
 class ChatSession(Base):
     __tablename__ = "chat_sessions"
+    # Kenar çubuğu listesi (created_at, id) üzerinden keyset sayfalama yapar
+    __table_args__ = (Index("ix_chat_sessions_created_at_id", "created_at", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    # user_id alanı daha sonra eklenecek
-    # summary alanı daha sonra eklenecek
+    # İstemcinin client_id'si; hafıza profili buna göre seçilir. Boşsa (eski oturumlar) DEFAULT_USER_ID.
+    user_id = Column(String(64), nullable=True, index=True)
     model_used = Column(String)
+    # Tamamlanan N'lik mesaj bloklarının arka planda katlandığı kalıcı özet.
+    # rolling_summary_upto_id'ye kadar (dahil) olan mesajlar bu özette temsil edilir.
+    rolling_summary = Column(Text, nullable=True)
+    rolling_summary_upto_id = Column(Integer, nullable=True)
+    # Kullanıcı hafıza profiline en son hangi mesaja kadar (dahil) işlendiği
+    memory_summarized_upto_id = Column(Integer, nullable=True)
     last_active_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    # Oturum geçmişi yükleme ve sayfalama sorguları için
+    __table_args__ = (Index("ix_chat_messages_session_id_created_at", "session_id", "created_at"),)
 
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(Integer, ForeignKey("chat_sessions.id"))
     role = Column(String)  # 'user' or 'assistant'
-    content = Column(Text)
+    # Eski biçim: {"content", "reasoning", "images"} JSON metni ya da düz metin. Yeni satırlarda boştur;
+    # eski satırlar arka planda (services/message_migration.py) aşağıdaki kolonlara taşınır.
+    content = Column(Text, nullable=True)
+    text = Column(Text, nullable=True)
+    reasoning = Column(Text, nullable=True)
+    # [{"type": "image", "url": ...}]; Postgres'te JSONB
+    attachments = Column(JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql"), nullable=True)
+    # 0 = eski (content), 1 = yapılandırılmış kolonlar. Kolon eklendiğinde mevcut satırlar 0 alır.
+    format_version = Column(SmallInteger, nullable=False, default=STRUCTURED_FORMAT, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     session = relationship("ChatSession", back_populates="messages")
@@ -34,8 +55,37 @@ class UserProfile(Base):
     __tablename__ = "user_profiles"
 
     id = Column(Integer, primary_key=True, index=True)
-    # Gerçek bir uygulamada burası bir kullanıcı ID'sine bağlı olurdu.
-    # Şimdilik tek profil için ID=1 kullanacağız.
-    
+    # Kullanıcı başına tek profil. Kolon eklendiğinde mevcut tek profil varsayılan kullanıcıya geçer.
+    user_id = Column(String(64), nullable=False, unique=True, index=True, server_default=text(f"'{DEFAULT_USER_ID}'"))
+
     # Model tarafından otomatik olarak oluşturulan ve güncellenen özet.
-    auto_summary_json = Column(Text, default="{}")
\ No newline at end of file
+    auto_summary_json = Column(Text, default="{}")
+    # Özetleyici her yazışta artırır; worker'lar önbelleklerini bu sürüme göre tazeler.
+    # Yazma "version = okunan sürüm" koşuluyla yapılır (iyimser kilit); bkz. memory_service.save_profile.
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+
+class SummaryJob(Base):
+    __tablename__ = "summary_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # Oturum başına tek satır: tekrarlanan bağlantı kopmaları aynı işi erteler, yeni iş açmaz.
+    session_id = Column(Integer, ForeignKey("chat_sessions.id"), unique=True, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # 'pending' | 'running' | 'done' | 'failed'
+    run_after = Column(DateTime(timezone=True), nullable=False, index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    # İş çalışırken yeniden kuyruğa alındı: bitince tekrar 'pending' olur (çalışan iş ikinci kez alınmaz)
+    rerun_requested = Column(Boolean, nullable=False, default=False, server_default=text("false"))
+    last_error = Column(Text, nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class ResponseCacheEntry(Base):
+    __tablename__ = "response_cache_entries"
+
+    # (model, api_messages, payload seçenekleri) kanonik JSON'unun SHA-256 özeti
+    key = Column(String(64), primary_key=True)
+    model = Column(String, nullable=False)
+    response_json = Column(Text, nullable=False)  # {"content", "reasoning", "images"}
+    # Cevabın upstream'den ilk üretiminin süresi; isabetlerde kazanılan gecikme buradan hesaplanır
+    generation_ms = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
@@ -0,0 +1,36 @@
+import re
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from services.blob_store import blob_store, ALLOWED_CONTENT_TYPES
+
+router = APIRouter()
+
+BLOB_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+@router.get("/api/blobs/{blob_hash}")
+async def get_blob(blob_hash: str, request: Request):
+    """İçerik adresli blob'u (görsel vb.) akış olarak döndürür. İçerik değişmediği için kalıcı önbelleklenebilir."""
+    if not BLOB_HASH_PATTERN.match(blob_hash):
+        raise HTTPException(status_code=400, detail="Invalid blob hash")
+
+    info = await blob_store.stat(blob_hash)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Blob not found")
+
+    etag = f'"{blob_hash}"'
+    headers = {
+        "ETag": etag, "Cache-Control": "public, max-age=31536000, immutable",
+        # Tarayıcı türü tahmin etmesin; blob doğrudan açılsa bile betik çalıştıramasın
+        "X-Content-Type-Options": "nosniff",
+        "Content-Security-Policy": "sandbox",
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    headers["Content-Length"] = str(info.size)
+    # Bu kontrolden önce yazılmış olabilecek görsel dışı blob'lar sayfa olarak değil, indirme olarak verilir
+    media_type = info.content_type
+    if media_type not in ALLOWED_CONTENT_TYPES:
+        media_type = "application/octet-stream"
+        headers["Content-Disposition"] = "attachment"
+    return StreamingResponse(blob_store.iter_chunks(blob_hash), media_type=media_type, headers=headers)
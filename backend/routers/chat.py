@@ -1,133 +1,349 @@
+import functools
 import json
-import httpx
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, BackgroundTasks
-from sqlalchemy.orm import Session
-from datetime import datetime, timezone
+import re
+import time
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
 import models
 import database
 from config import (
-    OPENROUTER_API_KEY, OPENROUTER_API_URL, AVAILABLE_MODELS, 
-    IMAGE_GENERATION_MODELS, REASONING_MODELS_MAX_TOKENS, app_state
+    OPENROUTER_API_KEY, AVAILABLE_MODELS, 
+    IMAGE_GENERATION_MODELS, REASONING_MODELS_MAX_TOKENS, DEFAULT_MODEL_NAME, DEFAULT_USER_ID
+)
+from services.summary_queue import enqueue_summary
+from services.upstream_client import upstream
+from services.history_store import history_cache
+from services.rolling_summary import build_summary_message, maybe_schedule_fold
+from services.profile_cache import profile_cache
+from services.memory_service import adopt_legacy_profile
+from services.token_budget import fit_history, estimate_prompt_tokens, estimate_tokens, ContextBudgetExceeded
+from services.blob_store import externalize_image, BlobRejected
+from services.message_format import encode_message
+from services.persistence import persistence
+from services.ws_writer import CoalescingWriter
+from services.sse import aiter_sse_data, DONE as SSE_DONE
+from services.fast_json import loads as fast_loads, JSONDecodeError
+from services.response_cache import response_cache, replay_events
+from services.scheduler import upstream_scheduler, usage_tokens, UpstreamBusy, PRIORITY_INTERACTIVE
+from services.stream_manager import stream_manager, GenerationStream
+from services.logger import get_logger
+from services.metrics import (
+    CHAT_TTFT_SECONDS, CHAT_TOKENS_PER_SECOND, CHAT_TURNS_TOTAL, WS_FRAMES_RECEIVED_TOTAL, WS_FRAME_BYTES,
+    WS_FORWARD_LAG_EVENTS, WS_CONNECTIONS_ACTIVE, UPSTREAM_CONNECT_SECONDS, start_trace, current_trace, span, record_span
 )
-from services.memory_service import run_summary_if_inactive
 
 router = APIRouter()
+logger = get_logger("chat")
+
+CLIENT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+def _resume_position(websocket: WebSocket, stream: GenerationStream) -> int | None:
+    """Bağlanan istemcinin akışa hangi sıradan katılacağı; None ise katılmaz."""
+    last_seq = websocket.query_params.get("last_seq")
+    if last_seq is not None and websocket.query_params.get("stream_id") == stream.stream_id:
+        try:
+            return max(int(last_seq), 0)
+        except ValueError:
+            pass
+    # Akışı hiç görmemiş istemci: üretim sürüyorsa baştan oynatılır; bitmişse cevap zaten kayıtlıdır
+    return None if stream.finished else 0
+
+async def _forward(writer: CoalescingWriter, stream: GenerationStream, after_seq: int = 0):
+    async for event in stream.follow(after_seq):
+        # Yayınlanmış ama henüz sokete yazılmamış olay sayısı: yavaş istemcinin ne kadar geride kaldığı
+        WS_FORWARD_LAG_EVENTS.observe(stream.last_seq - event["seq"])
+        await writer.send(event)
+
+async def _generate_reply(
+    stream: GenerationStream,
+    chat_session: models.ChatSession,
+    model_for_api_call: str,
+    payload: dict,
+    headers: dict,
+    api_messages: list[dict],
+    session_history: list[dict],
+    turn_started: float,
+):
+    """
+    Cevabı (önbellekten ya da upstream'den) üretir, olayları akışa yayınlar ve bittiğinde
+    istemci bağlı olsun olmasın assistant mesajını kaydeder. Cevap üretilirken DB bağlantısı tutulmaz.
+    turn_started, kullanıcı çerçevesinin alındığı perf_counter() anıdır (TTFT bundan ölçülür).
+    """
+    first_token_at: float | None = None
+    outcome = "error"
+
+    def mark_first_token():
+        nonlocal first_token_at
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+            CHAT_TTFT_SECONDS.observe(first_token_at - turn_started, model=model_for_api_call)
+            record_span("first_token", turn_started)
+
+    # Upstream kuyruğunda beklenirken istemciye sıra ve bekleme süresi bildirilir (sıra 0 = yuva alındı)
+    async def report_queue_position(position: int, wait_ms: int):
+        stream.publish({"type": "queue", "position": position, "wait_ms": wait_ms})
+
+    # Önbellek açık modellerde birebir aynı istek upstream'e gitmeden önbellekten oynatılır
+    cache_key = response_cache.key_for(payload) if response_cache.enabled_for(model_for_api_call) else None
+
+    try:
+        cached_response = await response_cache.get(cache_key) if cache_key else None
+        if cached_response is not None:
+            outcome = "cached"
+            for event in replay_events(cached_response):
+                mark_first_token()
+                stream.publish(event)
+        else:
+            generation_started = time.monotonic()
+            queue_started = time.perf_counter()
+            async with upstream_scheduler.slot(
+                model_for_api_call, PRIORITY_INTERACTIVE, f"chat:{chat_session.id}",
+                estimate_prompt_tokens(api_messages), on_wait=report_queue_position,
+            ) as grant:
+                record_span("upstream_queue", queue_started)
+                connect_started = time.perf_counter()
+                async with upstream.stream(payload, headers) as response:
+                    UPSTREAM_CONNECT_SECONDS.observe(record_span("upstream_connect", connect_started), model=model_for_api_call)
+                    grant.observe(response)
+                    response.raise_for_status()
+
+                    seen_image_urls = set()
+                    usage = None
+
+                    async for data in aiter_sse_data(response.aiter_bytes()):
+                        if data == SSE_DONE: continue  # gövdenin sonuna kadar okunursa bağlantı havuza geri döner
+                        try:
+                            data_obj = fast_loads(data)
+                            choice = (data_obj.get("choices") or [{}])[0]
+                            delta = choice.get("delta") or {}
+                            message = choice.get("message") or {}
+                            usage = data_obj.get("usage") or usage
+
+                            if reasoning := delta.get("reasoning"):
+                                mark_first_token(); stream.publish({"type": "reasoning", "content": reasoning})
+                            if content := delta.get("content"):
+                                mark_first_token(); stream.publish({"type": "chat_message", "content": content})
+                            if images_in_chunk := delta.get("images") or message.get("images"):
+                                for image in images_in_chunk:
+                                    if (image_url := image.get("image_url", {}).get("url") or image.get("url")) and image_url not in seen_image_urls:
+                                        seen_image_urls.add(image_url)
+                                        try:
+                                            image_ref = await externalize_image(image_url)
+                                        except BlobRejected as e:
+                                            logger.warning("⚠️ Modelin görseli reddedildi (Oturum: %s): %s", chat_session.id, e)
+                                            continue
+                                        stream.publish({"type": "image", "image_url": image_ref})
+                        except JSONDecodeError: logger.warning("⚠️ JSON decode error, data: %r", data[:200])
+
+                    # Token/dakika bütçesini gerçek kullanıma göre düzelt (usage yoksa tahmin)
+                    used_tokens = usage_tokens(usage)
+                    if used_tokens is None:
+                        used_tokens = estimate_prompt_tokens(api_messages) + estimate_tokens(stream.reasoning + stream.content)
+                    grant.settle(used_tokens)
+                    outcome = "ok"
+
+                    # Çıkış hızı: ilk token'dan sonuna kadar (usage'da completion_tokens yoksa tahmin)
+                    if first_token_at is not None and (elapsed := time.perf_counter() - first_token_at) > 0:
+                        completion_tokens = (usage or {}).get("completion_tokens") or estimate_tokens(stream.reasoning + stream.content)
+                        CHAT_TOKENS_PER_SECOND.observe(completion_tokens / elapsed, model=model_for_api_call)
+
+            if cache_key and (stream.content or stream.images):
+                cached_response = {"content": stream.content, "reasoning": stream.reasoning, "images": list(stream.images)}
+                await response_cache.put(cache_key, model_for_api_call, cached_response, int((time.monotonic() - generation_started) * 1000))
+
+        # stream_end ancak cevap commit edildikten sonra yayınlanır (toplu yazma mesaj başına onay verir)
+        if stream.content or stream.reasoning or stream.images:
+            with span("final_persist"):
+                assistant_message_id = await persistence.add_message(
+                    session_id=chat_session.id, role="assistant",
+                    **encode_message(stream.content, stream.reasoning, stream.images),
+                )
+            if stream.content:
+                session_history.append({"id": assistant_message_id, "role": "assistant", "content": stream.content})
+                maybe_schedule_fold(chat_session, session_history)
+
+        stream.publish({"type": "stream_end"})
+
+    except UpstreamBusy as e:
+        outcome = "busy"
+        logger.warning("🚦 %s (Oturum: %s)", e, chat_session.id)
+        stream.publish({"type": "error", "message": str(e)}); stream.publish({"type": "stream_end"})
+    except Exception as e:
+        error_message = f"API Error or unexpected error: {str(e)}"; logger.exception(error_message)
+        stream.publish({"type": "error", "message": error_message}); stream.publish({"type": "stream_end"})
+    finally:
+        CHAT_TURNS_TOTAL.inc(model=model_for_api_call, outcome=outcome)
+        if trace := current_trace():
+            trace.finish(outcome=outcome, model=model_for_api_call, events=stream.last_seq)
 
 @router.websocket("/ws/chat/{session_id_or_new}")
 async def websocket_endpoint(
     websocket: WebSocket, 
     session_id_or_new: str,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_db)
 ):
     await websocket.accept()
+    writer = CoalescingWriter(websocket)
 
     chat_session: models.ChatSession
     model_for_api_call: str
 
+    # Model seçimi oturuma aittir: bağlantıda ?model= ile ya da mesaj çerçevesindeki "model" alanıyla gelir
+    # ve yalnızca değiştiğinde oturuma yazılır. Süreç içi global durum tutulmaz; birden çok worker güvenle çalışır.
+    requested_model = websocket.query_params.get("model")
+    if requested_model and requested_model not in AVAILABLE_MODELS:
+        await writer.send({"type": "error", "message": f"Model '{requested_model}' not found"})
+        await websocket.close(code=1008)
+        return
+
+    # Yeni oturum ?client_id= ile açılan istemcinin kullanıcısına bağlanır (hafıza profili kullanıcı başınadır)
+    client_id = websocket.query_params.get("client_id")
+    if client_id is not None and not CLIENT_ID_PATTERN.match(client_id):
+        await writer.send({"type": "error", "message": "Invalid client_id"})
+        await websocket.close(code=1008)
+        return
+
     if session_id_or_new == "new":
-        model_for_api_call = app_state.get_model()
-        chat_session = models.ChatSession(model_used=model_for_api_call)
+        model_for_api_call = requested_model or DEFAULT_MODEL_NAME
+        chat_session = models.ChatSession(model_used=model_for_api_call, user_id=client_id or DEFAULT_USER_ID)
         db.add(chat_session)
-        db.commit()
-        db.refresh(chat_session)
-        await websocket.send_json({"type": "session_created", "session_id": chat_session.id, "model_used": model_for_api_call})
-        print(f"New chat session created with ID: {chat_session.id} (Model: {AVAILABLE_MODELS.get(model_for_api_call, model_for_api_call)})")
+        if client_id:
+            await adopt_legacy_profile(db, client_id)
+        await db.commit()
+        await db.refresh(chat_session)
+        history_cache.put(chat_session.id, [])
+        await writer.send({"type": "session_created", "session_id": chat_session.id, "model_used": model_for_api_call})
+        logger.info("New chat session created with ID: %s (Model: %s)", chat_session.id, AVAILABLE_MODELS.get(model_for_api_call, model_for_api_call))
     else:
         try:
             session_id = int(session_id_or_new)
-            session = db.query(models.ChatSession).filter(models.ChatSession.id == session_id).first()
+            session = await db.get(models.ChatSession, session_id)
             if not session:
-                await websocket.send_json({"type": "error", "message": "Session not found"})
+                await writer.send({"type": "error", "message": "Session not found"})
                 await websocket.close(code=1008)
                 return
             chat_session = session
+            if requested_model and requested_model != chat_session.model_used:
+                set_committed_value(chat_session, "model_used", requested_model)
             model_for_api_call = chat_session.model_used
-            print(f"Resuming chat session with ID: {chat_session.id} (Model: {AVAILABLE_MODELS.get(model_for_api_call, model_for_api_call)})")
+            # Son aktivite zamanı (ve model değişikliği) bir sonraki toplu yazmayla kaydedilir
+            persistence.touch(chat_session.id, requested_model)
+            # Oturum bu arada başka bir worker'da sürdüyse bu süreçteki geçmiş önbelleği eskimiştir
+            await history_cache.revalidate(chat_session.id, db, after_id=chat_session.rolling_summary_upto_id)
+            logger.info("Resuming chat session with ID: %s (Model: %s)", chat_session.id, AVAILABLE_MODELS.get(model_for_api_call, model_for_api_call))
         except (ValueError, Exception) as e:
-            await websocket.send_json({"type": "error", "message": f"Error loading session: {str(e)}"})
+            await writer.send({"type": "error", "message": f"Error loading session: {str(e)}"})
             await websocket.close(code=1008)
             return
 
-    # Bağlantı kurulduğunda son aktivite zamanını güncelle
-    chat_session.last_active_at = datetime.now(timezone.utc)
-    db.commit()
-    
+    # Okuma transaction'ı bağlantı boyunca açık kalmasın
+    await db.commit()
+
     new_message_sent_in_this_connection = False
+    WS_CONNECTIONS_ACTIVE.inc()
     try:
+        # Oturumda devam eden (ya da yeni bitmiş) bir üretim varsa bağlantı ona katılır.
+        # İstemci ?stream_id=&last_seq= ile son gördüğü olayı bildirirse sadece sonrası gönderilir.
+        if (stream := stream_manager.get(chat_session.id)) is not None:
+            resume_from = _resume_position(websocket, stream)
+            if resume_from is not None:
+                await _forward(writer, stream, resume_from)
+
         while True:
             data = await websocket.receive_text()
+            # Turun aşamaları (ve üretim görevindekiler) bu ize span olarak eklenir
+            trace = start_trace("chat_turn", session_id=chat_session.id)
+            turn_started = trace.started
             new_message_sent_in_this_connection = True
+            WS_FRAMES_RECEIVED_TOTAL.inc()
+            WS_FRAME_BYTES.observe(len(data))
             
-            # Her mesajda son aktivite zamanını güncelle
-            chat_session.last_active_at = datetime.now(timezone.utc)
-            
-            # Model değişikliğini kontrol et: Eğer global state'teki model session'ın model'inden farklıysa, session'ı güncelle
-            current_global_model = app_state.get_model()
-            if chat_session.model_used != current_global_model:
-                chat_session.model_used = current_global_model
-                model_for_api_call = current_global_model
-                print(f"🔄 Model güncellendi: {AVAILABLE_MODELS.get(chat_session.model_used, chat_session.model_used)} (Session ID: {chat_session.id})")
-            
-            db.commit()
+            # Her mesajda son aktivite zamanını güncelle (oturum başına birleştirilip toplu yazılır)
+            persistence.touch(chat_session.id)
 
-            message_history_from_frontend = json.loads(data)
-            
-            last_message = message_history_from_frontend[-1]
-            user_message_content = json.dumps({"content": last_message.get('content', ''), "images": last_message.get('images', [])})
-            db_user_message = models.ChatMessage(session_id=chat_session.id, role="user", content=user_message_content)
-            db.add(db_user_message)
-            db.commit()
+            with span("json_parse"):
+                frame = json.loads(data)
+
+            # Oturum başına aynı anda tek üretim (örn. yeniden bağlanan istemci cevap bitmeden yeni mesaj gönderirse)
+            if stream_manager.is_running(chat_session.id):
+                await writer.send({"type": "error", "message": "A response is still being generated for this chat."})
+                await writer.send({"type": "stream_end"})
+                trace.finish(outcome="rejected")
+                continue
+
+            # Çerçevede model belirtilmişse ve oturumdakinden farklıysa oturumun modelini değiştir
+            if isinstance(frame, dict) and (frame_model := frame.get("model")) and frame_model != model_for_api_call:
+                if frame_model not in AVAILABLE_MODELS:
+                    await writer.send({"type": "error", "message": f"Model '{frame_model}' not found"})
+                    await writer.send({"type": "stream_end"})
+                    trace.finish(outcome="rejected")
+                    continue
+                set_committed_value(chat_session, "model_used", frame_model)
+                model_for_api_call = frame_model
+                persistence.touch(chat_session.id, frame_model)
+                logger.info("🔄 Model güncellendi: %s (Session ID: %s)", AVAILABLE_MODELS.get(model_for_api_call, model_for_api_call), chat_session.id)
+
+            # İki protokol desteklenir:
+            # - {"type": "message", "content": ..., "images": [...], "model": ...}: istemci sadece yeni mesajı gönderir,
+            #   bağlam sunucu tarafındaki geçmiş önbelleğinden kurulur (payload boyutu konuşma uzadıkça büyümez).
+            # - [...tüm geçmiş...]: eski istemciler; listeden sadece son mesaj alınır.
+            # Geçmiş, yeni mesaj kaydedilmeden önce yüklenir; böylece DB'den doldurulursa mesaj iki kez eklenmez.
+            with span("history_load"):
+                session_history = await history_cache.load(chat_session.id, db, after_id=chat_session.rolling_summary_upto_id)
+            if isinstance(frame, dict):
+                last_message = {"role": "user", "content": frame.get("content", ""), "images": frame.get("images", [])}
+            else:
+                last_message = frame[-1]
+
+            # Prompt, yeni mesaj kaydedilmeden önce kurulur: bütçeye sığmayan ya da görseli reddedilen mesaj
+            # ne kaydedilir ne de geçmişe eklenir (aksi halde sonraki her tur o mesajda takılırdı).
+            user_entry = None
+            if isinstance(last_message.get("content"), str) and last_message["content"]:
+                user_entry = {"role": "user", "content": last_message["content"]}
 
             api_messages = []
 
-            # 1. UZUN SÜRELİ HAFIZAYI YÜKLE
-            profile = db.query(models.UserProfile).filter(models.UserProfile.id == 1).first()
-            if profile and profile.auto_summary_json and profile.auto_summary_json != "{}":
-                try:
-                    summary_data = json.loads(profile.auto_summary_json)
-                    facts = [f"- {key.replace('_', ' ').title()}: {value}" for key, value in summary_data.items()]
-                    formatted_summary = "\n".join(facts)
-                    memory_message = {"role": "system", "content": f"This is a summary of what you know about the user. Use this information to personalize your responses:\n{formatted_summary}"}
-                    api_messages.append(memory_message)
-                    print(f"🧠 Otomatik hafıza yüklendi.")
-                except json.JSONDecodeError:
-                    print("⚠️ Hafıza JSON'u bozuk, yüklenemedi.")
-
-            # 2. CANLI SOHBET ÖNBELLEĞİNİ UYGULA
+            # 1. UZUN SÜRELİ HAFIZAYI YÜKLE (render edilmiş hali sürüm kontrollü önbellekten gelir)
+            with span("profile_load"):
+                memory_message = await profile_cache.get_memory_message(db, chat_session.user_id or DEFAULT_USER_ID)
+            # Okuma transaction'ı cevap üretimi boyunca açık kalmasın; bağlantı havuza geri döner
+            await db.commit()
+            if memory_message:
+                api_messages.append(memory_message)
+
+            # 2. KAYAN ÖZETİ EKLE
             def convert_message_to_api_format(message):
-                content = message.get("content", "")
-                if isinstance(content, str) and content:
-                    return {"role": message["role"], "content": [{"type": "text", "text": content}]}
-                if isinstance(content, list):
-                    return {"role": message["role"], "content": content}
-                return message
-            
-            cache_boundary = (len(message_history_from_frontend) // 10) * 10
-            if cache_boundary > 0:
-                messages_to_cache = message_history_from_frontend[:cache_boundary]
-                messages_after_cache = message_history_from_frontend[cache_boundary:]
-                
-                cached_history_text = ""
-                for msg in messages_to_cache:
-                    content = msg.get("content", "")
-                    if isinstance(content, str) and content:
-                        cached_history_text += f"{msg.get('role', 'unknown')}: {content}\n\n"
-
-                system_message = {
-                    "role": "system",
-                    "content": [
-                        {"type": "text", "text": f"Here is a summary of the conversation so far (messages 1-{cache_boundary}). Use this for context:"},
-                        {"type": "text", "text": cached_history_text, "cache_control": {"type": "ephemeral"}}
-                    ]
-                }
-                api_messages.append(system_message)
-                
-                for msg in messages_after_cache:
-                    api_messages.append(convert_message_to_api_format(msg))
-            else:
-                api_messages.extend([convert_message_to_api_format(msg) for msg in message_history_from_frontend])
-            
+                return {"role": message["role"], "content": [{"type": "text", "text": message["content"]}]}
+
+            if summary_message := build_summary_message(chat_session):
+                api_messages.append(summary_message)
+
+            # 3. MODELİN CONTEXT BÜTÇESİNE SIĞDIR: sığmayan en eski mesajlar düşer
+            try:
+                with span("prompt_build"):
+                    prompt_history = fit_history(model_for_api_call, api_messages, (session_history + [user_entry]) if user_entry else session_history)
+                    api_messages.extend([convert_message_to_api_format(msg) for msg in prompt_history])
+            except ContextBudgetExceeded as e:
+                await writer.send({"type": "error", "message": str(e)}); await writer.send({"type": "stream_end"})
+                trace.finish(outcome="context_exceeded")
+                continue
+
+            # Yüklenen görseller satıra base64 olarak değil, blob referansı olarak yazılır
+            try:
+                user_images = [await externalize_image(image) for image in last_message.get('images', [])]
+            except BlobRejected as e:
+                await writer.send({"type": "error", "message": str(e)}); await writer.send({"type": "stream_end"})
+                trace.finish(outcome="rejected")
+                continue
+            with span("user_commit"):
+                user_message_id = await persistence.add_message(
+                    session_id=chat_session.id, role="user", **encode_message(last_message.get('content', ''), images=user_images)
+                )
+            if user_entry:
+                user_entry["id"] = user_message_id
+                session_history.append(user_entry)
+
             # --- Geri kalan kod (API Çağrısı, Streaming, DB Kayıt) aynı ---
             headers = {"Authorization": f"Bearer {OPENROUTER_API_KEY}","X-Title": "test chat",  "Content-Type": "application/json"}
             payload = {"model": model_for_api_call, "messages": api_messages, "stream": True}
@@ -135,59 +351,29 @@ async def websocket_endpoint(
             if model_for_api_call in IMAGE_GENERATION_MODELS: payload["modalities"] = ["image", "text"]
             if model_for_api_call in REASONING_MODELS_MAX_TOKENS: payload["max_tokens"] = REASONING_MODELS_MAX_TOKENS[model_for_api_call]
 
-            try:
-                async with httpx.AsyncClient(timeout=300.0) as client:
-                    async with client.stream("POST", OPENROUTER_API_URL, headers=headers, json=payload) as response:
-                        response.raise_for_status()
-                        
-                        assistant_response_content, assistant_reasoning_content, assistant_images = "", "", []
-
-                        async for line in response.aiter_lines():
-                            if not line.strip() or not line.startswith('data: '): continue
-                            data_str = line[6:]
-                            if data_str == '[DONE]': break
-                            try:
-                                data_obj = json.loads(data_str)
-                                choice = data_obj.get("choices", [{}])[0]
-                                delta = choice.get("delta", {})
-                                message = choice.get("message", {})
-                                
-                                if reasoning := delta.get("reasoning"): assistant_reasoning_content += reasoning; await websocket.send_json({"type": "reasoning", "content": reasoning})
-                                if content := delta.get("content"): assistant_response_content += content; await websocket.send_json({"type": "chat_message", "content": content})
-                                if images_in_chunk := delta.get("images") or message.get("images"):
-                                    for image in images_in_chunk:
-                                        if (image_url := image.get("image_url", {}).get("url") or image.get("url")) and image_url not in assistant_images:
-                                            assistant_images.append(image_url); await websocket.send_json({"type": "image", "image_url": image_url})
-                            except json.JSONDecodeError: print(f"⚠️ JSON decode error, data: {data_str[:200]}")
-
-                message_data = {"content": assistant_response_content, "reasoning": assistant_reasoning_content, "images": assistant_images}
-                message_data = {k: v for k, v in message_data.items() if v}
-                if message_data:
-                    db_assistant_message = models.ChatMessage(session_id=chat_session.id, role="assistant", content=json.dumps(message_data))
-                    db.add(db_assistant_message); db.commit()
-                
-                await websocket.send_json({"type": "stream_end"})
-
-            except Exception as e:
-                error_message = f"API Error or unexpected error: {str(e)}"; print(error_message)
-                await websocket.send_json({"type": "error", "message": error_message}); await websocket.send_json({"type": "stream_end"})
+            # Üretim soketten bağımsız bir görevde çalışır; bu bağlantı sadece olaylarını iletir.
+            # Soket koparsa görev sürer, cevap yine kaydedilir ve istemci kaldığı yerden devam edebilir.
+            stream = stream_manager.start(chat_session.id, functools.partial(
+                _generate_reply, chat_session=chat_session, model_for_api_call=model_for_api_call, payload=payload,
+                headers=headers, api_messages=api_messages, session_history=session_history, turn_started=turn_started,
+            ))
+            await _forward(writer, stream)
 
     except WebSocketDisconnect:
         try:
             if chat_session and hasattr(chat_session, 'id') and chat_session.id and new_message_sent_in_this_connection:
-                session_id, disconnected_at, delay_seconds = chat_session.id, datetime.now(timezone.utc), 15
-                print(f"--- ⌛ Kullanıcı ayrıldı (Oturum: {session_id}). Özetleme {delay_seconds} sn sonra için programlandı. ---")
-                background_tasks.add_task(run_summary_if_inactive, session_id, disconnected_at, delay_seconds)
+                logger.info("⌛ Kullanıcı ayrıldı (Oturum: %s).", chat_session.id)
+                await enqueue_summary(chat_session.id)
             else:
                 session_id = chat_session.id if chat_session and hasattr(chat_session, 'id') else "unknown"
-                print(f"--- ⏭️ Client disconnected for session {session_id}. No new messages, skipping summary. ---")
-        except Exception as e:
-            print(f"--- ❌ Error in WebSocketDisconnect handler: {e} ---")
+                logger.info("⏭️ Client disconnected for session %s. No new messages, skipping summary.", session_id)
+        except Exception:
+            logger.exception("❌ Error in WebSocketDisconnect handler")
             
     except Exception as e:
         session_id = chat_session.id if chat_session and hasattr(chat_session, 'id') else "unknown"
-        print(f"--- ❌ Error in WebSocket session {session_id}: {e} ---")
-        import traceback
-        print(f"--- ❌ Traceback: {traceback.format_exc()} ---")
+        logger.exception("❌ Error in WebSocket session %s: %s", session_id, e)
     finally:
-        db.close()
\ No newline at end of file
+        WS_CONNECTIONS_ACTIVE.dec()
+        writer.close()
+        await db.close()
\ No newline at end of file
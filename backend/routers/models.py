@@ -1,25 +1,29 @@
 from fastapi import APIRouter, HTTPException
-from config import AVAILABLE_MODELS, app_state
+from config import AVAILABLE_MODELS, DEFAULT_MODEL_NAME
 
 router = APIRouter()
 
 @router.get("/api/models")
 def get_available_models():
-    """Tüm kullanılabilir modelleri ve şu anki seçili modeli döndürür."""
+    """Tüm kullanılabilir modelleri ve yeni oturumlar için varsayılan modeli döndürür."""
     return {
         "available_models": AVAILABLE_MODELS,
-        "current_model": app_state.get_model()
+        "default_model": DEFAULT_MODEL_NAME,
+        # Eski istemciler için; seçim artık oturum başına WebSocket üzerinden yapılır
+        "current_model": DEFAULT_MODEL_NAME
     }
 
 @router.post("/api/models/select/{model_id:path}")
 def select_model(model_id: str):
-    """Kullanılacak modeli seçer."""
-    if not app_state.set_model(model_id):
+    """
+    Modelin geçerli olduğunu doğrular. Sunucu tarafında global bir seçim tutulmaz;
+    istemci modeli WebSocket bağlantısında (?model=) ya da mesaj çerçevesinde ("model") gönderir.
+    """
+    if model_id not in AVAILABLE_MODELS:
         raise HTTPException(status_code=400, detail=f"Model '{model_id}' not found")
-    
-    current_model_id = app_state.get_model()
+
     return {
-        "message": f"Model changed to {AVAILABLE_MODELS[current_model_id]}",
-        "current_model": current_model_id,
-        "model_name": AVAILABLE_MODELS[current_model_id]
-    }
\ No newline at end of file
+        "message": f"Model changed to {AVAILABLE_MODELS[model_id]}",
+        "current_model": model_id,
+        "model_name": AVAILABLE_MODELS[model_id]
+    }
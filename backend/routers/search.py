@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+import database
+from services.search import search_messages
+
+router = APIRouter()
+
+@router.get("/api/search")
+async def search(
+    q: str = Query(..., min_length=1, max_length=256),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10000),
+    session_id: int | None = None,
+    db: AsyncSession = Depends(database.get_db)
+):
+    """
+    Tüm sohbet geçmişinde tam metin arama. Sonuçlar alaka puanına göre sıralıdır; her sonuç
+    mesaj ve oturum id'sini ve eşleşen terimleri <mark> ile vurgulanmış (HTML-escape edilmiş) bir snippet taşır.
+    session_id verilirse arama tek oturumla sınırlanır.
+    """
+    hits, has_more = await search_messages(db, q, limit, offset, session_id)
+    return {
+        "query": q,
+        "hits": hits,
+        "next_offset": offset + limit if has_more else None
+    }
@@ -1,65 +1,99 @@
-import json
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 import models
 import schemas
 import database
+from services.message_format import decode_message, message_text
 
 router = APIRouter()
 
-def parse_message_content(content: str):
-    """Parse message content which may be JSON format (with images, reasoning) or plain string."""
-    if not content:
-        return {"content": "", "reasoning": None, "images": []}
-    
-    try:
-        parsed = json.loads(content)
-        if isinstance(parsed, dict):
-            return {
-                "content": parsed.get("content", ""),
-                "reasoning": parsed.get("reasoning"),
-                "images": parsed.get("images", [])
-            }
-        else:
-            return {"content": str(parsed), "reasoning": None, "images": []}
-    except (json.JSONDecodeError, TypeError):
-        return {"content": content, "reasoning": None, "images": []}
+def _before(model, before_id: int):
+    """
+    (created_at, id) keyset koşulu. Cursor satırının created_at değeri alt sorguyla okunur;
+    böylece cursor sadece id'dir ve zaman damgası biçimi (örn. SQLite) karşılaştırmayı bozmaz.
+    """
+    cursor_created_at = select(model.created_at).where(model.id == before_id).scalar_subquery()
+    return tuple_(model.created_at, model.id) < tuple_(cursor_created_at, before_id)
 
-@router.get("/api/sessions", response_model=List[schemas.ChatSessionBase])
-def get_sessions(db: Session = Depends(database.get_db)):
-    """Tüm sohbet oturumlarını en yeniden en eskiye doğru listeler."""
-    sessions = db.query(models.ChatSession).order_by(models.ChatSession.created_at.desc()).all()
-    return sessions
+@router.get("/api/sessions", response_model=schemas.ChatSessionPage)
+async def get_sessions(
+    limit: int = Query(50, ge=1, le=200),
+    before_id: int | None = None,
+    db: AsyncSession = Depends(database.get_db)
+):
+    """Sohbet oturumlarını en yeniden en eskiye doğru, sayfa sayfa listeler."""
+    query = select(models.ChatSession.id, models.ChatSession.created_at)
+    if before_id is not None:
+        query = query.where(_before(models.ChatSession, before_id))
+    rows = (await db.execute(
+        query.order_by(models.ChatSession.created_at.desc(), models.ChatSession.id.desc()).limit(limit + 1)
+    )).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "sessions": [{"id": row.id, "created_at": row.created_at} for row in rows],
+        "next_cursor": rows[-1].id if has_more else None
+    }
 
 @router.get("/api/sessions/{session_id}")
-def get_session_messages(session_id: int, db: Session = Depends(database.get_db)):
-    """Belirli bir sohbet oturumuna ait tüm mesajları döndürür."""
-    session = db.query(models.ChatSession).filter(models.ChatSession.id == session_id).first()
+async def get_session_messages(
+    session_id: int,
+    limit: int = Query(100, ge=1, le=500),
+    before_id: int | None = None,
+    include_heavy: bool = True,
+    db: AsyncSession = Depends(database.get_db)
+):
+    """
+    Belirli bir sohbet oturumunun mesajlarını döndürür: en yeni `limit` mesaj (veya
+    before_id'den öncekiler) kronolojik sırayla. include_heavy=false ise reasoning ve görseller atlanır.
+    """
+    session = await db.get(models.ChatSession, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-    
+
+    # include_heavy=false iken reasoning ve ekler kolon düzeyinde okunmaz
+    columns = [
+        models.ChatMessage.id, models.ChatMessage.session_id, models.ChatMessage.role, models.ChatMessage.created_at,
+        models.ChatMessage.format_version, models.ChatMessage.text, models.ChatMessage.content,
+    ]
+    if include_heavy:
+        columns += [models.ChatMessage.reasoning, models.ChatMessage.attachments]
+    query = select(*columns).where(models.ChatMessage.session_id == session_id)
+    if before_id is not None:
+        query = query.where(_before(models.ChatMessage, before_id))
+    messages = (await db.execute(
+        query.order_by(models.ChatMessage.created_at.desc(), models.ChatMessage.id.desc()).limit(limit + 1)
+    )).all()
+
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    messages.reverse()
+
     parsed_messages = []
-    for message in session.messages:
-        if not message.content or not message.content.strip():
+    for message in messages:
+        parsed = decode_message(message) if include_heavy else {"content": message_text(message)}
+        if not (parsed["content"] or parsed.get("reasoning") or parsed.get("images")):
             continue
-        
-        parsed = parse_message_content(message.content)
+
         message_obj = {
             "id": message.id,
             "session_id": message.session_id,
             "role": message.role,
             "content": parsed["content"],
-            "images": parsed["images"],
             "created_at": message.created_at.isoformat() if message.created_at else None
         }
-        if parsed.get("reasoning"):
-            message_obj["reasoning"] = parsed["reasoning"]
+        if include_heavy:
+            message_obj["images"] = parsed["images"]
+            if parsed.get("reasoning"):
+                message_obj["reasoning"] = parsed["reasoning"]
         parsed_messages.append(message_obj)
-    
+
     return {
         "id": session.id,
         "created_at": session.created_at.isoformat() if session.created_at else None,
         "model_used": session.model_used,
-        "messages": parsed_messages
-    }
\ No newline at end of file
+        "messages": parsed_messages,
+        "next_cursor": messages[0].id if has_more else None
+    }
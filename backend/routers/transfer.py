@@ -0,0 +1,29 @@
+from datetime import datetime
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+from database import AsyncSessionLocal
+from services.transfer import export_ndjson
+
+router = APIRouter()
+
+@router.get("/api/export")
+async def export_sessions(
+    session_id: list[int] | None = Query(None),
+    created_after: datetime | None = None,
+    created_before: datetime | None = None
+):
+    """
+    Oturumları ve mesajlarını NDJSON olarak akıtır (ilk satır başlık, sonra oturum kullanıcılarının hafıza
+    profilleri, oturumlar, mesajlar; mesajların kullandığı görseller, ilk kullanıldıkları mesajdan önce base64
+    "blob" satırı olarak gelir). session_id tekrarlanabilir; created_after/created_before oturumun oluşturulma
+    zamanına göre süzer. İçe aktarım HTTP üzerinden sunulmaz, yalnızca cli.py ile yapılır.
+    """
+    async def body():
+        # Yanıt gövdesi dependency'ler kapandıktan sonra üretildiği için oturum burada açılır
+        async with AsyncSessionLocal() as db:
+            async for chunk in export_ndjson(db, session_id, created_after, created_before):
+                yield chunk
+
+    filename = f"chat-export-{datetime.now():%Y%m%d-%H%M%S}.ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    return StreamingResponse(body(), media_type="application/x-ndjson", headers=headers)
@@ -22,4 +22,9 @@ class ChatSessionWithMessages(ChatSessionBase):
     model_used: str
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class ChatSessionPage(BaseModel):
+    sessions: list[ChatSessionBase]
+    # Bir sonraki (daha eski) sayfa için before_id; son sayfada None
+    next_cursor: int | None = None
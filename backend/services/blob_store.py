@@ -0,0 +1,154 @@
+# backend/services/blob_store.py
+
+import asyncio
+import base64
+import binascii
+import contextlib
+import hashlib
+import os
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import AsyncIterator
+from config import BLOB_STORE_DIR, BLOB_MAX_BYTES
+
+BLOB_URL_PREFIX = "/api/blobs/"
+CHUNK_SIZE = 64 * 1024
+
+# Blob'lar API ile aynı origin'den servis edilir; HTML/SVG gibi betik çalıştırabilen türler kabul edilmez.
+# Tür, istemcinin bildirdiğine değil dosyanın imzasına (magic bytes) göre belirlenir.
+IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+ALLOWED_CONTENT_TYPES = frozenset({"image/png", "image/jpeg", "image/gif", "image/webp"})
+
+
+class BlobRejected(ValueError):
+    """Data URL desteklenen bir raster görsel değil ya da boyut sınırını aşıyor."""
+
+
+def sniff_image_type(data: bytes) -> str | None:
+    for signature, content_type in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+@dataclass
+class BlobInfo:
+    content_type: str
+    size: int
+
+
+class BlobStore(ABC):
+    """
+    İçerik adresli blob deposu arayüzü: blob'lar SHA-256 özetleriyle saklanır,
+    aynı içerik ikinci kez yazılmaz. Yeni backend'ler (örn. S3) bu sınıfı uygular.
+    """
+
+    @abstractmethod
+    async def put(self, data: bytes, content_type: str) -> str:
+        ...
+
+    @abstractmethod
+    async def stat(self, blob_hash: str) -> BlobInfo | None:
+        ...
+
+    @abstractmethod
+    def iter_chunks(self, blob_hash: str) -> AsyncIterator[bytes]:
+        ...
+
+
+class LocalBlobStore(BlobStore):
+    """Blob'ları yerel dosya sisteminde <kök>/<ab>/<cd>/<hash> yolunda saklar."""
+
+    def __init__(self, root: str = BLOB_STORE_DIR):
+        self.root = root
+
+    def _path(self, blob_hash: str) -> str:
+        return os.path.join(self.root, blob_hash[:2], blob_hash[2:4], blob_hash)
+
+    @staticmethod
+    def _replace_atomically(path: str, data: bytes):
+        # Her yazım kendi geçici dosyasına: aynı blob'u eşzamanlı yazan thread'ler birbirini ezmez.
+        # Hedef zaten varsa os.replace onu aynı içerikle değiştirir; bu da başarıdır.
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(tmp_path)
+            raise
+
+    def _write(self, blob_hash: str, data: bytes, content_type: str):
+        path = self._path(blob_hash)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Tür dosyası veriden önce yazılır: blob dosyası göründüğünde türü de hazırdır.
+        # Arada çökülürse kalan tür dosyası tamdır ve bir sonraki yazımda üzerine yazılır.
+        self._replace_atomically(f"{path}.type", content_type.encode("ascii"))
+        self._replace_atomically(path, data)
+
+    async def put(self, data: bytes, content_type: str) -> str:
+        blob_hash = hashlib.sha256(data).hexdigest()
+        await asyncio.to_thread(self._write, blob_hash, data, content_type)
+        return blob_hash
+
+    def _stat(self, blob_hash: str) -> BlobInfo | None:
+        path = self._path(blob_hash)
+        try:
+            size = os.path.getsize(path)
+            with open(f"{path}.type") as f:
+                content_type = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return BlobInfo(content_type=content_type or "application/octet-stream", size=size)
+
+    async def stat(self, blob_hash: str) -> BlobInfo | None:
+        return await asyncio.to_thread(self._stat, blob_hash)
+
+    async def iter_chunks(self, blob_hash: str) -> AsyncIterator[bytes]:
+        f = await asyncio.to_thread(open, self._path(blob_hash), "rb")
+        try:
+            while chunk := await asyncio.to_thread(f.read, CHUNK_SIZE):
+                yield chunk
+        finally:
+            f.close()
+
+
+blob_store: BlobStore = LocalBlobStore()
+
+
+async def externalize_image(url: str) -> str:
+    """
+    Base64 data URL'i blob deposuna yazar ve yerine /api/blobs/{hash} referansını döndürür.
+    Data URL olmayan (zaten referans ya da harici) adresler olduğu gibi döner.
+    PNG/JPEG/GIF/WebP dışındaki ya da BLOB_MAX_BYTES'tan büyük data URL'ler BlobRejected ile reddedilir.
+    """
+    if not isinstance(url, str) or not url.startswith("data:"):
+        return url
+    header, _, encoded = url.partition(",")
+    if not header.endswith(";base64"):
+        raise BlobRejected("Only base64 image data URLs are accepted")
+    # Çözmeden önce kabaca kontrol: base64 her 4 karakterde 3 bayt taşır
+    if len(encoded) * 3 // 4 > BLOB_MAX_BYTES + 3:
+        raise BlobRejected(f"Image is larger than {BLOB_MAX_BYTES} bytes")
+    try:
+        data = base64.b64decode(encoded, validate=False)
+    except (binascii.Error, ValueError):
+        raise BlobRejected("Invalid base64 image data")
+    if len(data) > BLOB_MAX_BYTES:
+        raise BlobRejected(f"Image is larger than {BLOB_MAX_BYTES} bytes")
+    content_type = sniff_image_type(data)
+    if content_type is None:
+        raise BlobRejected("Only PNG, JPEG, GIF and WebP images are accepted")
+    blob_hash = await blob_store.put(data, content_type)
+    return f"{BLOB_URL_PREFIX}{blob_hash}"
@@ -0,0 +1,23 @@
+# backend/services/fast_json.py
+
+# Sıcak yoldaki (token akışı) JSON işlemleri için: orjson varsa onu, yoksa standart json'u kullanır.
+try:
+    import orjson
+
+    def loads(data: bytes | str):
+        return orjson.loads(data)
+
+    def dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+
+    JSONDecodeError = orjson.JSONDecodeError
+except ImportError:  # orjson opsiyonel
+    import json
+
+    def loads(data: bytes | str):
+        return json.loads(data)
+
+    def dumps(obj) -> str:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+    JSONDecodeError = json.JSONDecodeError
@@ -0,0 +1,110 @@
+# backend/services/history_store.py
+
+import time
+from collections import OrderedDict
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+from config import HISTORY_CACHE_MAX_SESSIONS, HISTORY_CACHE_TTL_SECONDS
+from services.message_format import message_text
+
+# revalidate() son metinli mesajı bulmak için en yeni bu kadar satıra bakar
+REVALIDATE_SCAN_ROWS = 50
+
+
+class HistoryCache:
+    """
+    Oturum başına konuşma geçmişini (prompt için gereken metin kısmını) bellekte tutar.
+    Kayan özete katlanan mesajlar listeden düşürülür, böylece girdi boyutu sınırlı kalır.
+    En az kullanılan oturumlar LRU ile, uzun süre dokunulmayanlar TTL ile düşürülür;
+    önbellekte olmayan bir oturum ilk erişimde veritabanından doldurulur. Yeniden bağlanmada
+    revalidate() ile veritabanındaki son mesaja göre doğrulanır (oturum başka worker'da sürmüş olabilir).
+    """
+
+    def __init__(self, max_sessions: int = HISTORY_CACHE_MAX_SESSIONS, ttl_seconds: float = HISTORY_CACHE_TTL_SECONDS):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[int, tuple[float, list[dict]]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, session_id: int) -> list[dict] | None:
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        touched_at, messages = entry
+        if time.monotonic() - touched_at > self.ttl_seconds:
+            del self._entries[session_id]
+            return None
+        self._entries[session_id] = (time.monotonic(), messages)
+        self._entries.move_to_end(session_id)
+        return messages
+
+    def put(self, session_id: int, messages: list[dict]):
+        self._entries[session_id] = (time.monotonic(), messages)
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.max_sessions:
+            self._entries.popitem(last=False)
+
+    def drop(self, session_id: int):
+        self._entries.pop(session_id, None)
+
+    @staticmethod
+    def _text_query(session_id: int):
+        # Sadece metin okunur: reasoning ve ekler sorguya girmez (content eski biçimli satırlar için)
+        return select(
+            models.ChatMessage.id, models.ChatMessage.role, models.ChatMessage.format_version,
+            models.ChatMessage.text, models.ChatMessage.content,
+        ).where(models.ChatMessage.session_id == session_id)
+
+    async def revalidate(self, session_id: int, db: AsyncSession, after_id: int | None = None):
+        """
+        Oturuma yeniden bağlanılırken önbellekteki listeyi veritabanıyla karşılaştırır. Araya başka bir
+        worker'ın yazdığı mesajlar girdiyse (son id farklı) ya da o worker listenin bir kısmını kayan özete
+        katladıysa (after_id listenin içine düşüyor) kayıt düşürülür; sonraki load() veritabanından doldurur.
+        Önbellek yalnızca metinli mesajları tuttuğu için karşılaştırma da son metinli mesajın id'siyle yapılır;
+        sadece görsel içeren mesajlar kaydı geçersiz kılmaz.
+        """
+        messages = self._entries.get(session_id, (0, None))[1]
+        if messages is None:
+            return
+        rows = (await db.execute(
+            self._text_query(session_id).order_by(models.ChatMessage.id.desc()).limit(REVALIDATE_SCAN_ROWS)
+        )).all()
+        latest_ids = [row.id for row in rows if message_text(row)]
+        if not latest_ids and len(rows) == REVALIDATE_SCAN_ROWS:
+            # Pencerede metinli mesaj yok; emin olunamadığı için kayıt yeniden doldurulur
+            self.drop(session_id)
+            return
+        latest_id = latest_ids[0] if latest_ids else None
+        if latest_id is not None and after_id and latest_id <= after_id:
+            latest_id = None  # tümü kayan özete katlanmış
+        cached_latest_id = messages[-1]["id"] if messages else None
+        if latest_id != cached_latest_id or (after_id and messages and messages[0]["id"] <= after_id):
+            self.drop(session_id)
+
+    async def load(self, session_id: int, db: AsyncSession, after_id: int | None = None) -> list[dict]:
+        """
+        Oturum geçmişini önbellekten, yoksa ChatMessage satırlarından döndürür.
+        after_id verilirse (kayan özetin kapsadığı son mesaj) sadece ondan sonraki mesajlar okunur.
+        """
+        messages = self.get(session_id)
+        if messages is not None:
+            return messages
+
+        query = self._text_query(session_id)
+        if after_id:
+            query = query.where(models.ChatMessage.id > after_id)
+        # id sırası commit sırasıdır; revalidate() ve kayan özetin watermark'ı da id'ye göre çalışır
+        rows = (await db.execute(query.order_by(models.ChatMessage.id))).all()
+        messages = []
+        for row in rows:
+            text_content = message_text(row)
+            if text_content:
+                messages.append({"id": row.id, "role": row.role, "content": text_content})
+        self.put(session_id, messages)
+        return messages
+
+
+history_cache = HistoryCache()
@@ -0,0 +1,57 @@
+# backend/services/logger.py
+
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from config import LOG_LEVEL
+
+LOGGER_NAME = "ai_chat"
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+
+_listener: QueueListener | None = None
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """
+    Kaydı biçimlendirmeden kuyruğa bırakır; mesaj biçimlendirme ve stderr'e yazma
+    dinleyici thread'inde yapılır. Böylece loglama event loop'u bloklamaz.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Varsayılan prepare() mesajı bu thread'de biçimlendirir; sadece exc_info metne çevrilir
+        # (traceback nesneleri thread'ler arasında tutulmasın diye)
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging():
+    """Uygulama logger'ını kuyruk tabanlı (asenkron) hale getirir. Birden çok çağrılması güvenlidir."""
+    global _listener
+    if _listener is not None:
+        return
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    root = logging.getLogger(LOGGER_NAME)
+    root.setLevel(LOG_LEVEL)
+    root.handlers = [_NonBlockingQueueHandler(log_queue)]
+    root.propagate = False
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Kuyruktaki kayıtları yazıp dinleyici thread'ini durdurur."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
@@ -1,54 +1,159 @@
 # backend/services/memory_service.py
 
 import json
-import asyncio
-import httpx
-from datetime import datetime, timezone
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update, or_
+from sqlalchemy.ext.asyncio import AsyncSession
 import models
+from database import dialect_insert
 from config import (
-    OPENROUTER_API_KEY, OPENROUTER_API_URL, MEMORY_CHARACTER_LIMIT, SUMMARIZER_MODEL
+    OPENROUTER_API_KEY, MEMORY_CHARACTER_LIMIT, SUMMARIZER_MODEL, DEFAULT_USER_ID, PROFILE_WRITE_MAX_ATTEMPTS,
+    ADOPT_LEGACY_PROFILE
 )
+from services.scheduler import scheduled_post
+from services.profile_cache import profile_cache
+from services.message_format import message_text
+from services.logger import get_logger
+from services.metrics import SUMMARY_STAGE_SECONDS, PROFILE_WRITES_TOTAL, span
 
+logger = get_logger("memory")
 
+_MISSING = object()
 
-async def generate_and_update_profile_summary(session_id: int, db: Session):
+
+class ProfileConflict(Exception):
+    """Profil, denemeler boyunca her seferinde başka bir iş tarafından güncellendi."""
+
+
+def _parse_profile(auto_summary_json: str | None) -> dict:
+    try:
+        parsed = json.loads(auto_summary_json or "{}")
+    except json.JSONDecodeError:
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
+
+
+def merge_profiles(base: dict, ours: dict, theirs: dict) -> dict:
+    """
+    Anahtar düzeyinde 3 yönlü birleştirme. base iki güncellemenin de okuduğu profil, ours bu işin
+    ürettiği, theirs o arada başka bir işin yazdığı profildir. Yalnızca bir tarafın değiştirdiği
+    (ya da sildiği) anahtar o taraftan alınır; iki taraf da değiştirdiyse bu işin değeri kazanır.
+    """
+    merged = {}
+    for key in dict.fromkeys([*theirs, *ours, *base]):
+        base_value = base.get(key, _MISSING)
+        ours_value = ours.get(key, _MISSING)
+        value = theirs.get(key, _MISSING) if ours_value == base_value else ours_value
+        if value is not _MISSING:
+            merged[key] = value
+    return merged
+
+
+async def load_profile(db: AsyncSession, user_id: str):
+    """Kullanıcının profil satırını (auto_summary_json, version) döndürür; yoksa boş profil oluşturur."""
+    query = select(models.UserProfile.auto_summary_json, models.UserProfile.version).where(models.UserProfile.user_id == user_id)
+    row = (await db.execute(query)).first()
+    if row is None:
+        insert = dialect_insert(db)
+        await db.execute(
+            insert(models.UserProfile).values(user_id=user_id, auto_summary_json="{}", version=0)
+            .on_conflict_do_nothing(index_elements=[models.UserProfile.user_id])
+        )
+        row = (await db.execute(query)).one()
+    return row
+
+
+async def save_profile(db: AsyncSession, user_id: str, base_version: int, base: dict, ours: dict) -> tuple[str, int]:
+    """
+    Profili iyimser kilitle yazar: UPDATE yalnızca sürüm hâlâ base_version ise uygulanır. Başka bir iş
+    araya girdiyse güncel profil okunur, anahtar düzeyinde birleştirilir ve yeni sürümle tekrar denenir;
+    hiçbir işin bulguları sessizce ezilmez. Commit çağırana aittir. (yazılan JSON, yeni sürüm) döndürür.
+    """
+    summary, version = ours, base_version
+    for _ in range(PROFILE_WRITE_MAX_ATTEMPTS):
+        summary_json = json.dumps(summary, ensure_ascii=False)
+        result = await db.execute(
+            update(models.UserProfile)
+            .where(models.UserProfile.user_id == user_id, models.UserProfile.version == version)
+            .values(auto_summary_json=summary_json, version=version + 1)
+        )
+        if result.rowcount == 1:
+            PROFILE_WRITES_TOTAL.inc(outcome="written" if version == base_version else "merged")
+            return summary_json, version + 1
+        current = await load_profile(db, user_id)
+        logger.info("🔀 Profil başka bir iş tarafından güncellenmiş (kullanıcı: %s, sürüm %s -> %s); birleştiriliyor.", user_id, version, current.version)
+        summary, version = merge_profiles(base, ours, _parse_profile(current.auto_summary_json)), current.version
+    PROFILE_WRITES_TOTAL.inc(outcome="conflict")
+    raise ProfileConflict(f"Profile of user {user_id!r} kept changing; gave up after {PROFILE_WRITE_MAX_ATTEMPTS} attempts")
+
+
+async def adopt_legacy_profile(db: AsyncSession, user_id: str) -> bool:
+    """
+    Henüz profili olmayan kullanıcıya eski paylaşımlı ("default") profili ve client_id'siz eski oturumları
+    devreder. Koşullu tek UPDATE olduğu için eşzamanlı bağlanan istemcilerden yalnızca biri devralır.
+    Commit çağırana aittir. Devralındıysa True döner.
+    """
+    if not ADOPT_LEGACY_PROFILE or user_id == DEFAULT_USER_ID:
+        return False
+    has_profile = select(models.UserProfile.id).where(models.UserProfile.user_id == user_id).exists()
+    result = await db.execute(
+        update(models.UserProfile)
+        .where(models.UserProfile.user_id == DEFAULT_USER_ID, ~has_profile)
+        .values(user_id=user_id)
+    )
+    if result.rowcount != 1:
+        return False
+    # Eski oturumlar da yeni sahibine geçer; sonraki özetleri devralınan profile yazılır
+    await db.execute(
+        update(models.ChatSession)
+        .where(or_(models.ChatSession.user_id.is_(None), models.ChatSession.user_id == DEFAULT_USER_ID))
+        .values(user_id=user_id)
+    )
+    logger.info("🧠 Eski paylaşımlı hafıza profili kullanıcıya devredildi: %s", user_id)
+    return True
+
+
+async def generate_and_update_profile_summary(session_id: int, db: AsyncSession):
     """
     Sohbet geçmişini analiz eder, kullanıcı hakkında bilgi çıkarır,
     belirlenen karakter limitini aşmamasını sağlar ve profili günceller.
+    Sadece oturumun son analiz edilen mesajından (watermark) sonraki mesajlar modele gönderilir.
     """
-    print(f"\n--- 🧠 Sohbet Sonu Hafıza Analizi Başlatılıyor (Oturum: {session_id}) ---")
-
-    messages = db.query(models.ChatMessage).filter(models.ChatMessage.session_id == session_id).order_by(models.ChatMessage.created_at).all()
+    logger.info("🧠 Sohbet sonu hafıza analizi başlatılıyor (Oturum: %s)", session_id)
+
+    chat_session = await db.get(models.ChatSession, session_id)
+    watermark = chat_session.memory_summarized_upto_id or 0
+    messages = (await db.execute(
+        select(
+            models.ChatMessage.id, models.ChatMessage.role, models.ChatMessage.format_version,
+            models.ChatMessage.text, models.ChatMessage.content,
+        )
+        .where(models.ChatMessage.session_id == session_id, models.ChatMessage.id > watermark)
+        # Watermark id üzerinden tutulur; sıralama da id ile olmalı. Toplu yazmada created_at sırası
+        # id sırasından farklı olabilir, o zaman son satır en büyük id olmaz ve mesaj kaçar ya da tekrar işlenir.
+        .order_by(models.ChatMessage.id)
+    )).all()
     
-    # Analiz için minimum mesaj sayısı (örn: 2 kullanıcı, 2 asistan)
+    # Analiz için minimum yeni mesaj sayısı (örn: 2 kullanıcı, 2 asistan)
     if len(messages) < 4:
-        print("--- 🧠 Hafıza Analizi: Yeterli konuşma olmadığı için atlandı. ---")
+        logger.info("🧠 Hafıza analizi: son analizden (mesaj id %s) bu yana yeterli konuşma olmadığı için atlandı.", watermark)
         return
 
-    profile = db.query(models.UserProfile).filter(models.UserProfile.id == 1).first()
-    if not profile:
-        profile = models.UserProfile(id=1, auto_summary_json="{}")
-        db.add(profile)
-        db.commit()
-        db.refresh(profile)
-    
+    # Profil oturumun kullanıcısına aittir; farklı kullanıcıların işleri birbirini beklemez
+    user_id = chat_session.user_id or DEFAULT_USER_ID
+    profile = await load_profile(db, user_id)
     current_summary_json = profile.auto_summary_json
+    # Okuma transaction'ı LLM çağrısı boyunca açık kalmasın
+    await db.commit()
 
     conversation_text = ""
     for msg in messages:
-        try:
-            content_data = json.loads(msg.content)
-            text_content = content_data.get("content", "")
-        except (json.JSONDecodeError, TypeError):
-            text_content = msg.content
-        if text_content:
+        if text_content := message_text(msg):
             conversation_text += f"{msg.role}: {text_content}\n"
 
     prompt = f"""
     You are a highly intelligent entity tasked with creating a psychological and factual profile of a user based on their conversation.
     Your goal is to update a JSON object that represents the user's memory profile.
-    Analyze the following conversation.
+    Analyze the following conversation excerpt. It only contains the messages since the last analysis; earlier messages are already reflected in the Current Profile JSON.
     - Extract key facts, preferences, personality traits, and any other relevant information about the 'user'.
     - DO NOT invent information. Only use what is explicitly stated or strongly implied in the text.
     - Update the provided "Current Profile JSON". If a key already exists, update its value if new information contradicts or refines it. If the information is new, add a new key.
@@ -75,78 +180,52 @@ async def generate_and_update_profile_summary(session_id: int, db: Session):
     }
 
     try:
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(OPENROUTER_API_URL, headers=headers, json=payload)
-            response.raise_for_status()
-            
-            response_data = response.json()
-            new_summary_str = response_data["choices"][0]["message"]["content"]
-            
-            # Bellek Limiti Kontrolü
-            if len(new_summary_str) > MEMORY_CHARACTER_LIMIT:
-                print(f"--- ⚠️ Hafıza limiti aşıldı ({len(new_summary_str)} > {MEMORY_CHARACTER_LIMIT}). Özet kısaltılıyor... ---")
-                shrinking_prompt = f"""
-                The following user profile JSON is too long. Your task is to summarize and shrink it.
-                - Keep the most essential, timeless, and important facts about the user.
-                - Remove any trivial, temporary, or less important details.
-                - The final output MUST be a valid JSON object, and it MUST be under {MEMORY_CHARACTER_LIMIT} characters.
-                - Output ONLY the final, shortened JSON. No explanations.
-
-                JSON to shrink:
-                {new_summary_str}
-                """
-                shrinking_payload = {
-                    "model": SUMMARIZER_MODEL,
-                    "messages": [{"role": "user", "content": shrinking_prompt}],
-                    "response_format": {"type": "json_object"},
-                    "max_tokens": 1024
-                }
-                shrinking_response = await client.post(OPENROUTER_API_URL, headers=headers, json=shrinking_payload)
-                shrinking_response.raise_for_status()
-                shrinking_data = shrinking_response.json()
-                new_summary_str = shrinking_data["choices"][0]["message"]["content"]
-                print("--- ✅ Hafıza başarıyla kısaltıldı. ---")
-            
-            json.loads(new_summary_str)
-            
-            profile.auto_summary_json = new_summary_str
-            db.commit()
-            print(f"--- ✅ Hafıza başarıyla güncellendi. Yeni profil: {new_summary_str} ---")
-
-    except Exception as e:
-        print(f"--- ❌ Hafıza analizi veya kısaltma sırasında hata oluştu: {e} ---")
-
-async def run_summary_if_inactive(session_id: int, disconnected_at: datetime, delay_seconds: int):
-    """
-    Belirlenen süre sonunda, eğer kullanıcı hala pasifse özetleme işlemini çalıştırır.
-    Bu fonksiyon bir arka plan görevi olarak çalıştırılmak üzere tasarlanmıştır.
-    """
-    try:
-        print(f"--- ⏰ Özetleme task başlatıldı (Oturum: {session_id}). {delay_seconds} sn bekleniyor... ---")
-        await asyncio.sleep(delay_seconds)
-        print(f"--- ⏰ Bekleme tamamlandı. Özetleme kontrolü yapılıyor (Oturum: {session_id})... ---")
+        with span("memory_llm_call", histogram=SUMMARY_STAGE_SECONDS):
+            response = await scheduled_post(payload, headers, session_key=f"memory:{session_id}")
+        response.raise_for_status()
+        
+        response_data = response.json()
+        new_summary_str = response_data["choices"][0]["message"]["content"]
+        
+        # Bellek Limiti Kontrolü
+        if len(new_summary_str) > MEMORY_CHARACTER_LIMIT:
+            logger.warning("⚠️ Hafıza limiti aşıldı (%d > %d). Özet kısaltılıyor...", len(new_summary_str), MEMORY_CHARACTER_LIMIT)
+            shrinking_prompt = f"""
+            The following user profile JSON is too long. Your task is to summarize and shrink it.
+            - Keep the most essential, timeless, and important facts about the user.
+            - Remove any trivial, temporary, or less important details.
+            - The final output MUST be a valid JSON object, and it MUST be under {MEMORY_CHARACTER_LIMIT} characters.
+            - Output ONLY the final, shortened JSON. No explanations.
+
+            JSON to shrink:
+            {new_summary_str}
+            """
+            shrinking_payload = {
+                "model": SUMMARIZER_MODEL,
+                "messages": [{"role": "user", "content": shrinking_prompt}],
+                "response_format": {"type": "json_object"},
+                "max_tokens": 1024
+            }
+            with span("memory_shrink", histogram=SUMMARY_STAGE_SECONDS):
+                shrinking_response = await scheduled_post(shrinking_payload, headers, session_key=f"memory:{session_id}")
+            shrinking_response.raise_for_status()
+            shrinking_data = shrinking_response.json()
+            new_summary_str = shrinking_data["choices"][0]["message"]["content"]
+            logger.info("✅ Hafıza başarıyla kısaltıldı.")
         
-        from database import SessionLocal # Gecikmeli import, dairesel bağımlılığı önler
-
-        db = SessionLocal()
-        try:
-            session = db.query(models.ChatSession).filter(models.ChatSession.id == session_id).first()
-            
-            if not session:
-                print(f"--- 🧠 Özetleme iptal edildi (Oturum: {session_id}). Oturum bulunamadı. ---")
-                return
-            
-            # Eğer son aktivite, ayrılma zamanından daha yeniyse (yani kullanıcı geri döndüyse), işlemi iptal et.
-            if session.last_active_at and session.last_active_at > disconnected_at:
-                print(f"--- 🧠 Özetleme iptal edildi (Oturum: {session_id}). Kullanıcı geri döndü (last_active: {session.last_active_at}, disconnected: {disconnected_at}). ---")
-                return
-
-            # Kullanıcı geri dönmediyse, asıl özetleme fonksiyonunu çağır.
-            print(f"--- 🧠 Kullanıcı hala pasif. Özetleme başlatılıyor (Oturum: {session_id})... ---")
-            await generate_and_update_profile_summary(session_id, db)
-        finally:
-            db.close()
-    except Exception as e:
-        import traceback
-        print(f"--- ❌ Özetleme background task'ında hata oluştu (Oturum: {session_id}): {e} ---")
-        print(f"--- ❌ Traceback: {traceback.format_exc()} ---")
\ No newline at end of file
+        new_summary = json.loads(new_summary_str)
+        if not isinstance(new_summary, dict):
+            raise ValueError("Profile summary is not a JSON object")
+
+        with span("memory_persist", histogram=SUMMARY_STAGE_SECONDS):
+            new_summary_str, version = await save_profile(
+                db, user_id, profile.version, _parse_profile(current_summary_json), new_summary
+            )
+            chat_session.memory_summarized_upto_id = messages[-1].id
+            await db.commit()
+        profile_cache.store(user_id, version, new_summary_str)
+        logger.info("✅ Hafıza başarıyla güncellendi. Yeni profil: %s", new_summary_str)
+
+    except Exception:
+        logger.exception("❌ Hafıza analizi veya kısaltma sırasında hata oluştu")
+        raise  # Kuyruk işi tekrar denemeye alabilsin
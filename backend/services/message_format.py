@@ -0,0 +1,55 @@
+# backend/services/message_format.py
+
+import json
+
+# ChatMessage.format_version değerleri: eski satırlarda her şey content kolonunda JSON metin olarak durur,
+# yeni (ve arka planda dönüştürülmüş) satırlarda text / reasoning / attachments kolonlarına yazılır.
+LEGACY_FORMAT = 0
+STRUCTURED_FORMAT = 1
+
+
+def parse_message_content(content: str):
+    """Parse message content which may be JSON format (with images, reasoning) or plain string."""
+    if not content:
+        return {"content": "", "reasoning": None, "images": []}
+
+    try:
+        parsed = json.loads(content)
+        if isinstance(parsed, dict):
+            return {
+                "content": parsed.get("content", ""),
+                "reasoning": parsed.get("reasoning"),
+                "images": parsed.get("images", [])
+            }
+        else:
+            return {"content": str(parsed), "reasoning": None, "images": []}
+    except (json.JSONDecodeError, TypeError):
+        return {"content": content, "reasoning": None, "images": []}
+
+
+def encode_message(content: str | None, reasoning: str | None = None, images: list[str] | None = None) -> dict:
+    """Mesajı ChatMessage kolon değerlerine çevirir (models.ChatMessage(**encode_message(...)))."""
+    return {
+        "text": content or "",
+        "reasoning": reasoning or None,
+        "attachments": [{"type": "image", "url": url} for url in images] if images else None,
+        "format_version": STRUCTURED_FORMAT,
+    }
+
+
+def attachment_images(attachments: list[dict] | None) -> list[str]:
+    return [item["url"] for item in attachments or () if item.get("type") == "image"]
+
+
+def message_text(row) -> str:
+    """Satırın metni; row'un format_version, text ve content alanlarını taşıması yeterlidir."""
+    if row.format_version == STRUCTURED_FORMAT:
+        return row.text or ""
+    return parse_message_content(row.content)["content"] or ""
+
+
+def decode_message(row) -> dict:
+    """Satırı {"content", "reasoning", "images"} sözlüğüne çevirir; row tüm mesaj kolonlarını taşımalıdır."""
+    if row.format_version == STRUCTURED_FORMAT:
+        return {"content": row.text or "", "reasoning": row.reasoning, "images": attachment_images(row.attachments)}
+    return parse_message_content(row.content)
@@ -0,0 +1,87 @@
+# backend/services/message_migration.py
+
+import asyncio
+from sqlalchemy import select, update, bindparam
+import models
+from database import AsyncSessionLocal
+from config import MESSAGE_MIGRATION_BATCH_SIZE, MESSAGE_MIGRATION_PAUSE_SECONDS
+from services.message_format import LEGACY_FORMAT, STRUCTURED_FORMAT, parse_message_content, encode_message
+from services.logger import get_logger
+
+logger = get_logger("message_migration")
+
+_table = models.ChatMessage.__table__
+# Koşullu toplu UPDATE: aynı satırı başka bir worker/süreç taşıdıysa ikinci yazım etkisiz kalır
+_migrate_row = (
+    update(_table)
+    .where(_table.c.id == bindparam("row_id"), _table.c.format_version == LEGACY_FORMAT)
+    .values(
+        text=bindparam("new_text"), reasoning=bindparam("new_reasoning"),
+        attachments=bindparam("new_attachments"), format_version=STRUCTURED_FORMAT, content=None,
+    )
+)
+
+
+async def migrate_batch(after_id: int, batch_size: int = MESSAGE_MIGRATION_BATCH_SIZE) -> tuple[int, int | None]:
+    """
+    after_id'den sonraki en fazla batch_size eski biçimli satırı dönüştürür.
+    (taşınan satır sayısı, sonraki parti için son id) döndürür; id None ise iş bitmiştir.
+    """
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(
+            select(models.ChatMessage.id, models.ChatMessage.content)
+            .where(models.ChatMessage.id > after_id, models.ChatMessage.format_version == LEGACY_FORMAT)
+            .order_by(models.ChatMessage.id)
+            .limit(batch_size)
+        )).all()
+        if not rows:
+            return 0, None
+        params = []
+        for row in rows:
+            parsed = parse_message_content(row.content)
+            values = encode_message(parsed["content"], parsed["reasoning"], parsed["images"])
+            params.append({
+                "row_id": row.id, "new_text": values["text"],
+                "new_reasoning": values["reasoning"], "new_attachments": values["attachments"],
+            })
+        await db.execute(_migrate_row, params)
+        await db.commit()
+        return len(rows), rows[-1].id
+
+
+class MessageMigration:
+    """
+    Eski biçimli mesajları uygulama çalışırken, id sırasıyla küçük partiler halinde yapılandırılmış
+    kolonlara taşır. Okuyucular format_version'a bakarak iki biçimi de okuyabildiği için taşıma
+    bitmeden de doğru çalışır; yarıda kalırsa sonraki açılışta kaldığı yerden devam eder.
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        self.migrated_total = 0
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        last_id = 0
+        try:
+            while last_id is not None:
+                migrated, last_id = await migrate_batch(last_id)
+                self.migrated_total += migrated
+                if migrated:
+                    logger.info("🛠️ %d mesaj yapılandırılmış biçime taşındı (toplam %d).", migrated, self.migrated_total)
+                    await asyncio.sleep(MESSAGE_MIGRATION_PAUSE_SECONDS)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("❌ Mesaj biçimi taşıması durdu; sonraki açılışta devam edecek")
+
+
+message_migration = MessageMigration()
@@ -0,0 +1,300 @@
+# backend/services/metrics.py
+
+import bisect
+import contextvars
+import os
+import sys
+import time
+import uuid
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+from contextlib import contextmanager
+from typing import Callable
+from config import TRACE_REQUESTS
+from services.logger import get_logger
+
+logger = get_logger("trace")
+
+# Gecikme histogramları için varsayılan kovalar (saniye)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in self._values.items()
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # etiketler -> (kova sayaçları (kümülatif olmayan, +Inf dahil), toplam, adet)
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, 'le="%s"' % _format_value(bound))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self) -> list[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in self._values.items()
+        ]
+
+
+class CallbackGauge(_Metric):
+    """Değeri okunduğu anda bir fonksiyondan alınan ölçüm (mevcut istatistik sayaçlarını dışa açmak için)."""
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float | dict[tuple, float]], labelnames: tuple[str, ...] = (), kind: str = "gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self.kind = kind
+
+    def render(self) -> list[str]:
+        value = self.callback()
+        values = value if isinstance(value, dict) else {(): value}
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(item or 0)}" for key, item in values.items()
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def live_gauge(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, callback, labelnames: tuple[str, ...] = (), kind: str = "gauge") -> CallbackGauge:
+        return self.register(CallbackGauge(name, documentation, callback, labelnames, kind))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# --- Sohbet turu ---
+CHAT_STAGE_SECONDS = registry.histogram(
+    "chat_stage_duration_seconds", "Duration of each stage of a chat turn.", ("stage",)
+)
+CHAT_TTFT_SECONDS = registry.histogram(
+    "chat_time_to_first_token_seconds", "Time from receiving the user frame to the first streamed token.", ("model",)
+)
+CHAT_TOKENS_PER_SECOND = registry.histogram(
+    "chat_output_tokens_per_second", "Estimated output tokens per second after the first token.", ("model",),
+    buckets=(1, 5, 10, 20, 40, 60, 80, 100, 150, 200, 300, 500),
+)
+CHAT_TURNS_TOTAL = registry.counter("chat_turns_total", "Chat turns by outcome.", ("model", "outcome"))
+WS_CONNECTIONS_ACTIVE = registry.live_gauge("ws_connections_active", "Open chat WebSocket connections.")
+WS_FRAMES_RECEIVED_TOTAL = registry.counter("ws_frames_received_total", "WebSocket frames received from clients.")
+WS_FRAME_BYTES = registry.histogram(
+    "ws_frame_bytes", "Size of received WebSocket frames.", buckets=(64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+)
+WS_SEND_SECONDS = registry.histogram("ws_send_duration_seconds", "Time spent writing one frame to a WebSocket, including lock wait.")
+WS_FORWARD_LAG_EVENTS = registry.histogram(
+    "ws_forward_lag_events", "Events published but not yet forwarded to the socket when an event is sent.",
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 1000),
+)
+UPSTREAM_CONNECT_SECONDS = registry.histogram(
+    "upstream_response_headers_seconds", "Time from sending the upstream request to receiving response headers.", ("model",)
+)
+UPSTREAM_QUEUE_WAIT_SECONDS = registry.histogram(
+    "upstream_queue_wait_seconds", "Time spent waiting for an upstream scheduler slot.", ("model", "priority")
+)
+
+# --- Özetleme hattı ---
+SUMMARY_STAGE_SECONDS = registry.histogram(
+    "summary_stage_duration_seconds", "Duration of summarizer pipeline stages.", ("stage",)
+)
+SUMMARY_JOBS_TOTAL = registry.counter("summary_jobs_total", "Summary queue jobs by outcome.", ("outcome",))
+PROFILE_WRITES_TOTAL = registry.counter(
+    "profile_writes_total", "Memory profile writes by outcome (written, merged after a concurrent update, conflict).", ("outcome",)
+)
+
+# --- Veritabanı ve süreç ---
+DB_QUERIES_TOTAL = registry.counter("db_queries_total", "SQL statements executed, by statement type.", ("operation",))
+PERSISTENCE_FLUSHES_TOTAL = registry.counter("persistence_flushes_total", "Write-behind group commits by outcome.", ("outcome",))
+PERSISTENCE_FLUSH_SECONDS = registry.histogram("persistence_flush_duration_seconds", "Duration of one write-behind group commit.")
+PERSISTENCE_BATCH_ROWS = registry.histogram(
+    "persistence_batch_rows", "Messages and session updates written in one group commit.",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+
+
+def _resident_memory_bytes() -> float:
+    """Sürecin o anki RSS'i; /proc yoksa (Linux dışı) en yüksek RSS'e düşülür."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        if resource is None:
+            return 0.0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS byte, Linux KiB döndürür
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+registry.gauge("process_resident_memory_bytes", "Resident memory size in bytes.", _resident_memory_bytes)
+
+
+# --- İstek başına iz (trace) span'leri ---
+_current_trace: contextvars.ContextVar["Trace | None"] = contextvars.ContextVar("current_trace", default=None)
+
+
+class Trace:
+    """Bir sohbet turunun span'leri; TRACE_REQUESTS açıkken tur bitince tek satır olarak loglanır."""
+
+    def __init__(self, name: str, **attributes):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attributes = attributes
+        self.started = time.perf_counter()
+        self.spans: list[dict] = []
+
+    def add(self, name: str, started: float, duration: float, **attributes):
+        self.spans.append({"name": name, "start_ms": round((started - self.started) * 1000, 2), "duration_ms": round(duration * 1000, 2), **attributes})
+
+    def finish(self, **attributes):
+        if not TRACE_REQUESTS:
+            return
+        self.attributes.update(attributes)
+        logger.info(
+            "trace %s %s total_ms=%.1f attrs=%s spans=%s",
+            self.trace_id, self.name, (time.perf_counter() - self.started) * 1000, self.attributes, self.spans,
+        )
+
+
+def start_trace(name: str, **attributes) -> Trace:
+    """Yeni bir iz başlatır; aynı bağlamdaki (ve oradan başlatılan görevlerdeki) span'ler buna eklenir."""
+    trace = Trace(name, **attributes)
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace() -> "Trace | None":
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, histogram: Histogram = CHAT_STAGE_SECONDS, **attributes):
+    """Bloğun süresini aşama histogramına yazar ve varsa o anki ize span olarak ekler."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started
+        histogram.observe(duration, stage=name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(name, started, duration, **attributes)
+
+
+def record_span(name: str, started: float, histogram: Histogram = CHAT_STAGE_SECONDS, **attributes) -> float:
+    """Başlangıcı perf_counter() ile önceden alınmış bir aşamayı kaydeder (blok olarak sarılamayan aşamalar için)."""
+    duration = time.perf_counter() - started
+    histogram.observe(duration, stage=name)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, started, duration, **attributes)
+    return duration
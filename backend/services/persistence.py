@@ -0,0 +1,156 @@
+# backend/services/persistence.py
+
+import asyncio
+import time
+from datetime import datetime, timezone
+from sqlalchemy import insert, update, bindparam
+import models
+import database
+from config import PERSISTENCE_FLUSH_INTERVAL, PERSISTENCE_MAX_BATCH
+from services.logger import get_logger
+from services.metrics import PERSISTENCE_BATCH_ROWS, PERSISTENCE_FLUSH_SECONDS, PERSISTENCE_FLUSHES_TOTAL
+
+logger = get_logger("persistence")
+
+_messages = models.ChatMessage.__table__
+_sessions = models.ChatSession.__table__
+# Çoklu satır INSERT ... RETURNING: id'ler parametre sırasıyla döner, her mesaj kendi id'sini alır
+_insert_messages = insert(_messages).returning(_messages.c.id, sort_by_parameter_order=True)
+_touch_sessions = (
+    update(_sessions).where(_sessions.c.id == bindparam("row_id")).values(last_active_at=bindparam("active_at"))
+)
+_touch_sessions_with_model = (
+    update(_sessions).where(_sessions.c.id == bindparam("row_id"))
+    .values(last_active_at=bindparam("active_at"), model_used=bindparam("new_model"))
+)
+
+
+class WriteBehindLog:
+    """
+    Sohbet turlarının yazmalarını tüm oturumlar için ortak, periyodik transaction'larda toplar (group commit).
+
+    - add_message(): mesaj sıraya alınır, bir sonraki toplu transaction commit edildiğinde id'siyle döner.
+      Çağıran await ettiği için "döndü = kalıcı" garantisi tekil commit'le aynıdır (mesaj başına onay).
+    - touch(): oturumun last_active_at (ve değiştiyse model_used) güncellemesi. Onay beklenmez; aynı oturumun
+      art arda gelen dokunuşları tek UPDATE'e indirgenir.
+
+    İlk yazma geldiğinde PERSISTENCE_FLUSH_INTERVAL kadar beklenir; bu pencerede gelen tüm yazmalar tek
+    transaction'da commit edilir. stop() sıradakileri yazıp çıkar; başlatılmamışken ya da durdurulduktan
+    sonra gelen yazmalar beklemeden tek başına yazılır.
+    """
+
+    def __init__(self, flush_interval: float = PERSISTENCE_FLUSH_INTERVAL, max_batch: int = PERSISTENCE_MAX_BATCH):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._messages: list[tuple[dict, asyncio.Future]] = []
+        # session_id -> (last_active_at, model_used ya da None)
+        self._touches: dict[int, tuple[datetime, str | None]] = {}
+        self._pending = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._closing = False
+        self._inline_tasks: set[asyncio.Task] = set()
+
+    async def start(self):
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Yazma döngüsünü durdurur; sırada kalan her şey yazılmadan dönmez."""
+        if self._task is not None:
+            # Döngü iptal edilmez: devam eden transaction yarıda kesilmeden biter
+            self._closing = True
+            self._pending.set()
+            await self._task
+            self._task = None
+        while self._messages or self._touches:
+            await self._flush()
+        await asyncio.gather(*self._inline_tasks, return_exceptions=True)
+
+    async def add_message(self, **values) -> int:
+        """ChatMessage kolon değerlerini sıraya alır; commit edildiğinde mesajın id'sini döndürür."""
+        future = asyncio.get_running_loop().create_future()
+        self._messages.append((values, future))
+        self._wake()
+        return await future
+
+    def touch(self, session_id: int, model_used: str | None = None):
+        """Oturumun son aktivite zamanını (ve verilirse modelini) bir sonraki toplu yazmaya ekler."""
+        previous_model = self._touches.get(session_id, (None, None))[1]
+        self._touches[session_id] = (datetime.now(timezone.utc), model_used or previous_model)
+        self._wake()
+
+    def _wake(self):
+        if self._task is not None:
+            self._pending.set()
+            return
+        # Döngü çalışmıyorsa (başlatılmamış ya da kapanmış) beklemeden yazılır
+        task = asyncio.create_task(self._flush())
+        self._inline_tasks.add(task)
+        task.add_done_callback(self._inline_tasks.discard)
+
+    async def _run(self):
+        while not self._closing:
+            await self._pending.wait()
+            # Group commit penceresi: bu sürede gelen yazmalar aynı transaction'a girer
+            if not self._closing and len(self._messages) < self.max_batch:
+                await asyncio.sleep(self.flush_interval)
+            self._pending.clear()
+            await self._flush()
+            if self._messages or self._touches:
+                self._pending.set()
+
+    async def _flush(self):
+        batch, self._messages = self._messages[:self.max_batch], self._messages[self.max_batch:]
+        touches, self._touches = self._touches, {}
+        if not batch and not touches:
+            return
+        started = time.perf_counter()
+        try:
+            ids = await self._write(batch, touches)
+        except Exception:
+            logger.exception("❌ Toplu yazma başarısız (%d mesaj, %d oturum); tek tek yazılıyor", len(batch), len(touches))
+            PERSISTENCE_FLUSHES_TOTAL.inc(outcome="failed")
+            await self._write_individually(batch, touches)
+            return
+        PERSISTENCE_FLUSHES_TOTAL.inc(outcome="ok")
+        PERSISTENCE_FLUSH_SECONDS.observe(time.perf_counter() - started)
+        PERSISTENCE_BATCH_ROWS.observe(len(batch) + len(touches))
+        for (_, future), message_id in zip(batch, ids):
+            if not future.done():
+                future.set_result(message_id)
+
+    async def _write(self, batch: list[tuple[dict, asyncio.Future]], touches: dict[int, tuple[datetime, str | None]]) -> list[int]:
+        async with database.engine.begin() as conn:
+            ids = []
+            if batch:
+                ids = (await conn.execute(_insert_messages, [values for values, _ in batch])).scalars().all()
+            plain = [{"row_id": session_id, "active_at": active_at} for session_id, (active_at, model) in touches.items() if model is None]
+            with_model = [
+                {"row_id": session_id, "active_at": active_at, "new_model": model}
+                for session_id, (active_at, model) in touches.items() if model is not None
+            ]
+            if plain:
+                await conn.execute(_touch_sessions, plain)
+            if with_model:
+                await conn.execute(_touch_sessions_with_model, with_model)
+        return ids
+
+    async def _write_individually(self, batch: list[tuple[dict, asyncio.Future]], touches: dict[int, tuple[datetime, str | None]]):
+        """Tek bir hatalı satır (örn. silinmiş oturum) partideki diğer yazmaları düşürmesin."""
+        for values, future in batch:
+            try:
+                ids = await self._write([(values, future)], {})
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(ids[0])
+        for session_id, touch in touches.items():
+            try:
+                await self._write([], {session_id: touch})
+            except Exception:
+                logger.warning("⚠️ Oturum aktivitesi yazılamadı (Oturum: %s)", session_id)
+
+
+persistence = WriteBehindLog()
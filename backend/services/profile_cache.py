@@ -0,0 +1,78 @@
+# backend/services/profile_cache.py
+
+import json
+import time
+from collections import OrderedDict
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+from config import PROFILE_CACHE_CHECK_INTERVAL, PROFILE_CACHE_MAX_USERS
+from services.logger import get_logger
+
+logger = get_logger("profile_cache")
+
+
+def render_memory_message(auto_summary_json: str | None) -> dict | None:
+    """Profil JSON'unu modele gönderilecek hazır sistem mesajına çevirir."""
+    if not auto_summary_json or auto_summary_json == "{}":
+        return None
+    try:
+        summary_data = json.loads(auto_summary_json)
+    except json.JSONDecodeError:
+        logger.warning("⚠️ Hafıza JSON'u bozuk, yüklenemedi.")
+        return None
+    facts = [f"- {key.replace('_', ' ').title()}: {value}" for key, value in summary_data.items()]
+    formatted_summary = "\n".join(facts)
+    return {"role": "system", "content": f"This is a summary of what you know about the user. Use this information to personalize your responses:\n{formatted_summary}"}
+
+
+class ProfileCache:
+    """
+    Kullanıcı hafıza profillerinin render edilmiş sistem mesajını sürüm numarasıyla birlikte saklar.
+    Diğer worker'ların yazdığı güncellemeler, en fazla PROFILE_CACHE_CHECK_INTERVAL
+    aralıkla yapılan tek kolonluk sürüm sorgusuyla fark edilir.
+    """
+
+    def __init__(self, check_interval: float = PROFILE_CACHE_CHECK_INTERVAL, max_users: int = PROFILE_CACHE_MAX_USERS):
+        self.check_interval = check_interval
+        self.max_users = max_users
+        # user_id -> (version, rendered message, son kontrol zamanı); en uzun süredir kullanılmayan önce düşer
+        self._entries: OrderedDict[str, tuple[int | None, dict | None, float]] = OrderedDict()
+
+    def _put(self, user_id: str, entry: tuple[int | None, dict | None, float]):
+        self._entries[user_id] = entry
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_users:
+            self._entries.popitem(last=False)
+
+    def store(self, user_id: str, version: int, auto_summary_json: str | None):
+        """Bu worker profili yazdığında önbelleği doğrudan tazeler."""
+        self._put(user_id, (version, render_memory_message(auto_summary_json), time.monotonic()))
+
+    async def get_memory_message(self, db: AsyncSession, user_id: str) -> dict | None:
+        entry = self._entries.get(user_id)
+        now = time.monotonic()
+        if entry is not None and now - entry[2] < self.check_interval:
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+        version = (await db.execute(
+            select(models.UserProfile.version).where(models.UserProfile.user_id == user_id)
+        )).scalar_one_or_none()
+        if entry is not None and entry[0] == version:
+            self._put(user_id, (entry[0], entry[1], now))
+            return entry[1]
+
+        row = (await db.execute(
+            select(models.UserProfile.auto_summary_json, models.UserProfile.version)
+            .where(models.UserProfile.user_id == user_id)
+        )).first()
+        if row is None:
+            self._put(user_id, (None, None, now))
+            return None
+        self.store(user_id, row.version, row.auto_summary_json)
+        logger.info("🧠 Otomatik hafıza yüklendi (kullanıcı: %s, sürüm %s).", user_id, row.version)
+        return self._entries[user_id][1]
+
+
+profile_cache = ProfileCache()
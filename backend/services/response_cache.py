@@ -0,0 +1,138 @@
+# backend/services/response_cache.py
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, delete
+import models
+from database import AsyncSessionLocal, dialect_insert
+from config import (
+    RESPONSE_CACHE_MODELS, RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_MEMORY_ENTRIES, RESPONSE_CACHE_PERSISTENT
+)
+
+# Önbellekten oynatılan cevap bu boyutta (karakter) parçalar halinde gönderilir
+REPLAY_CHUNK_CHARS = 256
+# Her N yazımda bir süresi dolmuş kalıcı kayıtlar temizlenir
+PURGE_EVERY_STORES = 100
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class ResponseCache:
+    """
+    Birebir aynı istekler (hazır başlangıç soruları, yeniden bağlanma sonrası tekrarlar) için cevap önbelleği.
+    Anahtar; model, render edilmiş api_messages ve cevabı etkileyen payload seçeneklerinin kanonik özetidir.
+    Önce süreç içi LRU'ya, sonra veritabanındaki kalıcı katmana bakılır; ikisi de TTL'lidir.
+    Kalıcı katman her erişimde kendi kısa oturumunu açar: cevap üretilirken havuzdan bağlantı tutulmaz.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MEMORY_ENTRIES, ttl_seconds: int = RESPONSE_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # anahtar -> (son geçerlilik zamanı (epoch), cevap, üretim süresi ms)
+        self._entries: OrderedDict[str, tuple[float, dict, int]] = OrderedDict()
+        self.lookups = 0
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.stores = 0
+        self.latency_saved_seconds = 0.0
+
+    def enabled_for(self, model: str) -> bool:
+        return "*" in RESPONSE_CACHE_MODELS or model in RESPONSE_CACHE_MODELS
+
+    @staticmethod
+    def key_for(payload: dict) -> str:
+        # "stream" cevabın içeriğini değiştirmez; geri kalan her seçenek anahtara girer
+        canonical = {key: value for key, value in payload.items() if key != "stream"}
+        encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _remember(self, key: str, expires_at: float, response: dict, generation_ms: int):
+        self._entries[key] = (expires_at, response, generation_ms)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str) -> dict | None:
+        self.lookups += 1
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, response, generation_ms = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                self.latency_saved_seconds += generation_ms / 1000
+                return response
+            del self._entries[key]
+
+        if not RESPONSE_CACHE_PERSISTENT:
+            return None
+        async with AsyncSessionLocal() as db:
+            row = (await db.execute(
+                select(models.ResponseCacheEntry).where(
+                    models.ResponseCacheEntry.key == key,
+                    models.ResponseCacheEntry.expires_at > _utcnow(),
+                )
+            )).scalar_one_or_none()
+        if row is None:
+            return None
+        response = json.loads(row.response_json)
+        expires_at = row.expires_at if row.expires_at.tzinfo else row.expires_at.replace(tzinfo=timezone.utc)
+        self._remember(key, expires_at.timestamp(), response, row.generation_ms)
+        self.persistent_hits += 1
+        self.latency_saved_seconds += row.generation_ms / 1000
+        return response
+
+    async def put(self, key: str, model: str, response: dict, generation_ms: int):
+        expires_at = _utcnow() + timedelta(seconds=self.ttl_seconds)
+        self._remember(key, expires_at.timestamp(), response, generation_ms)
+        self.stores += 1
+        if not RESPONSE_CACHE_PERSISTENT:
+            return
+        async with AsyncSessionLocal() as db:
+            insert = dialect_insert(db)
+            statement = insert(models.ResponseCacheEntry).values(
+                key=key, model=model, response_json=json.dumps(response),
+                generation_ms=generation_ms, expires_at=expires_at,
+            )
+            await db.execute(statement.on_conflict_do_update(
+                index_elements=[models.ResponseCacheEntry.key],
+                set_={
+                    "response_json": statement.excluded.response_json,
+                    "generation_ms": statement.excluded.generation_ms,
+                    "expires_at": statement.excluded.expires_at,
+                },
+            ))
+            if self.stores % PURGE_EVERY_STORES == 0:
+                await db.execute(delete(models.ResponseCacheEntry).where(models.ResponseCacheEntry.expires_at <= _utcnow()))
+            await db.commit()
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.persistent_hits
+        return {
+            "enabled_models": sorted(RESPONSE_CACHE_MODELS),
+            "lookups": self.lookups,
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.lookups - hits,
+            "stores": self.stores,
+            "hit_ratio": round(hits / self.lookups, 4) if self.lookups else 0.0,
+            "latency_saved_seconds": round(self.latency_saved_seconds, 3),
+            "memory_entries": len(self._entries),
+        }
+
+
+def replay_events(response: dict):
+    """Önbellekteki cevabı canlı akışla aynı olay tipleriyle (reasoning, chat_message, image) üretir."""
+    for event_type, text in (("reasoning", response.get("reasoning", "")), ("chat_message", response.get("content", ""))):
+        for start in range(0, len(text), REPLAY_CHUNK_CHARS):
+            yield {"type": event_type, "content": text[start:start + REPLAY_CHUNK_CHARS]}
+    for image_url in response.get("images", []):
+        yield {"type": "image", "image_url": image_url}
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,108 @@
+# backend/services/rolling_summary.py
+
+import asyncio
+from sqlalchemy import update, func
+from sqlalchemy.orm.attributes import set_committed_value
+import models
+from config import (
+    OPENROUTER_API_KEY, SUMMARIZER_MODEL, ROLLING_SUMMARY_BLOCK_SIZE, ROLLING_SUMMARY_MAX_TOKENS
+)
+from services.scheduler import scheduled_post
+from services.logger import get_logger
+from services.metrics import SUMMARY_STAGE_SECONDS, span
+
+logger = get_logger("rolling_summary")
+
+# Aynı oturum için aynı anda tek bir katlama işi çalışır
+_folds_in_flight: set[int] = set()
+_background_tasks: set[asyncio.Task] = set()
+
+
+def build_summary_message(chat_session: models.ChatSession) -> dict | None:
+    """
+    Kayan özeti sistem mesajı olarak döndürür. Metin bir sonraki katlamaya kadar
+    byte düzeyinde değişmediği için sağlayıcı tarafındaki prompt önbelleği isabet eder.
+    """
+    if not chat_session.rolling_summary:
+        return None
+    return {
+        "role": "system",
+        "content": [
+            {"type": "text", "text": "Here is a summary of the conversation so far. Use this for context:"},
+            {"type": "text", "text": chat_session.rolling_summary, "cache_control": {"type": "ephemeral"}}
+        ]
+    }
+
+
+def maybe_schedule_fold(chat_session: models.ChatSession, history: list[dict]):
+    """
+    Özete katlanmamış mesaj sayısı iki bloğu bulduysa en eski N mesajı arka planda özete katlar.
+    Son N mesaj her zaman ham olarak prompt'ta kalır.
+    """
+    if chat_session.id in _folds_in_flight or len(history) < 2 * ROLLING_SUMMARY_BLOCK_SIZE:
+        return
+    block = history[:ROLLING_SUMMARY_BLOCK_SIZE]
+    _folds_in_flight.add(chat_session.id)
+    task = asyncio.create_task(_fold_block(chat_session, history, block))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def _fold_block(chat_session: models.ChatSession, history: list[dict], block: list[dict]):
+    session_id = chat_session.id
+    previous_upto_id = chat_session.rolling_summary_upto_id
+    try:
+        conversation_text = "".join(f"{msg['role']}: {msg['content']}\n" for msg in block)
+        prompt = f"""
+        You maintain a running summary of a conversation between a user and an AI assistant.
+        - Merge the new messages into the existing summary.
+        - Preserve facts, decisions, open questions, code and names that later turns may refer to.
+        - Be concise. Output ONLY the updated summary text, no introductory sentence.
+
+        Existing Summary:
+        {chat_session.rolling_summary or "(empty)"}
+
+        New Messages:
+        ---
+        {conversation_text}
+        ---
+
+        Updated Summary:
+        """
+        headers = {"Authorization": f"Bearer {OPENROUTER_API_KEY}", "Content-Type": "application/json"}
+        payload = {
+            "model": SUMMARIZER_MODEL,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": ROLLING_SUMMARY_MAX_TOKENS,
+        }
+        with span("fold_llm_call", histogram=SUMMARY_STAGE_SECONDS):
+            response = await scheduled_post(payload, headers, session_key=f"fold:{session_id}")
+        response.raise_for_status()
+        new_summary = response.json()["choices"][0]["message"]["content"].strip()
+        upto_id = block[-1]["id"]
+
+        from database import AsyncSessionLocal # Gecikmeli import, dairesel bağımlılığı önler
+
+        async with AsyncSessionLocal() as db:
+            # Başka bir worker aynı bloğu katladıysa üzerine yazmayız
+            result = await db.execute(
+                update(models.ChatSession)
+                .where(models.ChatSession.id == session_id)
+                .where(func.coalesce(models.ChatSession.rolling_summary_upto_id, 0) == (previous_upto_id or 0))
+                .values(rolling_summary=new_summary, rolling_summary_upto_id=upto_id)
+            )
+            await db.commit()
+        if result.rowcount == 0:
+            logger.info("⏭️ Kayan özet başka bir işlem tarafından güncellenmiş (Oturum: %s).", session_id)
+            return
+
+        # WebSocket döngüsündeki nesneyi kirli işaretlemeden güncelle ve katlanan mesajları önbellekten düşür
+        set_committed_value(chat_session, "rolling_summary", new_summary)
+        set_committed_value(chat_session, "rolling_summary_upto_id", upto_id)
+        while history and history[0]["id"] <= upto_id:
+            history.pop(0)
+        logger.info("📚 Kayan özet güncellendi (Oturum: %s, mesaj id <= %s).", session_id, upto_id)
+    except Exception:
+        logger.exception("❌ Kayan özet oluşturulurken hata oluştu (Oturum: %s)", session_id)
+    finally:
+        _folds_in_flight.discard(session_id)
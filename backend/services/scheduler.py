@@ -0,0 +1,296 @@
+# backend/services/scheduler.py
+
+import asyncio
+import itertools
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable
+import httpx
+from config import (
+    UPSTREAM_MODEL_MAX_CONCURRENCY, UPSTREAM_MODEL_TOKENS_PER_MINUTE, MODEL_MAX_CONCURRENCY,
+    MODEL_TOKENS_PER_MINUTE, UPSTREAM_MAX_QUEUE_PER_MODEL, UPSTREAM_MAX_QUEUE_WAIT_SECONDS,
+    UPSTREAM_EXPECTED_COMPLETION_TOKENS, UPSTREAM_RATE_LIMIT_BACKOFF_SECONDS
+)
+from services.token_budget import estimate_prompt_tokens, estimate_tokens
+from services.upstream_client import upstream
+from services.logger import get_logger
+from services.metrics import UPSTREAM_QUEUE_WAIT_SECONDS
+
+logger = get_logger("scheduler")
+
+# Düşük sayı önce çalışır: etkileşimli sohbet, arka plan özetlemenin önüne geçer
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+# Kuyruktaki istemciye sıra bilgisinin en fazla bu aralıkla (saniye) yeniden gönderilmesi
+QUEUE_UPDATE_INTERVAL = 1.0
+
+
+class UpstreamBusy(Exception):
+    """Modelin kuyruğu dolu ya da bekleme süresi aşıldı."""
+
+
+class _Waiter:
+    __slots__ = ("session_key", "priority", "cost", "future", "enqueued_at")
+
+    def __init__(self, session_key: str, priority: int, cost: int):
+        self.session_key = session_key
+        self.priority = priority
+        self.cost = cost
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.monotonic()
+
+
+class _ModelLane:
+    """Tek bir modelin eşzamanlılık sayacı, token kovası ve öncelik/oturum bazlı bekleme kuyrukları."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.limit = MODEL_MAX_CONCURRENCY.get(model, UPSTREAM_MODEL_MAX_CONCURRENCY)
+        self.tokens_per_minute = MODEL_TOKENS_PER_MINUTE.get(model, UPSTREAM_MODEL_TOKENS_PER_MINUTE)
+        self.rate = self.tokens_per_minute / 60
+        self.tokens = float(self.tokens_per_minute)
+        self.refilled_at = time.monotonic()
+        self.paused_until = 0.0
+        self.active = 0
+        # öncelik -> (oturum anahtarı -> o oturumun bekleyen istekleri); oturumlar arasında sırayla (round-robin) verilir
+        self.queues: dict[int, OrderedDict[str, deque[_Waiter]]] = {}
+        self.waiting = 0
+        self.timer: asyncio.TimerHandle | None = None
+
+    def refill(self, now: float):
+        if self.rate:
+            self.tokens = min(self.tokens_per_minute, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def push(self, waiter: _Waiter):
+        self.queues.setdefault(waiter.priority, OrderedDict()).setdefault(waiter.session_key, deque()).append(waiter)
+        self.waiting += 1
+
+    def peek(self) -> _Waiter | None:
+        for priority in sorted(self.queues):
+            sessions = self.queues[priority]
+            if sessions:
+                return next(iter(sessions.values()))[0]
+        return None
+
+    def remove(self, waiter: _Waiter):
+        sessions = self.queues.get(waiter.priority, {})
+        waiters = sessions.get(waiter.session_key)
+        if not waiters or waiter not in waiters:
+            return
+        is_head = waiters[0] is waiter
+        waiters.remove(waiter)
+        self.waiting -= 1
+        if not waiters:
+            del sessions[waiter.session_key]
+        elif is_head:
+            # Sırası gelen oturum bir istek aldı; aynı oturumun sıradaki isteği diğer oturumların arkasına geçer
+            sessions.move_to_end(waiter.session_key)
+
+    def order(self):
+        """Kuyruğun dağıtım sırası: öncelik seviyeleri sırayla, her seviyede oturumlar arasında round-robin."""
+        for priority in sorted(self.queues):
+            for round_ in itertools.zip_longest(*self.queues[priority].values()):
+                yield from (waiter for waiter in round_ if waiter is not None)
+
+
+class UpstreamScheduler:
+    """
+    OpenRouter isteklerini model başına eşzamanlılık ve token/dakika bütçesiyle sınırlar.
+    Yer yoksa istek kuyruğa girer; kuyruktan önce önceliğe (etkileşimli > arka plan),
+    aynı öncelikte oturumlar arasında sırayla verilir, böylece tek bir oturum diğerlerini aç bırakamaz.
+    429 yanıtında modelin kuyruğu Retry-After süresince duraklatılır.
+    """
+
+    def __init__(self):
+        self._lanes: dict[str, _ModelLane] = {}
+        self.granted_total = 0
+        self.queued_total = 0
+        self.rejected_total = 0
+        self.rate_limited_total = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _lane(self, model: str) -> _ModelLane:
+        lane = self._lanes.get(model)
+        if lane is None:
+            lane = self._lanes[model] = _ModelLane(model)
+        return lane
+
+    def _dispatch(self, lane: _ModelLane):
+        now = time.monotonic()
+        while (waiter := lane.peek()) is not None and lane.active < lane.limit:
+            wake_at = lane.paused_until
+            if now >= wake_at and lane.rate:
+                lane.refill(now)
+                # Kova kapasitesinden büyük istekler de kova dolunca geçebilsin
+                cost = min(waiter.cost, lane.tokens_per_minute)
+                if lane.tokens < cost:
+                    wake_at = now + (cost - lane.tokens) / lane.rate
+            if now < wake_at:
+                if lane.timer is None:
+                    lane.timer = asyncio.get_running_loop().call_later(wake_at - now, self._on_wake, lane)
+                return
+            lane.remove(waiter)
+            lane.active += 1
+            if lane.rate:
+                lane.tokens -= min(waiter.cost, lane.tokens_per_minute)
+            waiter.future.set_result(None)
+
+    def _on_wake(self, lane: _ModelLane):
+        lane.timer = None
+        self._dispatch(lane)
+
+    def _release(self, lane: _ModelLane):
+        lane.active -= 1
+        self._dispatch(lane)
+
+    def _position(self, lane: _ModelLane, waiter: _Waiter) -> int:
+        for position, queued in enumerate(lane.order(), start=1):
+            if queued is waiter:
+                return position
+        return 0
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        model: str,
+        priority: int,
+        session_key: str,
+        estimated_tokens: int,
+        on_wait: Callable[[int, int], Awaitable[None]] | None = None,
+    ):
+        """
+        Model için bir upstream yuvası ayırır (async context manager); blok bitince yuva bırakılır.
+        Kuyrukta beklenirse on_wait(sıra, bekleme_ms) sıra değiştikçe, yuva alındığında da (0, toplam_ms) ile çağrılır.
+        """
+        lane = self._lane(model)
+        if lane.waiting >= UPSTREAM_MAX_QUEUE_PER_MODEL:
+            self.rejected_total += 1
+            raise UpstreamBusy(f"Too many queued requests for {model}, please retry shortly.")
+
+        waiter = _Waiter(session_key, priority, estimated_tokens + UPSTREAM_EXPECTED_COMPLETION_TOKENS)
+        lane.push(waiter)
+        self._dispatch(lane)
+
+        if not waiter.future.done():
+            self.queued_total += 1
+            await self._wait(lane, waiter, on_wait)
+
+        grant = _Grant(self, lane, waiter.cost)
+        self.granted_total += 1
+        try:
+            yield grant
+        finally:
+            self._release(lane)
+
+    async def _wait(self, lane: _ModelLane, waiter: _Waiter, on_wait):
+        deadline = waiter.enqueued_at + UPSTREAM_MAX_QUEUE_WAIT_SECONDS
+        last_position = None
+        try:
+            while not waiter.future.done():
+                now = time.monotonic()
+                if now >= deadline:
+                    self.rejected_total += 1
+                    raise UpstreamBusy(f"Timed out waiting for a free {lane.model} slot, please retry shortly.")
+                position = self._position(lane, waiter)
+                if on_wait is not None and position != last_position:
+                    last_position = position
+                    await on_wait(position, int((now - waiter.enqueued_at) * 1000))
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter.future), min(QUEUE_UPDATE_INTERVAL, deadline - now))
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            # İptal/zaman aşımı: kuyruktan çık; bu arada yuva verilmişse geri bırak
+            if waiter.future.done():
+                self._release(lane)
+            else:
+                lane.remove(waiter)
+                waiter.future.cancel()
+                self._dispatch(lane)
+            raise
+
+        waited = time.monotonic() - waiter.enqueued_at
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        UPSTREAM_QUEUE_WAIT_SECONDS.observe(waited, model=lane.model, priority=waiter.priority)
+        if on_wait is not None:
+            await on_wait(0, int(waited * 1000))
+
+    def stats(self) -> dict:
+        return {
+            "granted_total": self.granted_total,
+            "queued_total": self.queued_total,
+            "rejected_total": self.rejected_total,
+            "rate_limited_total": self.rate_limited_total,
+            "avg_queue_wait_ms": round(self.wait_seconds_total / self.queued_total * 1000, 1) if self.queued_total else 0.0,
+            "max_queue_wait_ms": round(self.wait_seconds_max * 1000, 1),
+            "models": {
+                model: {
+                    "active": lane.active,
+                    "queued": lane.waiting,
+                    "limit": lane.limit,
+                    "tokens_per_minute": lane.tokens_per_minute,
+                    "tokens_available": round(lane.tokens) if lane.rate else None,
+                }
+                for model, lane in self._lanes.items()
+            },
+        }
+
+
+class _Grant:
+    """Alınmış yuva: gerçek token kullanımını bütçeye yansıtır ve 429 yanıtlarını zamanlayıcıya bildirir."""
+
+    def __init__(self, scheduler: UpstreamScheduler, lane: _ModelLane, charged: int):
+        self.scheduler = scheduler
+        self.lane = lane
+        self.charged = charged
+
+    def settle(self, used_tokens: int):
+        """Tahminle düşülen token'ı gerçek kullanıma göre düzeltir."""
+        if self.lane.rate:
+            self.lane.tokens -= used_tokens - min(self.charged, self.lane.tokens_per_minute)
+            self.charged = used_tokens
+
+    def observe(self, response: httpx.Response):
+        if response.status_code != 429:
+            return
+        try:
+            retry_after = float(response.headers.get("retry-after", ""))
+        except ValueError:
+            retry_after = UPSTREAM_RATE_LIMIT_BACKOFF_SECONDS
+        self.scheduler.rate_limited_total += 1
+        self.lane.paused_until = max(self.lane.paused_until, time.monotonic() + retry_after)
+        logger.warning("⏸️ %s için hız sınırı (429): kuyruk %.0f sn duraklatıldı.", self.lane.model, retry_after)
+
+
+upstream_scheduler = UpstreamScheduler()
+
+
+def usage_tokens(usage: dict | None) -> int | None:
+    """OpenRouter 'usage' alanından toplam token sayısı."""
+    if not usage:
+        return None
+    return usage.get("total_tokens") or (usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)) or None
+
+
+async def scheduled_post(payload: dict, headers: dict, session_key: str, priority: int = PRIORITY_BACKGROUND) -> httpx.Response:
+    """upstream.post'u zamanlayıcı üzerinden çalıştırır (arka plan özetleme çağrıları için)."""
+    model = payload.get("model", "")
+    async with upstream_scheduler.slot(model, priority, session_key, estimate_prompt_tokens(payload.get("messages", []))) as grant:
+        response = await upstream.post(payload, headers)
+        grant.observe(response)
+        if response.is_success:
+            try:
+                body = response.json()
+            except ValueError:
+                body = {}
+            used = usage_tokens(body.get("usage"))
+            if used is None:
+                text = "".join(choice.get("message", {}).get("content") or "" for choice in body.get("choices", []))
+                used = grant.charged - UPSTREAM_EXPECTED_COMPLETION_TOKENS + estimate_tokens(text)
+            grant.settle(used)
+        return response
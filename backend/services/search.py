@@ -0,0 +1,216 @@
+# backend/services/search.py
+
+import asyncio
+import html
+import re
+from datetime import datetime
+from sqlalchemy import text, column, Integer, String, Float, DateTime
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+import database
+from config import SEARCH_TEXT_CONFIG
+from services.logger import get_logger
+
+logger = get_logger("search")
+
+# Vurgulanan terimler önce kontrol karakterleriyle işaretlenir, metin HTML-escape edildikten sonra <mark>'a çevrilir
+_START, _STOP = "\x02", "\x03"
+SNIPPET_ELLIPSIS = "…"
+
+if not re.fullmatch(r"[a-z_]+", SEARCH_TEXT_CONFIG):
+    raise ValueError(f"Invalid SEARCH_TEXT_CONFIG: {SEARCH_TEXT_CONFIG!r}")
+
+# İfade index'i: ek kolon ve tablo yeniden yazımı gerekmez, INSERT/UPDATE'te Postgres index'i kendisi günceller.
+# Sorgudaki ifade index'tekiyle birebir aynı olmalı (yapılandırma bu yüzden parametre değil, sabit).
+_PG_VECTOR = f"to_tsvector('{SEARCH_TEXT_CONFIG}'::regconfig, coalesce(m.text, ''))"
+_PG_INDEX_NAME = f"ix_chat_messages_text_search_{SEARCH_TEXT_CONFIG}"
+_PG_HEADLINE_OPTIONS = f"StartSel={_START}, StopSel={_STOP}, MaxWords=35, MinWords=15, MaxFragments=2, FragmentDelimiter=\" {SNIPPET_ELLIPSIS} \""
+
+_RESULT_COLUMNS = (
+    column("id", Integer), column("session_id", Integer), column("role", String),
+    column("created_at", DateTime(timezone=True)), column("score", Float), column("snippet", String),
+)
+
+
+def _postgres_query(session_filter: bool):
+    # Sıralama alt sorguda yapılır; pahalı ts_headline sadece dönen sayfadaki satırlar için hesaplanır
+    return text(f"""
+        WITH q AS (SELECT websearch_to_tsquery('{SEARCH_TEXT_CONFIG}'::regconfig, :query) AS query)
+        SELECT hits.id, hits.session_id, hits.role, hits.created_at, hits.score,
+               ts_headline('{SEARCH_TEXT_CONFIG}'::regconfig, coalesce(hits.text, ''), q.query, :headline_options) AS snippet
+        FROM (
+            SELECT m.id, m.session_id, m.role, m.created_at, m.text, ts_rank_cd({_PG_VECTOR}, q.query) AS score
+            FROM chat_messages m, q
+            WHERE {_PG_VECTOR} @@ q.query {"AND m.session_id = :session_id" if session_filter else ""}
+            ORDER BY score DESC, m.id DESC
+            LIMIT :limit OFFSET :offset
+        ) hits, q
+        ORDER BY hits.score DESC, hits.id DESC
+    """).columns(*_RESULT_COLUMNS)
+
+
+def _sqlite_query(session_filter: bool):
+    return text(f"""
+        SELECT m.id, m.session_id, m.role, m.created_at, -chat_messages_fts.rank AS score,
+               snippet(chat_messages_fts, 0, char(2), char(3), '{SNIPPET_ELLIPSIS}', 24) AS snippet
+        FROM chat_messages_fts JOIN chat_messages m ON m.id = chat_messages_fts.rowid
+        WHERE chat_messages_fts MATCH :query {"AND m.session_id = :session_id" if session_filter else ""}
+        ORDER BY chat_messages_fts.rank, m.id DESC
+        LIMIT :limit OFFSET :offset
+    """).columns(*_RESULT_COLUMNS)
+
+
+def _fts5_match(query: str) -> str:
+    """Kullanıcı girdisini FTS5 sözdizimine güvenli çevirir: her kelime tırnaklı terim, terimler AND."""
+    return " ".join('"' + term.replace('"', '""') + '"' for term in re.findall(r"\w+", query))
+
+
+def highlight(snippet: str | None) -> str:
+    """Snippet'i HTML-escape eder ve eşleşen terimleri <mark> ile sarar."""
+    return html.escape(snippet or "").replace(_START, "<mark>").replace(_STOP, "</mark>")
+
+
+async def search_messages(db: AsyncSession, query: str, limit: int, offset: int = 0, session_id: int | None = None) -> tuple[list[dict], bool]:
+    """Mesaj metinlerinde arar; (alaka sırasına göre sonuçlar, daha fazla sonuç var mı) döndürür."""
+    params = {"limit": limit + 1, "offset": offset}
+    if session_id is not None:
+        params["session_id"] = session_id
+
+    dialect = db.bind.dialect.name
+    if dialect == "postgresql":
+        statement = _postgres_query(session_id is not None)
+        params.update(query=query, headline_options=_PG_HEADLINE_OPTIONS)
+    elif dialect == "sqlite":
+        match = _fts5_match(query)
+        if not match:
+            return [], False
+        statement = _sqlite_query(session_id is not None)
+        params["query"] = match
+    else:
+        raise NotImplementedError(f"Full-text search is not supported on {dialect}")
+
+    rows = (await db.execute(statement, params)).all()
+    hits = [
+        {
+            "message_id": row.id,
+            "session_id": row.session_id,
+            "role": row.role,
+            "created_at": row.created_at.isoformat() if isinstance(row.created_at, datetime) else row.created_at,
+            # Ham puan: SQLite bm25 değerleri ~1e-6 mertebesindedir, yuvarlamak sıralamayı silerdi.
+            # Puanlar yalnızca aynı backend'in sonuçları arasında karşılaştırılabilir.
+            "score": row.score or 0.0,
+            "snippet": highlight(row.snippet),
+        }
+        for row in rows[:limit]
+    ]
+    return hits, len(rows) > limit
+
+
+def _setup_sqlite(sync_conn):
+    """FTS5 (external content) tablosunu ve chat_messages ile senkron tutan tetikleyicileri kurar."""
+    exists = sync_conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'chat_messages_fts'")).first()
+    sync_conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS chat_messages_fts USING fts5("
+        "text, content='chat_messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+    ))
+    sync_conn.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS chat_messages_fts_insert AFTER INSERT ON chat_messages BEGIN
+            INSERT INTO chat_messages_fts(rowid, text) VALUES (new.id, new.text);
+        END
+    """))
+    sync_conn.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS chat_messages_fts_delete AFTER DELETE ON chat_messages BEGIN
+            INSERT INTO chat_messages_fts(chat_messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        END
+    """))
+    sync_conn.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS chat_messages_fts_update AFTER UPDATE OF text ON chat_messages BEGIN
+            INSERT INTO chat_messages_fts(chat_messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+            INSERT INTO chat_messages_fts(rowid, text) VALUES (new.id, new.text);
+        END
+    """))
+    if not exists:
+        # Tablo yeni oluşturulduysa mevcut mesajlar tek seferde index'lenir
+        sync_conn.execute(text("INSERT INTO chat_messages_fts(chat_messages_fts) VALUES ('rebuild')"))
+        logger.info("🔎 SQLite FTS5 arama index'i oluşturuldu.")
+
+
+async def _setup_postgres():
+    """GIN ifade index'ini CONCURRENTLY kurar: yazmalar kilitlenmez, büyük tablolarda da açılışı bekletmez."""
+    async with database.engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        valid = (await conn.execute(text(
+            "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+        ), {"name": _PG_INDEX_NAME})).scalar_one_or_none()
+        if valid:
+            return
+        if valid is False:
+            # Yarıda kalmış CONCURRENTLY kurulumu geçersiz index bırakır; silinip yeniden kurulur
+            await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {_PG_INDEX_NAME}"))
+        logger.info("🔎 Arama index'i kuruluyor (%s)...", _PG_INDEX_NAME)
+        await conn.execute(_create_postgres_index(concurrently=True))
+        logger.info("🔎 Arama index'i hazır (%s).", _PG_INDEX_NAME)
+
+
+def _create_postgres_index(concurrently: bool):
+    return text(
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {_PG_INDEX_NAME} "
+        f"ON chat_messages USING GIN ((to_tsvector('{SEARCH_TEXT_CONFIG}'::regconfig, coalesce(text, ''))))"
+    )
+
+
+def _drop_sqlite(sync_conn):
+    for trigger in ("chat_messages_fts_insert", "chat_messages_fts_delete", "chat_messages_fts_update"):
+        sync_conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+    sync_conn.execute(text("DROP TABLE IF EXISTS chat_messages_fts"))
+
+
+async def drop_search_index(conn: AsyncConnection):
+    """Toplu yüklemeden önce arama index'ini (ve SQLite tetikleyicilerini) kaldırır; rebuild_search_index ile geri kurulur."""
+    if conn.dialect.name == "sqlite":
+        await conn.run_sync(_drop_sqlite)
+    elif conn.dialect.name == "postgresql":
+        await conn.execute(text(f"DROP INDEX IF EXISTS {_PG_INDEX_NAME}"))
+
+
+async def rebuild_search_index(conn: AsyncConnection):
+    """Arama index'ini tek seferde yeniden kurar (toplu yükleme sonrası; satır satır güncellemekten çok daha hızlı)."""
+    if conn.dialect.name == "sqlite":
+        await conn.run_sync(_setup_sqlite)
+    elif conn.dialect.name == "postgresql":
+        await conn.execute(_create_postgres_index(concurrently=False))
+
+
+class SearchIndex:
+    """
+    Arama index'ini açılışta hazırlar. SQLite'ta FTS5 tablosu ve tetikleyiciler hemen kurulur
+    (ilk mesaj yazılmadan önce hazır olmalı); Postgres'te GIN index arka planda kurulur,
+    bu sürede arama çalışır ama index'siz taranır.
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        dialect = database.engine.dialect.name
+        if dialect == "sqlite":
+            async with database.engine.begin() as conn:
+                await conn.run_sync(_setup_sqlite)
+        elif dialect == "postgresql":
+            self._task = asyncio.create_task(self._run_postgres_setup())
+
+    async def _run_postgres_setup(self):
+        try:
+            await _setup_postgres()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("❌ Arama index'i kurulamadı")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+search_index = SearchIndex()
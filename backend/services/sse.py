@@ -0,0 +1,60 @@
+# backend/services/sse.py
+
+from typing import AsyncIterator
+
+DONE = b"[DONE]"
+
+
+class SSEDecoder:
+    """
+    Ham byte parçaları üzerinde çalışan artımlı Server-Sent Events çözücüsü.
+    Parçalar satır ortasından bölünmüş gelebilir; tamamlanmış her olayın `data`
+    alanı (birden çok data: satırı varsa '\\n' ile birleştirilmiş) bytes olarak döner.
+    ':' ile başlayan yorum satırları (örn. ": OPENROUTER PROCESSING") ve diğer alanlar yok sayılır.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._data_lines: list[bytes] = []
+
+    def feed(self, chunk: bytes) -> list[bytes]:
+        buffer = self._buffer
+        # Önceki parçalarda taranmış kısmı yeniden taramayız; çok parçalı büyük satırlarda
+        # (örn. base64 görsel) maliyet doğrusal kalır
+        search_from = len(buffer)
+        buffer += chunk
+        events = []
+        start = 0
+        while (end := buffer.find(b"\n", search_from)) != -1:
+            line = bytes(buffer[start:end])
+            start = search_from = end + 1
+            if line.endswith(b"\r"):
+                line = line[:-1]
+            if not line:
+                if self._data_lines:
+                    events.append(self._data_lines[0] if len(self._data_lines) == 1 else b"\n".join(self._data_lines))
+                    self._data_lines = []
+            elif line.startswith(b"data:"):
+                value = line[5:]
+                self._data_lines.append(value[1:] if value.startswith(b" ") else value)
+            # Yorumlar (':') ve event/id/retry alanları sohbet akışı için gerekmez
+        del buffer[:start]
+        return events
+
+    def close(self) -> list[bytes]:
+        """Akış boş satır olmadan biterse son olayı da döndürür."""
+        events = self.feed(b"\n\n") if self._buffer else []
+        if self._data_lines:
+            events.append(b"\n".join(self._data_lines))
+            self._data_lines = []
+        return events
+
+
+async def aiter_sse_data(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Byte akışındaki her SSE olayının data alanını sırayla üretir."""
+    decoder = SSEDecoder()
+    async for chunk in chunks:
+        for data in decoder.feed(chunk):
+            yield data
+    for data in decoder.close():
+        yield data
@@ -0,0 +1,159 @@
+# backend/services/stream_manager.py
+
+import asyncio
+import itertools
+import uuid
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable
+from config import STREAM_REPLAY_BUFFER_EVENTS, STREAM_RETENTION_SECONDS, STREAM_SHUTDOWN_GRACE_SECONDS
+from services.logger import get_logger
+
+logger = get_logger("stream")
+
+# Anlık görüntüye (resync) dahil edilmeyen, istemcinin mutlaka görmesi gereken olaylar
+TERMINAL_EVENTS = ("error", "stream_end")
+
+
+class GenerationAlreadyRunning(Exception):
+    """Oturum için zaten devam eden bir cevap üretimi var."""
+
+
+class GenerationStream:
+    """
+    Tek bir cevap üretiminin olay akışı. Her olaya artan bir sıra numarası (seq) verilir ve
+    olaylar sınırlı bir tamponda tutulur; bağlı istemciler (sıfır, bir ya da birden çok) tampondan okur.
+    Tampondan düşmüş olaylar için birikmiş metin ve görsellerden 'resync' anlık görüntüsü üretilir.
+    """
+
+    def __init__(self, session_id: int, buffer_size: int = STREAM_REPLAY_BUFFER_EVENTS):
+        self.session_id = session_id
+        self.stream_id = uuid.uuid4().hex[:16]
+        self.events: deque[dict] = deque(maxlen=buffer_size)
+        self.last_seq = 0
+        self.content_parts: list[str] = []
+        self.reasoning_parts: list[str] = []
+        self.images: list[str] = []
+        self.finished = False
+        self.task: asyncio.Task | None = None
+        self._changed = asyncio.Event()
+
+    @property
+    def content(self) -> str:
+        return "".join(self.content_parts)
+
+    @property
+    def reasoning(self) -> str:
+        return "".join(self.reasoning_parts)
+
+    def publish(self, event: dict):
+        self.last_seq += 1
+        event["seq"] = self.last_seq
+        event_type = event.get("type")
+        if event_type == "chat_message":
+            self.content_parts.append(event["content"])
+        elif event_type == "reasoning":
+            self.reasoning_parts.append(event["content"])
+        elif event_type == "image":
+            self.images.append(event["image_url"])
+        self.events.append(event)
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def finish(self):
+        self.finished = True
+        self._changed.set()
+
+    def snapshot(self) -> dict:
+        return {
+            "type": "resync", "seq": self.last_seq,
+            "content": self.content, "reasoning": self.reasoning, "images": list(self.images),
+        }
+
+    async def follow(self, after_seq: int = 0) -> AsyncIterator[dict]:
+        """after_seq'ten sonraki olayları üretir; akış bitip son olay verilince sona erer."""
+        yield {"type": "stream_start", "stream_id": self.stream_id, "seq": after_seq}
+        next_seq = after_seq + 1
+        ended = False
+        while True:
+            changed = self._changed
+            if self.events and next_seq < self.events[0]["seq"]:
+                # İstemcinin kaldığı yer tampondan düştü: birikmiş durumu tek seferde gönder.
+                # Anlık görüntü metni taşır ama hata/bitiş olaylarını taşımaz; tampondakiler ardından gönderilir.
+                snapshot = self.snapshot()
+                next_seq = snapshot["seq"] + 1
+                terminal = [event for event in self.events if event["type"] in TERMINAL_EVENTS and event["seq"] < next_seq]
+                yield snapshot
+                for event in terminal:
+                    ended = ended or event["type"] == "stream_end"
+                    yield event
+                continue
+            if self.events and next_seq <= self.last_seq:
+                # Tampon tüketici yield'de beklerken değişebilir; önce kopyala
+                start = next_seq - self.events[0]["seq"]
+                pending = list(itertools.islice(self.events, start, None))
+                next_seq = pending[-1]["seq"] + 1
+                for event in pending:
+                    ended = ended or event["type"] == "stream_end"
+                    yield event
+                continue
+            if self.finished:
+                # Üretim stream_end yayınlamadan bittiyse (örn. kapanışta iptal) istemci yine de bitişi görmeli
+                if not ended:
+                    yield {"type": "stream_end", "seq": self.last_seq}
+                return
+            await changed.wait()
+
+
+class StreamManager:
+    """
+    Oturum başına cevap üretim görevlerini yönetir. Üretim WebSocket'ten bağımsız çalışır:
+    soket koptuğunda görev sürer, mesaj istemci bağlı olmasa da kaydedilir ve
+    aynı süreçteki yeni bir bağlantı akışa kaldığı sıradan yeniden katılabilir.
+    """
+
+    def __init__(self):
+        self._streams: dict[int, GenerationStream] = {}
+
+    def get(self, session_id: int) -> GenerationStream | None:
+        return self._streams.get(session_id)
+
+    def is_running(self, session_id: int) -> bool:
+        stream = self._streams.get(session_id)
+        return stream is not None and not stream.finished
+
+    def running_count(self) -> int:
+        return sum(1 for stream in self._streams.values() if not stream.finished)
+
+    def start(self, session_id: int, generate: Callable[[GenerationStream], Awaitable[None]]) -> GenerationStream:
+        """generate(stream) görevini başlatır; görev olayları stream.publish ile yayınlar."""
+        if self.is_running(session_id):
+            raise GenerationAlreadyRunning("A response is still being generated for this chat.")
+        stream = GenerationStream(session_id)
+        self._streams[session_id] = stream
+        stream.task = asyncio.create_task(self._run(stream, generate))
+        return stream
+
+    async def _run(self, stream: GenerationStream, generate):
+        try:
+            await generate(stream)
+        finally:
+            stream.finish()
+            asyncio.get_running_loop().call_later(STREAM_RETENTION_SECONDS, self._expire, stream)
+
+    def _expire(self, stream: GenerationStream):
+        if self._streams.get(stream.session_id) is stream:
+            del self._streams[stream.session_id]
+
+    async def stop(self, grace_seconds: float = STREAM_SHUTDOWN_GRACE_SECONDS):
+        """Kapanışta devam eden üretimlerin bitip kaydedilmesini bekler, süre dolarsa iptal eder."""
+        tasks = [stream.task for stream in self._streams.values() if stream.task and not stream.task.done()]
+        if not tasks:
+            return
+        logger.info("⏳ Kapanış: %d cevap üretiminin bitmesi bekleniyor.", len(tasks))
+        _, pending = await asyncio.wait(tasks, timeout=grace_seconds)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+stream_manager = StreamManager()
@@ -0,0 +1,198 @@
+# backend/services/summary_queue.py
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, update, or_, and_, case, true, false
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+from database import AsyncSessionLocal, dialect_insert
+from config import (
+    SUMMARY_DEBOUNCE_SECONDS, SUMMARY_WORKER_CONCURRENCY, SUMMARY_JOB_MAX_ATTEMPTS,
+    SUMMARY_JOB_RETRY_BASE_SECONDS, SUMMARY_JOB_POLL_INTERVAL, SUMMARY_JOB_LEASE_SECONDS
+)
+from services.memory_service import generate_and_update_profile_summary
+from services.logger import get_logger
+from services.metrics import SUMMARY_JOBS_TOTAL, SUMMARY_STAGE_SECONDS, span
+
+logger = get_logger("summary_queue")
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(value: datetime | None) -> datetime | None:
+    # SQLite timezone bilgisi saklamaz; tüm zamanlar UTC yazıldığı için naive değerler UTC kabul edilir
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+async def enqueue_summary(session_id: int, delay_seconds: float = SUMMARY_DEBOUNCE_SECONDS):
+    """
+    Oturum için özetleme işini kuyruğa alır. Oturum başına tek satır tutulur:
+    bekleyen bir iş varsa sadece çalışma zamanı ileri itilir (debounce), yeni iş açılmaz.
+    İş o an çalışıyorsa durumuna dokunulmaz (ikinci bir worker aynı oturumu almasın);
+    yalnızca rerun_requested işaretlenir ve iş bitince run_after zamanında tekrar çalışır.
+    """
+    run_after = _utcnow() + timedelta(seconds=delay_seconds)
+    async with AsyncSessionLocal() as db:
+        insert = dialect_insert(db)
+        statement = insert(models.SummaryJob).values(
+            session_id=session_id, status="pending", run_after=run_after, attempts=0, updated_at=_utcnow()
+        )
+        jobs = models.SummaryJob.__table__.c
+        running = jobs.status == "running"
+        statement = statement.on_conflict_do_update(
+            index_elements=[models.SummaryJob.session_id],
+            set_={
+                "status": case((running, jobs.status), else_="pending"),
+                "run_after": run_after,
+                "attempts": case((running, jobs.attempts), else_=0),
+                "rerun_requested": running,
+                "last_error": case((running, jobs.last_error), else_=None),
+                # Çalışan işin lease'i uzatılmaz; worker çökerse iş yine zamanında geri alınır
+                "updated_at": case((running, jobs.updated_at), else_=_utcnow()),
+            },
+        )
+        await db.execute(statement)
+        await db.commit()
+    logger.info("⌛ Özetleme işi kuyruğa alındı (Oturum: %s), en erken %.0f sn sonra çalışacak.", session_id, delay_seconds)
+
+
+async def _claim_job(db: AsyncSession) -> models.SummaryJob | None:
+    """Zamanı gelmiş (veya lease süresi dolmuş) bir işi atomik olarak 'running' durumuna alır."""
+    now = _utcnow()
+    claimable = or_(
+        and_(models.SummaryJob.status == "pending", models.SummaryJob.run_after <= now),
+        and_(models.SummaryJob.status == "running", models.SummaryJob.updated_at <= now - timedelta(seconds=SUMMARY_JOB_LEASE_SECONDS)),
+    )
+    job = (await db.execute(
+        select(models.SummaryJob).where(claimable).order_by(models.SummaryJob.run_after)
+        .limit(1).with_for_update(skip_locked=True)
+    )).scalar_one_or_none()
+    if job is None:
+        await db.rollback()
+        return None
+
+    # Koşullu UPDATE: SKIP LOCKED olmayan veritabanlarında (SQLite) da aynı işi iki worker alamaz
+    result = await db.execute(
+        update(models.SummaryJob)
+        .where(models.SummaryJob.id == job.id, models.SummaryJob.status == job.status, models.SummaryJob.attempts == job.attempts)
+        .values(status="running", attempts=models.SummaryJob.attempts + 1, updated_at=now)
+    )
+    await db.commit()
+    if result.rowcount == 0:
+        return None
+    await db.refresh(job)
+    return job
+
+
+def _finish_values(status: str) -> dict:
+    """İşi bitirirken yazılacak değerler; bu arada yeniden kuyruğa alındıysa iş 'pending'e döner."""
+    rerun = models.SummaryJob.rerun_requested == true()
+    return {
+        "status": case((rerun, "pending"), else_=status),
+        "attempts": case((rerun, 0), else_=models.SummaryJob.attempts),
+        "rerun_requested": false(),
+        "last_error": None,
+    }
+
+
+async def _run_job(db: AsyncSession, job: models.SummaryJob):
+    session = await db.get(models.ChatSession, job.session_id)
+    if not session:
+        logger.info("🧠 Özetleme iptal edildi (Oturum: %s). Oturum bulunamadı.", job.session_id)
+        job.status = "done"
+        await db.commit()
+        SUMMARY_JOBS_TOTAL.inc(outcome="skipped")
+        return
+
+    # Kullanıcı iş kuyruğa alındıktan sonra tekrar aktif olduysa sessiz dönem bitene kadar ertele
+    quiet_until = _as_utc(session.last_active_at) + timedelta(seconds=SUMMARY_DEBOUNCE_SECONDS) if session.last_active_at else None
+    if quiet_until and quiet_until > _utcnow():
+        logger.info("🧠 Özetleme ertelendi (Oturum: %s). Kullanıcı hala aktif (last_active: %s).", job.session_id, session.last_active_at)
+        await db.execute(
+            update(models.SummaryJob).where(models.SummaryJob.id == job.id, models.SummaryJob.status == "running")
+            .values(status="pending", run_after=quiet_until, attempts=models.SummaryJob.attempts - 1, rerun_requested=False)
+        )
+        await db.commit()
+        SUMMARY_JOBS_TOTAL.inc(outcome="deferred")
+        return
+
+    logger.info("🧠 Kullanıcı hala pasif. Özetleme başlatılıyor (Oturum: %s)...", job.session_id)
+    with span("memory_total", histogram=SUMMARY_STAGE_SECONDS):
+        await generate_and_update_profile_summary(job.session_id, db)
+    # İş çalışırken yeniden kuyruğa alındıysa yeni mesajlar için tekrar (run_after zamanında) çalışır
+    await db.execute(
+        update(models.SummaryJob)
+        .where(models.SummaryJob.id == job.id, models.SummaryJob.status == "running")
+        .values(**_finish_values("done"))
+    )
+    await db.commit()
+    SUMMARY_JOBS_TOTAL.inc(outcome="done")
+
+
+async def _fail_job(job_id: int, attempts: int, error: Exception):
+    async with AsyncSessionLocal() as db:
+        if attempts >= SUMMARY_JOB_MAX_ATTEMPTS:
+            values = {**_finish_values("failed"), "last_error": str(error)}
+            SUMMARY_JOBS_TOTAL.inc(outcome="failed")
+            logger.error("❌ Özetleme işi %d denemeden sonra başarısız oldu (iş: %s): %s", attempts, job_id, error)
+        else:
+            backoff = SUMMARY_JOB_RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+            values = {
+                "status": "pending", "run_after": _utcnow() + timedelta(seconds=backoff),
+                "rerun_requested": False, "last_error": str(error),
+            }
+            SUMMARY_JOBS_TOTAL.inc(outcome="retry")
+            logger.warning("🔁 Özetleme işi %.0f sn sonra tekrar denenecek (iş: %s, deneme: %d): %s", backoff, job_id, attempts, error)
+        await db.execute(
+            update(models.SummaryJob)
+            .where(models.SummaryJob.id == job_id, models.SummaryJob.status == "running")
+            .values(**values)
+        )
+        await db.commit()
+
+
+class SummaryWorkerPool:
+    """Kuyruktaki özetleme işlerini sınırlı sayıda eşzamanlı worker ile işler."""
+
+    def __init__(self, concurrency: int = SUMMARY_WORKER_CONCURRENCY):
+        self.concurrency = concurrency
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker(index)) for index in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, index: int):
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    job = await _claim_job(db)
+                    if job is None:
+                        await asyncio.sleep(SUMMARY_JOB_POLL_INTERVAL)
+                        continue
+                    job_id, attempts = job.id, job.attempts
+                    try:
+                        await _run_job(db, job)
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        await db.rollback()
+                        logger.exception("❌ Özetleme işi hata aldı (iş: %s)", job_id)
+                        await _fail_job(job_id, attempts, e)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("❌ Özetleme worker'ı #%d hata aldı", index)
+                await asyncio.sleep(SUMMARY_JOB_POLL_INTERVAL)
+
+
+summary_workers = SummaryWorkerPool()
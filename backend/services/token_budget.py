@@ -0,0 +1,99 @@
+# backend/services/token_budget.py
+
+from config import (
+    MODEL_CONTEXT_WINDOWS, DEFAULT_CONTEXT_WINDOW, DEFAULT_RESPONSE_TOKEN_RESERVE,
+    REASONING_MODELS_MAX_TOKENS, MAX_PROMPT_TOKENS, PREFILL_TOKENS_PER_SECOND
+)
+from services.logger import get_logger
+
+logger = get_logger("token_budget")
+
+# Her mesajın rol/ayraç gibi biçim token'ları için sabit pay
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Bütçe kırpmalarının sayaçları (TTFT kazancı tahmini dahil)
+budget_stats = {
+    "requests_total": 0,
+    "requests_trimmed": 0,
+    "messages_trimmed": 0,
+    "tokens_trimmed": 0,
+    "estimated_ttft_saved_seconds": 0.0,
+}
+
+
+class ContextBudgetExceeded(Exception):
+    """Son kullanıcı mesajı tek başına modelin prompt bütçesine sığmıyor."""
+
+
+def prompt_budget(model: str) -> int:
+    """Model için prompt'a ayrılabilecek token sayısı (context window - cevap payı)."""
+    reserve = REASONING_MODELS_MAX_TOKENS.get(model, DEFAULT_RESPONSE_TOKEN_RESERVE)
+    budget = MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW) - reserve
+    if MAX_PROMPT_TOKENS:
+        budget = min(budget, MAX_PROMPT_TOKENS)
+    return budget
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Tokenizer çalıştırmadan hızlı tahmin: UTF-8 byte sayısının ~1/4'ü.
+    ASCII dışı karakterlerde biraz fazla sayar; bütçe için güvenli taraftadır.
+    """
+    return (len(text.encode("utf-8")) + 3) // 4
+
+
+def _estimate_message(message: dict) -> int:
+    content = message.get("content", "")
+    if isinstance(content, list):
+        text = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    else:
+        text = str(content)
+    return estimate_tokens(text) + MESSAGE_OVERHEAD_TOKENS
+
+
+def estimate_prompt_tokens(messages: list[dict]) -> int:
+    """API'ye gidecek mesaj listesinin tahmini toplam token sayısı."""
+    return sum(_estimate_message(message) for message in messages)
+
+
+def message_tokens(message: dict) -> int:
+    """Geçmiş önbelleğindeki mesajın tahmini token sayısı; sonuç mesajın üzerinde saklanır."""
+    tokens = message.get("tokens")
+    if tokens is None:
+        tokens = message["tokens"] = _estimate_message(message)
+    return tokens
+
+
+def fit_history(model: str, fixed_messages: list[dict], history: list[dict]) -> list[dict]:
+    """
+    Sabit mesajlar (hafıza, kayan özet) ile birlikte bütçeye sığan en yeni geçmiş dilimini döndürür.
+    En eski mesajlar önce düşer; kırpılan mesajlar zamanla kayan özete katlanır.
+    """
+    budget = prompt_budget(model) - sum(_estimate_message(msg) for msg in fixed_messages)
+    budget_stats["requests_total"] += 1
+
+    used, start = 0, len(history)
+    while start > 0:
+        tokens = message_tokens(history[start - 1])
+        if used + tokens > budget:
+            break
+        used += tokens
+        start -= 1
+
+    if start == len(history) and history:
+        raise ContextBudgetExceeded(
+            f"Message is too long for {model} (~{message_tokens(history[-1])} tokens, budget {max(budget, 0)})."
+        )
+
+    # Kırpma sonrası geçmiş yarım kalmış bir cevapla (assistant) başlamasın
+    if 0 < start < len(history) - 1 and history[start]["role"] == "assistant":
+        start += 1
+
+    if start > 0:
+        trimmed_tokens = sum(message_tokens(msg) for msg in history[:start])
+        budget_stats["requests_trimmed"] += 1
+        budget_stats["messages_trimmed"] += start
+        budget_stats["tokens_trimmed"] += trimmed_tokens
+        budget_stats["estimated_ttft_saved_seconds"] += trimmed_tokens / PREFILL_TOKENS_PER_SECOND
+        logger.info("✂️ Context bütçesi aşıldı (%s): en eski %d mesaj (~%d token) prompt'tan çıkarıldı.", model, start, trimmed_tokens)
+    return history[start:]
@@ -0,0 +1,434 @@
+# backend/services/transfer.py
+
+import base64
+import binascii
+import json
+import time
+from datetime import datetime, timezone
+from typing import AsyncIterator
+from sqlalchemy import select, insert, delete, func, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+import models
+import database
+from config import BLOB_MAX_BYTES, DEFAULT_USER_ID
+from services.blob_store import blob_store, sniff_image_type, BLOB_URL_PREFIX
+from services.fast_json import dumps, loads
+from services.message_format import decode_message
+from services.search import drop_search_index, rebuild_search_index
+from services.logger import get_logger
+
+logger = get_logger("transfer")
+
+# NDJSON dökümü: ilk satır başlık, ardından oturumların kullanıcılarının hafıza profilleri, tüm oturumlar,
+# ardından oturum ve id sırasıyla tüm mesajlar. Oturumlar mesajlardan önce geldiği için içe aktarım
+# satır satır, tek geçişte yapılabilir.
+# Mesajların /api/blobs/<hash> referansı verdiği görseller, onları kullanan ilk mesajdan hemen önce
+# "blob" satırı (base64 içerik + tür) olarak bir kez yazılır; döküm blob deposu olmadan da eksiksizdir.
+EXPORT_FORMAT = 2
+# Biçim 1 dökümler (blob satırı yok) hâlâ içe aktarılabilir; görsel referansları olduğu gibi kalır
+IMPORT_FORMATS = (1, 2)
+# Sunucu tarafı imleçten tek seferde çekilen satır (ve tek yield'de gönderilen NDJSON satırı) sayısı
+EXPORT_BATCH_ROWS = 1000
+IMPORT_BATCH_ROWS = 5000
+# SQLite'ta içe aktarılan id aralığını uygulamanın yazmalarına karşı tutan geçici yer tutucu satırların modeli
+RESERVATION_MARKER = "__import_reservation__"
+
+SESSION_FIELDS = (
+    "id", "created_at", "user_id", "model_used", "rolling_summary", "rolling_summary_upto_id",
+    "memory_summarized_upto_id", "last_active_at",
+)
+MESSAGE_FIELDS = ("id", "session_id", "role", "text", "reasoning", "attachments", "format_version", "created_at")
+PROFILE_FIELDS = ("user_id", "auto_summary_json", "version")
+
+
+def _iso(value: datetime | None) -> str | None:
+    return value.isoformat() if value is not None else None
+
+
+def _parse_datetime(value: str | None) -> datetime | None:
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    # SQLite'tan alınan dökümlerde zaman dilimi yoktur; uygulama her zamanı UTC yazar
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _session_conditions(session_ids: list[int] | None, created_after: datetime | None, created_before: datetime | None) -> list:
+    conditions = []
+    if session_ids:
+        conditions.append(models.ChatSession.id.in_(session_ids))
+    if created_after is not None:
+        conditions.append(models.ChatSession.created_at >= created_after)
+    if created_before is not None:
+        conditions.append(models.ChatSession.created_at < created_before)
+    return conditions
+
+
+def _line(record: dict) -> bytes:
+    return (dumps(record) + "\n").encode("utf-8")
+
+
+async def _blob_line(blob_hash: str) -> bytes | None:
+    info = await blob_store.stat(blob_hash)
+    if info is None:
+        logger.warning("⚠️ Dökümde referans verilen blob depoda yok: %s", blob_hash)
+        return None
+    data = b"".join([chunk async for chunk in blob_store.iter_chunks(blob_hash)])
+    return _line({
+        "type": "blob", "hash": blob_hash, "content_type": info.content_type,
+        "data": base64.b64encode(data).decode("ascii"),
+    })
+
+
+async def export_ndjson(
+    db: AsyncSession,
+    session_ids: list[int] | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+) -> AsyncIterator[bytes]:
+    """
+    Seçilen oturumları, kullanıcılarının hafıza profillerini, mesajlarını ve mesajların referans verdiği
+    blob'ları NDJSON olarak üretir.
+    Satırlar sunucu tarafı imleçle (yield_per) partiler halinde okunur; bellekte yalnızca yazılmış
+    blob özetleri tutulur. Eski biçimli mesajlar da yapılandırılmış alanlarla yazılır.
+    """
+    conditions = _session_conditions(session_ids, created_after, created_before)
+    message_query = select(
+        models.ChatMessage.id, models.ChatMessage.session_id, models.ChatMessage.role, models.ChatMessage.created_at,
+        models.ChatMessage.format_version, models.ChatMessage.text, models.ChatMessage.reasoning,
+        models.ChatMessage.attachments, models.ChatMessage.content,
+    )
+    if conditions:
+        message_query = message_query.where(
+            models.ChatMessage.session_id.in_(select(models.ChatSession.id).where(*conditions))
+        )
+
+    # Başlıktaki en büyük id'ler, içe aktarımın id aralığını baştan ayırabilmesi içindir
+    max_session_id = (await db.execute(select(func.max(models.ChatSession.id)).where(*conditions))).scalar()
+    max_message_id = (await db.execute(message_query.with_only_columns(func.max(models.ChatMessage.id)))).scalar()
+    yield _line({
+        "type": "export", "format": EXPORT_FORMAT, "exported_at": _iso(datetime.now(timezone.utc)),
+        "max_session_id": max_session_id or 0, "max_message_id": max_message_id or 0,
+    })
+
+    # client_id'siz eski oturumlar varsayılan kullanıcının profilini kullanır
+    session_users = select(func.coalesce(models.ChatSession.user_id, DEFAULT_USER_ID)).where(*conditions)
+    profiles = (await db.execute(
+        select(*(getattr(models.UserProfile, field) for field in PROFILE_FIELDS))
+        .where(models.UserProfile.user_id.in_(session_users)).order_by(models.UserProfile.user_id)
+    )).all()
+    if profiles:
+        yield b"".join(
+            _line({"type": "profile", "user_id": row.user_id, "auto_summary_json": row.auto_summary_json, "version": row.version})
+            for row in profiles
+        )
+
+    sessions = await db.stream(
+        select(*(getattr(models.ChatSession, field) for field in SESSION_FIELDS))
+        .where(*conditions).order_by(models.ChatSession.id)
+        .execution_options(yield_per=EXPORT_BATCH_ROWS)
+    )
+    async for rows in sessions.partitions():
+        yield b"".join(
+            _line({
+                "type": "session", "id": row.id, "created_at": _iso(row.created_at), "user_id": row.user_id, "model_used": row.model_used,
+                "rolling_summary": row.rolling_summary, "rolling_summary_upto_id": row.rolling_summary_upto_id,
+                "memory_summarized_upto_id": row.memory_summarized_upto_id, "last_active_at": _iso(row.last_active_at),
+            })
+            for row in rows
+        )
+
+    messages = await db.stream(
+        message_query.order_by(models.ChatMessage.session_id, models.ChatMessage.id)
+        .execution_options(yield_per=EXPORT_BATCH_ROWS)
+    )
+    exported_blobs: set[str] = set()
+    async for rows in messages.partitions():
+        lines = []
+        for row in rows:
+            decoded = decode_message(row)
+            for url in decoded["images"]:
+                if isinstance(url, str) and url.startswith(BLOB_URL_PREFIX):
+                    blob_hash = url[len(BLOB_URL_PREFIX):]
+                    if blob_hash not in exported_blobs:
+                        exported_blobs.add(blob_hash)
+                        if (blob_line := await _blob_line(blob_hash)) is not None:
+                            lines.append(blob_line)
+            lines.append(_line({
+                "type": "message", "id": row.id, "session_id": row.session_id, "role": row.role,
+                "text": decoded["content"], "reasoning": decoded["reasoning"] or None,
+                "images": decoded["images"], "created_at": _iso(row.created_at),
+            }))
+        yield b"".join(lines)
+
+
+async def aiter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Rastgele bölünmüş byte parçalarını satırlara ayırır (HTTP gövdesi ya da dosya okuma için)."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+class _Importer:
+    """
+    İçe aktarılan satırları partiler halinde yazar; Postgres'te COPY, diğerlerinde çoklu INSERT kullanır.
+    Her parti kendi transaction'ında commit edilir: uzun bir yazma kilidi/transaction tutulmaz.
+    """
+
+    def __init__(self, conn: AsyncConnection, session_offset: int, message_offset: int, batch_size: int):
+        self.conn = conn
+        self.session_offset = session_offset
+        self.message_offset = message_offset
+        self.batch_size = batch_size
+        self.profiles: list[dict] = []
+        self.sessions: list[dict] = []
+        self.messages: list[dict] = []
+        self.profile_count = 0
+        self.profiles_kept = 0
+        self.session_count = 0
+        self.message_count = 0
+        self.blob_count = 0
+
+    def _shift_message_id(self, value: int | None) -> int | None:
+        return value + self.message_offset if value is not None else None
+
+    async def add(self, record: dict):
+        if record["type"] == "blob":
+            await self.put_blob(record)
+        elif record["type"] == "profile":
+            self.profiles.append({
+                "user_id": record["user_id"],
+                "auto_summary_json": record.get("auto_summary_json") or "{}",
+                "version": record.get("version") or 0,
+            })
+        elif record["type"] == "session":
+            if self.profiles:
+                await self.flush_profiles()
+            self.sessions.append({
+                "id": record["id"] + self.session_offset,
+                "created_at": _parse_datetime(record.get("created_at")),
+                "user_id": record.get("user_id"),
+                "model_used": record.get("model_used"),
+                "rolling_summary": record.get("rolling_summary"),
+                "rolling_summary_upto_id": self._shift_message_id(record.get("rolling_summary_upto_id")),
+                "memory_summarized_upto_id": self._shift_message_id(record.get("memory_summarized_upto_id")),
+                "last_active_at": _parse_datetime(record.get("last_active_at")),
+            })
+            if len(self.sessions) >= self.batch_size:
+                await self.flush_sessions()
+        elif record["type"] == "message":
+            # Mesajın oturumu henüz tamponda olabilir (yabancı anahtar)
+            if self.sessions:
+                await self.flush_sessions()
+            images = record.get("images") or []
+            self.messages.append({
+                "id": record["id"] + self.message_offset,
+                "session_id": record["session_id"] + self.session_offset,
+                "role": record.get("role"),
+                "text": record.get("text") or "",
+                "reasoning": record.get("reasoning"),
+                "attachments": [{"type": "image", "url": url} for url in images] or None,
+                "format_version": 1,
+                "created_at": _parse_datetime(record.get("created_at")),
+            })
+            if len(self.messages) >= self.batch_size:
+                await self.flush_messages()
+
+    async def put_blob(self, record: dict):
+        """Blob'u depoya yazar; içerik, uygulamanın kabul ettiği kurallarla yeniden doğrulanır."""
+        try:
+            data = base64.b64decode(record["data"], validate=True)
+        except (binascii.Error, ValueError, KeyError, TypeError):
+            raise ValueError(f"Invalid blob record: {record.get('hash')}")
+        if len(data) > BLOB_MAX_BYTES:
+            raise ValueError(f"Blob {record.get('hash')} is larger than {BLOB_MAX_BYTES} bytes")
+        content_type = sniff_image_type(data)
+        if content_type is None:
+            raise ValueError(f"Blob {record.get('hash')} is not a supported image")
+        # Depo içerik adreslidir: özet, içerikten yeniden hesaplanan özetle aynı olmalı
+        if await blob_store.put(data, content_type) != record.get("hash"):
+            raise ValueError(f"Blob {record.get('hash')} does not match its content")
+        self.blob_count += 1
+
+    async def flush_profiles(self):
+        """Profiller kullanıcı id'siyle eşleşir; hedefte aynı kullanıcının profili varsa o korunur."""
+        if not self.profiles:
+            return
+        insert_profile = database.dialect_insert(self.conn)
+        async with self.conn.begin():
+            result = await self.conn.execute(
+                insert_profile(models.UserProfile.__table__).values(self.profiles)
+                .on_conflict_do_nothing(index_elements=["user_id"])
+                .returning(models.UserProfile.__table__.c.user_id)
+            )
+            written = len(result.all())
+        self.profile_count += written
+        self.profiles_kept += len(self.profiles) - written
+        self.profiles = []
+
+    async def flush_sessions(self):
+        if self.sessions:
+            await self._write(models.ChatSession.__table__, SESSION_FIELDS, self.sessions)
+            self.session_count += len(self.sessions)
+            self.sessions = []
+
+    async def flush_messages(self):
+        if self.messages:
+            await self._write(models.ChatMessage.__table__, MESSAGE_FIELDS, self.messages)
+            self.message_count += len(self.messages)
+            self.messages = []
+
+    async def _write(self, table, fields: tuple[str, ...], rows: list[dict]):
+        async with self.conn.begin():
+            await self._write_rows(table, fields, rows)
+
+    async def _write_rows(self, table, fields: tuple[str, ...], rows: list[dict]):
+        if self.conn.dialect.name == "postgresql":
+            raw = await self.conn.get_raw_connection()
+            # asyncpg ikili COPY'de jsonb değerini metin olarak bekler
+            records = [
+                tuple(json.dumps(row[field]) if field == "attachments" and row[field] is not None else row[field] for field in fields)
+                for row in rows
+            ]
+            await raw.driver_connection.copy_records_to_table(table.name, records=records, columns=list(fields))
+        else:
+            await self.conn.execute(insert(table), rows)
+
+
+async def _reserve_ids(conn: AsyncConnection, table: str, span: int, keep_ids: bool) -> int:
+    """
+    İçe aktarılan id'ler için kayma (offset) döndürür: id'ler mevcut en büyük id'nin üstüne kaydırılır,
+    böylece çakışma olmaz ve eşleme tablosu tutmak gerekmez. Postgres'te sekans aralığın sonuna ilerletilir;
+    içe aktarım sürerken uygulamanın yazdığı satırlar bu aralığa düşmez.
+    """
+    if conn.dialect.name == "postgresql":
+        current = (await conn.execute(text(
+            f"SELECT GREATEST((SELECT coalesce(max(id), 0) FROM {table}), "
+            f"(SELECT last_value FROM {table}_id_seq))"
+        ))).scalar()
+        offset = 0 if keep_ids else current
+        await conn.execute(text(f"SELECT setval('{table}_id_seq', :value)"), {"value": max(current, offset + span, 1)})
+        return offset
+    if keep_ids:
+        return 0
+    return (await conn.execute(text(f"SELECT coalesce(max(id), 0) FROM {table}"))).scalar()
+
+
+async def _hold_sqlite_ranges(conn: AsyncConnection, session_end: int, message_end: int) -> tuple[int, int]:
+    """
+    SQLite'ta sekans yoktur: yeni satır max(id)+1 alır. Partiler arasında uygulamanın yazdığı bir satır,
+    sonra gelecek içe aktarım id'siyle çakışmasın diye aralığın hemen üstüne yer tutucu satırlar eklenir
+    (uygulamanın satırları onların üstüne düşer). İçe aktarım bitince silinirler.
+    """
+    session_id, message_id = session_end + 1, message_end + 1
+    await conn.execute(insert(models.ChatSession.__table__).values(
+        id=session_id, model_used=RESERVATION_MARKER, created_at=datetime(1970, 1, 1, tzinfo=timezone.utc),
+    ))
+    await conn.execute(insert(models.ChatMessage.__table__).values(id=message_id, session_id=None, role=RESERVATION_MARKER))
+    return session_id, message_id
+
+
+async def _release_sqlite_ranges(conn: AsyncConnection, held: tuple[int, int]):
+    session_id, message_id = held
+    await conn.execute(delete(models.ChatMessage.__table__).where(models.ChatMessage.__table__.c.id == message_id))
+    await conn.execute(delete(models.ChatSession.__table__).where(models.ChatSession.__table__.c.id == session_id))
+
+
+async def _max_id(conn: AsyncConnection, table: str) -> int:
+    return (await conn.execute(text(f"SELECT coalesce(max(id), 0) FROM {table}"))).scalar()
+
+
+async def import_ndjson(
+    lines: AsyncIterator[bytes],
+    keep_ids: bool = False,
+    rebuild_indexes: bool = False,
+    batch_size: int = IMPORT_BATCH_ROWS,
+) -> dict:
+    """
+    export_ndjson çıktısını batch_size satırlık partiler halinde, her partiyi ayrı commit ederek içe aktarır;
+    uygulama yükleme sürerken yazmaya devam edebilir. Yarıda kalan yüklemede commit edilmiş partiler kalır:
+    hata, o ana kadar yazılanları ve id kaymalarını loglar (kaymanın üstündeki id'ler bu yüklemeye aittir).
+    Blob'lar içerik adresli olduğu için yarım kalan yüklemede zararsızdır. Hedefte aynı kullanıcının profili
+    varsa korunur. keep_ids=False iken id'ler mevcut verinin üstüne kaydırılır; True ise korunur (boş
+    veritabanına geri yükleme). rebuild_indexes=True ise mesaj index'leri ve arama index'i yükleme öncesi
+    kaldırılıp sonunda (hata olsa da) tek seferde kurulur; büyük yüklemelerde çok daha hızlıdır ama bu sürede
+    index'li sorgular yavaşlar.
+    """
+    started = time.perf_counter()
+    iterator = lines.__aiter__()
+    header = None
+    async for line in iterator:
+        if line.strip():
+            header = loads(line)
+            break
+    if not header or header.get("type") != "export" or header.get("format") not in IMPORT_FORMATS:
+        raise ValueError("Not an export file (missing or unsupported header line)")
+
+    message_indexes = [index for index in models.ChatMessage.__table__.indexes if not index.unique]
+    async with database.engine.connect() as conn:
+        held = None
+        async with conn.begin():
+            session_span, message_span = header.get("max_session_id", 0), header.get("max_message_id", 0)
+            session_offset = await _reserve_ids(conn, "chat_sessions", session_span, keep_ids)
+            message_offset = await _reserve_ids(conn, "chat_messages", message_span, keep_ids)
+            if conn.dialect.name == "sqlite":
+                held = await _hold_sqlite_ranges(
+                    conn,
+                    max(session_offset + session_span, await _max_id(conn, "chat_sessions")),
+                    max(message_offset + message_span, await _max_id(conn, "chat_messages")),
+                )
+
+            if rebuild_indexes:
+                await drop_search_index(conn)
+                for index in message_indexes:
+                    await conn.run_sync(lambda sync_conn, index=index: index.drop(sync_conn, checkfirst=True))
+
+        importer = _Importer(conn, session_offset, message_offset, batch_size)
+        try:
+            async for line in iterator:
+                if line.strip():
+                    await importer.add(loads(line))
+            await importer.flush_profiles()
+            await importer.flush_sessions()
+            await importer.flush_messages()
+        except Exception:
+            if conn.in_transaction():
+                await conn.rollback()
+            logger.error(
+                "❌ İçe aktarma yarıda kaldı: %d oturum, %d mesaj commit edildi (oturum id kayması %d, mesaj id kayması %d).",
+                importer.session_count, importer.message_count, session_offset, message_offset,
+            )
+            raise
+        finally:
+            async with conn.begin():
+                if held is not None:
+                    await _release_sqlite_ranges(conn, held)
+                if rebuild_indexes:
+                    index_started = time.perf_counter()
+                    for index in message_indexes:
+                        await conn.run_sync(lambda sync_conn, index=index: index.create(sync_conn, checkfirst=True))
+                    await rebuild_search_index(conn)
+                    logger.info("🛠️ Index'ler %.1f sn'de yeniden kuruldu.", time.perf_counter() - index_started)
+
+        if conn.dialect.name == "postgresql":
+            async with conn.begin():
+                await conn.execute(text("ANALYZE chat_sessions"))
+                await conn.execute(text("ANALYZE chat_messages"))
+
+    result = {
+        "profiles": importer.profile_count,
+        "profiles_kept": importer.profiles_kept,
+        "sessions": importer.session_count,
+        "messages": importer.message_count,
+        "blobs": importer.blob_count,
+        "session_id_offset": session_offset,
+        "message_id_offset": message_offset,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+    logger.info("📥 İçe aktarma tamamlandı: %s", result)
+    return result
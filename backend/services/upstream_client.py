@@ -0,0 +1,86 @@
+# backend/services/upstream_client.py
+
+import httpx
+from config import (
+    OPENROUTER_API_URL, UPSTREAM_HTTP2, UPSTREAM_MAX_CONNECTIONS,
+    UPSTREAM_MAX_KEEPALIVE_CONNECTIONS, UPSTREAM_KEEPALIVE_EXPIRY,
+    UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_DEFAULT_TIMEOUT, MODEL_TIMEOUTS
+)
+
+
+class UpstreamClient:
+    """
+    OpenRouter'a giden tüm istekler için uygulama ömrü boyunca yaşayan tek bir HTTP/2 istemcisi.
+    FastAPI lifespan içinde açılır ve kapatılır; böylece her mesajda yeni TCP/TLS el sıkışması yapılmaz.
+    """
+
+    def __init__(self):
+        self._client: httpx.AsyncClient | None = None
+        self.requests_total = 0
+        self.connections_opened = 0
+
+    async def start(self):
+        if self._client is not None:
+            return
+        limits = httpx.Limits(
+            max_connections=UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+        )
+        self._client = httpx.AsyncClient(
+            http2=UPSTREAM_HTTP2,
+            limits=limits,
+            timeout=httpx.Timeout(UPSTREAM_DEFAULT_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT),
+        )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            raise RuntimeError("UpstreamClient başlatılmadı (lifespan içinde start() çağrılmalı).")
+        return self._client
+
+    def timeout_for(self, model: str) -> httpx.Timeout:
+        """Modele özel okuma zaman aşımını döndürür."""
+        return httpx.Timeout(MODEL_TIMEOUTS.get(model, UPSTREAM_DEFAULT_TIMEOUT), connect=UPSTREAM_CONNECT_TIMEOUT)
+
+    async def _trace(self, event_name: str, info: dict):
+        # httpcore yalnızca havuzda uygun bağlantı yoksa TCP bağlantısı açar;
+        # bu olayı saymak bağlantı yeniden kullanımını ölçmemizi sağlar.
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+    def stream(self, payload: dict, headers: dict):
+        """Chat akışı için OpenRouter'a streaming POST isteği açar (async context manager)."""
+        self.requests_total += 1
+        return self.client.stream(
+            "POST", OPENROUTER_API_URL, headers=headers, json=payload,
+            timeout=self.timeout_for(payload.get("model", "")),
+            extensions={"trace": self._trace},
+        )
+
+    async def post(self, payload: dict, headers: dict) -> httpx.Response:
+        """Streaming olmayan tek seferlik OpenRouter isteği (örn. hafıza özetleyici)."""
+        self.requests_total += 1
+        return await self.client.post(
+            OPENROUTER_API_URL, headers=headers, json=payload,
+            timeout=self.timeout_for(payload.get("model", "")),
+            extensions={"trace": self._trace},
+        )
+
+    def stats(self) -> dict:
+        reused = max(self.requests_total - self.connections_opened, 0)
+        return {
+            "http2": UPSTREAM_HTTP2,
+            "requests_total": self.requests_total,
+            "connections_opened": self.connections_opened,
+            "connections_reused": reused,
+            "reuse_ratio": round(reused / self.requests_total, 4) if self.requests_total else 0.0,
+        }
+
+
+upstream = UpstreamClient()
@@ -0,0 +1,90 @@
+# backend/services/ws_writer.py
+
+import asyncio
+from fastapi import WebSocket
+from config import WS_COALESCE_WINDOW_MS, WS_COALESCE_MAX_BYTES
+from services.fast_json import dumps
+from services.metrics import WS_SEND_SECONDS
+
+
+class CoalescingWriter:
+    """
+    WebSocket'e giden akış olaylarını birleştirerek yazar. Art arda gelen aynı tipteki
+    metin parçaları (chat_message / reasoning) tek bir çerçevede toplanır ve zaman penceresi
+    dolduğunda ya da byte eşiği aşıldığında gönderilir. Diğer olaylar (image, stream_end, error...)
+    önce bekleyen metni boşaltır, sonra gönderilir; böylece olay sırası korunur.
+    Olaylar sıra numarası (seq) taşıyorsa birleşik çerçeve içindeki son olayın numarasını taşır.
+    """
+
+    MERGEABLE_TYPES = {"chat_message", "reasoning"}
+
+    def __init__(self, websocket: WebSocket, window_ms: float = WS_COALESCE_WINDOW_MS, max_bytes: int = WS_COALESCE_MAX_BYTES):
+        self.websocket = websocket
+        self.window = window_ms / 1000
+        self.max_bytes = max_bytes
+        self._pending_type: str | None = None
+        self._pending_parts: list[str] = []
+        self._pending_bytes = 0
+        self._pending_seq: int | None = None
+        self._timer: asyncio.TimerHandle | None = None
+        self._timer_task: asyncio.Task | None = None
+        self._send_lock = asyncio.Lock()
+        self._error: BaseException | None = None
+        self.events_in = 0
+        self.frames_out = 0
+
+    async def send(self, event: dict):
+        if self._error is not None:
+            raise self._error
+        self.events_in += 1
+        event_type = event.get("type")
+        if self.window > 0 and event_type in self.MERGEABLE_TYPES:
+            if self._pending_type is not None and self._pending_type != event_type:
+                await self.flush()
+            content = event["content"]
+            self._pending_type = event_type
+            self._pending_parts.append(content)
+            self._pending_seq = event.get("seq")
+            self._pending_bytes += len(content.encode("utf-8"))
+            if self._pending_bytes >= self.max_bytes:
+                await self.flush()
+            elif self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(self.window, self._on_timer)
+            return
+        await self.flush()
+        await self._send(event)
+
+    async def flush(self):
+        """Bekleyen birleşik metin olayını hemen gönderir."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending_parts:
+            return
+        # Tampon await'ten önce alınır; kilit FIFO olduğu için çerçeve sırası korunur
+        event = {"type": self._pending_type, "content": "".join(self._pending_parts)}
+        if self._pending_seq is not None:
+            event["seq"] = self._pending_seq
+        self._pending_type, self._pending_parts, self._pending_bytes, self._pending_seq = None, [], 0, None
+        await self._send(event)
+
+    def _on_timer(self):
+        self._timer = None
+        self._timer_task = asyncio.create_task(self.flush())
+        self._timer_task.add_done_callback(self._on_timer_done)
+
+    def _on_timer_done(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            self._error = task.exception()
+
+    async def _send(self, event: dict):
+        with WS_SEND_SECONDS.time():
+            async with self._send_lock:
+                await self.websocket.send_text(dumps(event))
+                self.frames_out += 1
+
+    def close(self):
+        """Bağlantı kapanırken zamanlayıcıyı iptal eder (bekleyen metin atılır)."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
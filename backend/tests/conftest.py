@@ -0,0 +1,4 @@
+import os
+
+# Modüller import edilirken engine oluşturulur; testler Postgres'e ihtiyaç duymadan çalışsın
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
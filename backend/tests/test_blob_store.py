@@ -0,0 +1,55 @@
+import asyncio
+import base64
+import os
+import pytest
+from services.blob_store import BlobRejected, LocalBlobStore, sniff_image_type
+from services import blob_store as blob_store_module
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 64
+LARGE_PNG = PNG * 256  # ~4 MB: eşzamanlı yazımlar zaman içinde örtüşsün
+
+
+def test_concurrent_puts_of_the_same_blob(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+
+    async def scenario():
+        hashes = await asyncio.gather(*(store.put(LARGE_PNG, "image/png") for _ in range(32)))
+        assert len(set(hashes)) == 1
+        info = await store.stat(hashes[0])
+        data = b"".join([chunk async for chunk in store.iter_chunks(hashes[0])])
+        return info, data
+
+    info, data = asyncio.run(scenario())
+    assert (info.content_type, info.size) == ("image/png", len(LARGE_PNG))
+    assert data == LARGE_PNG
+    leftovers = [name for _, _, files in os.walk(tmp_path) for name in files if name.endswith(".tmp")]
+    assert leftovers == []
+
+
+def test_type_sidecar_without_blob_is_not_served_and_is_repaired(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    blob_hash = asyncio.run(store.put(PNG, "image/png"))
+    os.remove(store._path(blob_hash))  # tür dosyası yazıldıktan sonra çökmüş gibi
+    assert asyncio.run(store.stat(blob_hash)) is None
+    assert asyncio.run(store.put(PNG, "image/png")) == blob_hash
+    assert asyncio.run(store.stat(blob_hash)).size == len(PNG)
+
+
+def test_sniff_image_type():
+    assert sniff_image_type(PNG) == "image/png"
+    assert sniff_image_type(b"\xff\xd8\xff\xe0rest") == "image/jpeg"
+    assert sniff_image_type(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "image/webp"
+    assert sniff_image_type(b"<svg xmlns='http://www.w3.org/2000/svg'/>") is None
+
+
+def test_externalize_rejects_non_raster_data_urls(tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_store_module, "blob_store", LocalBlobStore(str(tmp_path)))
+    svg = base64.b64encode(b"<svg onload='alert(1)'/>").decode()
+    with pytest.raises(BlobRejected):
+        asyncio.run(blob_store_module.externalize_image(f"data:image/svg+xml;base64,{svg}"))
+    with pytest.raises(BlobRejected):
+        asyncio.run(blob_store_module.externalize_image("data:image/png,notbase64"))
+    png = base64.b64encode(PNG).decode()
+    url = asyncio.run(blob_store_module.externalize_image(f"data:image/png;base64,{png}"))
+    assert url.startswith("/api/blobs/")
+    assert asyncio.run(blob_store_module.externalize_image("https://example.com/a.png")) == "https://example.com/a.png"
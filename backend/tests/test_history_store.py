@@ -0,0 +1,79 @@
+import asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+import models
+from database import Base
+from services.history_store import HistoryCache
+from services.message_format import encode_message
+
+
+def run_with_session(tmp_path, scenario):
+    async def main():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'history.db'}")
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            async with AsyncSession(engine, expire_on_commit=False) as db:
+                chat_session = models.ChatSession(model_used="test/model")
+                db.add(chat_session)
+                await db.commit()
+                return await scenario(db, chat_session.id)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+async def add_message(db, session_id: int, role: str, text: str = "", images: list[str] | None = None) -> int:
+    message = models.ChatMessage(session_id=session_id, role=role, **encode_message(text, images=images))
+    db.add(message)
+    await db.commit()
+    return message.id
+
+
+def test_image_only_tail_keeps_the_cache(tmp_path):
+    async def scenario(db, session_id):
+        cache = HistoryCache()
+        await add_message(db, session_id, "user", "hello")
+        await add_message(db, session_id, "assistant", "hi")
+        await add_message(db, session_id, "user", images=["/api/blobs/ab"])
+        await add_message(db, session_id, "assistant", images=["/api/blobs/cd"])
+        messages = await cache.load(session_id, db)
+        assert [message["content"] for message in messages] == ["hello", "hi"]
+
+        await cache.revalidate(session_id, db)
+        assert cache.get(session_id) is messages
+
+    run_with_session(tmp_path, scenario)
+
+
+def test_text_written_elsewhere_drops_the_cache(tmp_path):
+    async def scenario(db, session_id):
+        cache = HistoryCache()
+        await add_message(db, session_id, "user", "hello")
+        await cache.load(session_id, db)
+        # Başka bir worker'ın yazdığı mesaj
+        await add_message(db, session_id, "assistant", "from another worker")
+
+        await cache.revalidate(session_id, db)
+        assert cache.get(session_id) is None
+        messages = await cache.load(session_id, db)
+        assert [message["content"] for message in messages] == ["hello", "from another worker"]
+
+    run_with_session(tmp_path, scenario)
+
+
+def test_folded_prefix_drops_the_cache(tmp_path):
+    async def scenario(db, session_id):
+        cache = HistoryCache()
+        first_id = await add_message(db, session_id, "user", "hello")
+        await add_message(db, session_id, "assistant", "hi")
+        await cache.load(session_id, db)
+
+        await cache.revalidate(session_id, db, after_id=first_id)
+        assert cache.get(session_id) is None
+        messages = await cache.load(session_id, db, after_id=first_id)
+        assert [message["content"] for message in messages] == ["hi"]
+        await cache.revalidate(session_id, db, after_id=first_id)
+        assert cache.get(session_id) is messages
+
+    run_with_session(tmp_path, scenario)
@@ -0,0 +1,136 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+import models
+from database import Base
+from services import memory_service
+from services.memory_service import merge_profiles
+from services.message_format import encode_message
+
+BASE = {"name": "Ada", "city": "İzmir", "job": "engineer"}
+
+
+def test_unchanged_by_us_takes_their_values():
+    theirs = {**BASE, "city": "Ankara", "hobby": "chess"}
+    assert merge_profiles(BASE, dict(BASE), theirs) == theirs
+
+
+def test_changed_only_by_us_keeps_our_values():
+    ours = {**BASE, "job": "teacher", "pet": "cat"}
+    assert merge_profiles(BASE, ours, dict(BASE)) == ours
+
+
+def test_disjoint_changes_are_combined():
+    ours = {**BASE, "job": "teacher"}
+    theirs = {**BASE, "city": "Ankara"}
+    assert merge_profiles(BASE, ours, theirs) == {"name": "Ada", "city": "Ankara", "job": "teacher"}
+
+
+def test_both_changed_same_key_ours_wins():
+    ours = {**BASE, "city": "Bursa"}
+    theirs = {**BASE, "city": "Ankara"}
+    assert merge_profiles(BASE, ours, theirs)["city"] == "Bursa"
+
+
+def test_deletions_from_either_side_are_kept():
+    ours = {key: value for key, value in BASE.items() if key != "job"}
+    theirs = {key: value for key, value in BASE.items() if key != "city"}
+    assert merge_profiles(BASE, ours, theirs) == {"name": "Ada"}
+
+
+def test_we_delete_a_key_they_changed():
+    ours = {key: value for key, value in BASE.items() if key != "city"}
+    theirs = {**BASE, "city": "Ankara"}
+    assert "city" not in merge_profiles(BASE, ours, theirs)
+
+
+def test_keys_added_on_both_sides():
+    ours = {**BASE, "pet": "cat"}
+    theirs = {**BASE, "pet": "dog", "hobby": "chess"}
+    assert merge_profiles(BASE, ours, theirs) == {**BASE, "pet": "cat", "hobby": "chess"}
+
+
+def test_empty_base():
+    assert merge_profiles({}, {"a": 1}, {"b": 2}) == {"a": 1, "b": 2}
+
+
+class FakeResponse:
+    def __init__(self, content: str):
+        self._content = content
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"choices": [{"message": {"content": self._content}}]}
+
+
+def test_watermark_is_the_highest_summarized_id(tmp_path, monkeypatch):
+    prompts = []
+
+    async def fake_post(payload, headers, session_key):
+        prompts.append(payload["messages"][0]["content"])
+        return FakeResponse('{"name": "Ada"}')
+
+    monkeypatch.setattr(memory_service, "scheduled_post", fake_post)
+
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'memory.db'}")
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            async with AsyncSession(engine, expire_on_commit=False) as db:
+                chat_session = models.ChatSession(model_used="test/model")
+                db.add(chat_session)
+                await db.flush()
+                # Toplu yazmada id sırası created_at sırasıyla aynı olmayabilir: en büyük id en eski zamanlı
+                now = datetime.now(timezone.utc)
+                for index in range(4):
+                    db.add(models.ChatMessage(
+                        session_id=chat_session.id, role="user" if index % 2 == 0 else "assistant",
+                        created_at=now - timedelta(seconds=index), **encode_message(f"message {index}"),
+                    ))
+                await db.commit()
+                await memory_service.generate_and_update_profile_summary(chat_session.id, db)
+                await db.refresh(chat_session)
+                return chat_session.memory_summarized_upto_id
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(scenario()) == 4
+    assert prompts[0].index("message 0") < prompts[0].index("message 3")
+
+
+def test_first_client_adopts_the_legacy_profile(tmp_path):
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'adopt.db'}")
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            async with AsyncSession(engine, expire_on_commit=False) as db:
+                db.add(models.UserProfile(user_id="default", auto_summary_json='{"name": "Ada"}', version=3))
+                db.add_all([models.ChatSession(model_used="m", user_id=None), models.ChatSession(model_used="m", user_id="default")])
+                db.add(models.UserProfile(user_id="client-b", auto_summary_json="{}", version=0))
+                await db.commit()
+
+                # Kendi profili olan istemci devralmaz; ilk profilsiz istemci devralır, sonraki alamaz
+                assert await memory_service.adopt_legacy_profile(db, "client-b") is False
+                assert await memory_service.adopt_legacy_profile(db, "client-a") is True
+                await db.commit()
+                assert await memory_service.adopt_legacy_profile(db, "client-c") is False
+
+                profile = await memory_service.load_profile(db, "client-a")
+                owners = (await db.execute(select(models.ChatSession.user_id))).scalars().all()
+                return profile, owners
+        finally:
+            await engine.dispose()
+
+    profile, owners = asyncio.run(scenario())
+    assert (profile.auto_summary_json, profile.version) == ('{"name": "Ada"}', 3)
+    assert owners == ["client-a", "client-a"]
+
+
+def test_adoption_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(memory_service, "ADOPT_LEGACY_PROFILE", False)
+    assert asyncio.run(memory_service.adopt_legacy_profile(None, "client-a")) is False
@@ -0,0 +1,41 @@
+import asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+import models
+from database import Base
+from services.search import _setup_sqlite, search_messages
+
+
+def run_search(tmp_path, texts: list[str], query: str) -> list[dict]:
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'search.db'}")
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+                await conn.run_sync(_setup_sqlite)
+            async with AsyncSession(engine) as db:
+                chat_session = models.ChatSession(model_used="test/model")
+                db.add(chat_session)
+                await db.flush()
+                db.add_all(models.ChatMessage(session_id=chat_session.id, role="user", text=text) for text in texts)
+                await db.commit()
+                hits, _ = await search_messages(db, query, limit=10)
+                return hits
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(scenario())
+
+
+def test_sqlite_scores_keep_relevance_order(tmp_path):
+    texts = [
+        "kahve " * 5 + "demlemek için su sıcaklığı",
+        "kahve ve çay",
+        "bugün hava güzel, kahve içtim, sonra uzun bir yürüyüş yaptım ve akşam kitap okudum",
+        "çay",
+    ]
+    hits = run_search(tmp_path, texts, "kahve")
+    assert [hit["message_id"] for hit in hits] == [1, 2, 3]
+    scores = [hit["score"] for hit in hits]
+    # SQLite bm25 puanları çok küçüktür (~1e-6); yuvarlanırsa sıralama bilgisi kaybolur
+    assert all(score > 0 for score in scores)
+    assert scores[0] > scores[1] > scores[2]
@@ -0,0 +1,109 @@
+import asyncio
+import random
+from pathlib import Path
+import pytest
+from services.sse import SSEDecoder, aiter_sse_data, DONE
+
+RECORDED_STREAM = Path(__file__).resolve().parent.parent / "bench" / "data" / "openrouter_stream.sse"
+
+
+def decode(chunks: list[bytes]) -> list[bytes]:
+    decoder = SSEDecoder()
+    events = []
+    for chunk in chunks:
+        events.extend(decoder.feed(chunk))
+    events.extend(decoder.close())
+    return events
+
+
+def random_split(data: bytes, rng: random.Random, max_size: int = 64) -> list[bytes]:
+    chunks, position = [], 0
+    while position < len(data):
+        size = rng.randint(1, max_size)
+        chunks.append(data[position:position + size])
+        position += size
+    return chunks
+
+
+def test_single_events():
+    assert decode([b"data: one\n\ndata: two\n\n"]) == [b"one", b"two"]
+
+
+def test_data_without_space_after_colon():
+    assert decode([b"data:one\n\ndata:  two\n\n"]) == [b"one", b" two"]
+
+
+def test_crlf_line_endings():
+    assert decode([b"data: one\r\n\r\ndata: two\r\n\r\n"]) == [b"one", b"two"]
+
+
+def test_crlf_split_between_cr_and_lf():
+    assert decode([b"data: one\r", b"\n\r", b"\n"]) == [b"one"]
+
+
+def test_multiline_data_is_joined_with_newline():
+    assert decode([b"data: first\ndata: second\ndata:\n\n"]) == [b"first\nsecond\n"]
+
+
+def test_comments_and_other_fields_are_ignored():
+    stream = b": OPENROUTER PROCESSING\n\nevent: message\nid: 7\nretry: 100\ndata: one\n: keep-alive\n\n"
+    assert decode([stream]) == [b"one"]
+
+
+def test_blank_lines_without_data_emit_nothing():
+    assert decode([b"\n\n\r\n: comment\n\n"]) == []
+
+
+def test_tail_without_final_blank_line():
+    assert decode([b"data: one\n\ndata: two"]) == [b"one", b"two"]
+    assert decode([b"data: one\n\ndata: two\n"]) == [b"one", b"two"]
+    assert decode([b"data: a\ndata: b"]) == [b"a\nb"]
+
+
+def test_feed_returns_only_completed_events():
+    decoder = SSEDecoder()
+    assert decoder.feed(b"data: par") == []
+    assert decoder.feed(b"tial\n") == []
+    assert decoder.feed(b"\n") == [b"partial"]
+    assert decoder.close() == []
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_chunk_splits_match_whole_stream(seed):
+    rng = random.Random(seed)
+    stream = b"".join([
+        b": OPENROUTER PROCESSING\r\n\r\n",
+        b"data: {\"a\": 1}\n\n",
+        b"data: line one\r\ndata: line two\r\n\r\n",
+        b"data: " + b"x" * 500 + b"\n\n",
+        b"data: \xc3\xa7\xc4\x9f\xc3\xbc\n\n",
+        b"data: [DONE]",
+    ])
+    expected = [b"{\"a\": 1}", b"line one\nline two", b"x" * 500, "çğü".encode(), DONE]
+    assert decode([stream]) == expected
+    assert decode(random_split(stream, rng)) == expected
+    assert decode([bytes([byte]) for byte in stream]) == expected
+
+
+def test_recorded_openrouter_stream():
+    data = RECORDED_STREAM.read_bytes()
+    expected_count = sum(1 for line in data.splitlines() if line.startswith(b"data:"))
+    events = decode([data])
+    assert len(events) == expected_count
+    assert events[-1] == DONE
+    assert all(event.startswith(b"{") for event in events[:-1])
+
+    rng = random.Random(0)
+    for max_size in (1, 7, 256, 4096):
+        assert decode(random_split(data, rng, max_size)) == events
+
+
+def test_aiter_sse_data():
+    async def chunks():
+        for chunk in (b"data: on", b"e\n\nda", b"ta: two\n\ndata: three"):
+            yield chunk
+
+    async def collect():
+        return [data async for data in aiter_sse_data(chunks())]
+
+    assert asyncio.run(collect()) == [b"one", b"two", b"three"]
@@ -0,0 +1,78 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+import models
+from database import Base
+from services import summary_queue
+
+
+def run_with_database(tmp_path, monkeypatch, scenario):
+    async def main():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'queue.db'}")
+        sessionmaker = async_sessionmaker(bind=engine, expire_on_commit=False, autoflush=False)
+        monkeypatch.setattr(summary_queue, "AsyncSessionLocal", sessionmaker)
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            async with sessionmaker() as db:
+                # Kullanıcı çoktan pasif: iş ertelenmeden çalışır
+                chat_session = models.ChatSession(model_used="test/model", last_active_at=datetime.now(timezone.utc) - timedelta(hours=1))
+                db.add(chat_session)
+                await db.commit()
+            return await scenario(sessionmaker, chat_session.id)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+async def job_state(sessionmaker, session_id: int) -> tuple[str, int, bool]:
+    async with sessionmaker() as db:
+        job = (await db.execute(select(models.SummaryJob).where(models.SummaryJob.session_id == session_id))).scalar_one()
+        return job.status, job.attempts, job.rerun_requested
+
+
+def test_enqueue_while_running_requests_a_rerun(tmp_path, monkeypatch):
+    summarized = []
+
+    async def fake_summary(session_id, db):
+        summarized.append(session_id)
+
+    monkeypatch.setattr(summary_queue, "generate_and_update_profile_summary", fake_summary)
+
+    async def scenario(sessionmaker, session_id):
+        await summary_queue.enqueue_summary(session_id, delay_seconds=0)
+        async with sessionmaker() as db:
+            job = await summary_queue._claim_job(db)
+            assert job is not None
+            assert await job_state(sessionmaker, session_id) == ("running", 1, False)
+
+            # Çalışan iş pending'e çevrilmez; ikinci bir worker onu alamaz
+            await summary_queue.enqueue_summary(session_id, delay_seconds=0)
+            assert await job_state(sessionmaker, session_id) == ("running", 1, True)
+            async with sessionmaker() as other_db:
+                assert await summary_queue._claim_job(other_db) is None
+
+            await summary_queue._run_job(db, job)
+        assert await job_state(sessionmaker, session_id) == ("pending", 0, False)
+
+        async with sessionmaker() as db:
+            job = await summary_queue._claim_job(db)
+            assert job is not None
+            await summary_queue._run_job(db, job)
+        assert await job_state(sessionmaker, session_id) == ("done", 1, False)
+
+    run_with_database(tmp_path, monkeypatch, scenario)
+    assert len(summarized) == 2
+
+
+def test_enqueue_pending_job_is_debounced(tmp_path, monkeypatch):
+    async def scenario(sessionmaker, session_id):
+        await summary_queue.enqueue_summary(session_id, delay_seconds=0)
+        await summary_queue.enqueue_summary(session_id, delay_seconds=3600)
+        assert await job_state(sessionmaker, session_id) == ("pending", 0, False)
+        async with sessionmaker() as db:
+            assert await summary_queue._claim_job(db) is None
+
+    run_with_database(tmp_path, monkeypatch, scenario)
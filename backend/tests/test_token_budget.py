@@ -0,0 +1,65 @@
+import pytest
+from services import token_budget
+from services.token_budget import ContextBudgetExceeded, fit_history, message_tokens, MESSAGE_OVERHEAD_TOKENS
+
+MODEL = "test/model"
+# 40 ASCII karakter ~10 token + mesaj başına sabit pay
+MESSAGE_TOKENS = 10 + MESSAGE_OVERHEAD_TOKENS
+
+
+@pytest.fixture(autouse=True)
+def small_budget(monkeypatch):
+    monkeypatch.setattr(token_budget, "MAX_PROMPT_TOKENS", 100)
+
+
+def conversation(count: int) -> list[dict]:
+    return [{"role": "user" if index % 2 == 0 else "assistant", "content": f"{index:02d}" + "x" * 38} for index in range(count)]
+
+
+def test_history_that_fits_is_returned_whole():
+    history = conversation(6)
+    assert fit_history(MODEL, [], history) == history
+
+
+def test_oldest_messages_are_dropped_first():
+    history = conversation(10)
+    # 7 mesaj (98 token) sığar; kırpılan geçmiş assistant ile başlamasın diye bir tane daha düşer
+    fitted = fit_history(MODEL, [], history)
+    assert fitted == history[4:]
+    assert fitted[0]["role"] == "user"
+
+
+def test_trim_keeps_history_starting_with_user():
+    history = conversation(9)
+    # Son 7 mesaj index 2'den başlar (user) ve olduğu gibi kalır
+    assert fit_history(MODEL, [], history) == history[2:]
+
+
+def test_fixed_messages_reduce_the_budget():
+    history = conversation(10)
+    fixed = [{"role": "system", "content": "y" * 120}]  # 30 + 4 token
+    fitted = fit_history(MODEL, fixed, history)
+    assert fitted == history[6:]
+
+
+def test_last_message_over_budget_raises():
+    history = conversation(2) + [{"role": "user", "content": "z" * 1000}]
+    with pytest.raises(ContextBudgetExceeded):
+        fit_history(MODEL, [], history)
+
+
+def test_empty_history():
+    assert fit_history(MODEL, [], []) == []
+
+
+def test_message_tokens_are_cached_on_the_message():
+    message = {"role": "user", "content": "x" * 40}
+    assert message_tokens(message) == MESSAGE_TOKENS
+    assert message["tokens"] == MESSAGE_TOKENS
+    message["content"] = "x" * 4000
+    assert message_tokens(message) == MESSAGE_TOKENS
+
+
+def test_list_content_counts_text_parts():
+    message = {"role": "user", "content": [{"type": "text", "text": "x" * 40}, {"type": "image_url", "image_url": {"url": "/api/blobs/ab"}}]}
+    assert message_tokens(message) == MESSAGE_TOKENS
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import pytest
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+import database
+import models
+from database import Base
+from services import transfer
+from services.transfer import export_ndjson, import_ndjson, RESERVATION_MARKER
+
+
+async def _engine(path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine
+
+
+async def _seed_source(engine):
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        db.add_all([
+            models.UserProfile(user_id="alice", auto_summary_json='{"name": "Alice"}', version=3),
+            models.UserProfile(user_id="default", auto_summary_json='{"name": "Ada"}', version=1),
+            models.UserProfile(user_id="unrelated", auto_summary_json="{}", version=0),
+        ])
+        sessions = [models.ChatSession(user_id="alice"), models.ChatSession(user_id="alice"), models.ChatSession(user_id=None)]
+        db.add_all(sessions)
+        await db.flush()
+        for session in sessions:
+            for index in range(3):
+                db.add(models.ChatMessage(session_id=session.id, role="user", text=f"message {session.id}.{index}", format_version=1))
+        await db.commit()
+
+
+async def _export(engine) -> list[bytes]:
+    async with AsyncSession(engine) as db:
+        body = b"".join([chunk async for chunk in export_ndjson(db)])
+    return body.split(b"\n")
+
+
+async def _lines(lines):
+    for line in lines:
+        yield line
+
+
+def test_round_trip_carries_profiles_and_commits_in_batches(tmp_path, monkeypatch):
+    async def scenario():
+        source = await _engine(tmp_path / "source.db")
+        target = await _engine(tmp_path / "target.db")
+        await _seed_source(source)
+        async with AsyncSession(target) as db:
+            db.add(models.UserProfile(user_id="alice", auto_summary_json='{"name": "Existing"}', version=7))
+            db.add(models.ChatSession(user_id="alice"))
+            await db.commit()
+
+        lines = await _export(source)
+        records = [json.loads(line) for line in lines if line]
+        assert [record["user_id"] for record in records if record["type"] == "profile"] == ["alice", "default"]
+
+        commits = 0
+        monkeypatch.setattr(database, "engine", target)
+        original = transfer._Importer._write
+
+        async def counting_write(self, table, fields, rows):
+            nonlocal commits
+            commits += 1
+            await original(self, table, fields, rows)
+
+        monkeypatch.setattr(transfer._Importer, "_write", counting_write)
+        result = await import_ndjson(_lines(lines), batch_size=2)
+
+        async with AsyncSession(target) as db:
+            profiles = dict((await db.execute(select(models.UserProfile.user_id, models.UserProfile.version))).all())
+            session_count = (await db.execute(select(func.count()).select_from(models.ChatSession))).scalar()
+            message_ids = (await db.execute(select(models.ChatMessage.id).order_by(models.ChatMessage.id))).scalars().all()
+            markers = (await db.execute(
+                select(func.count()).select_from(models.ChatMessage).where(models.ChatMessage.role == RESERVATION_MARKER)
+            )).scalar()
+        await source.dispose()
+        await target.dispose()
+        return result, commits, profiles, session_count, message_ids, markers
+
+    result, commits, profiles, session_count, message_ids, markers = asyncio.run(scenario())
+    assert result["profiles"] == 1 and result["profiles_kept"] == 1
+    assert result["sessions"] == 3 and result["messages"] == 9
+    # Mevcut profil korunur, eksik olan eklenir; dökümdeki oturumlara ait olmayan profil gelmez
+    assert profiles == {"alice": 7, "default": 1}
+    assert session_count == 4
+    assert message_ids == list(range(1, 10))
+    assert markers == 0
+    # 2'şerlik partiler: oturumlar 2 + 1, mesajlar 4 x 2 + 1
+    assert commits == 7
+
+
+def test_failed_import_keeps_committed_batches_and_releases_reservation(tmp_path, monkeypatch):
+    async def scenario():
+        source = await _engine(tmp_path / "source.db")
+        target = await _engine(tmp_path / "target.db")
+        await _seed_source(source)
+        lines = await _export(source)
+        monkeypatch.setattr(database, "engine", target)
+
+        with pytest.raises(ValueError):
+            await import_ndjson(_lines(lines[:-3] + [b'{"type": "blob", "hash": "x", "data": "%%%"}']), batch_size=2)
+
+        async with AsyncSession(target) as db:
+            sessions = (await db.execute(select(models.ChatSession.model_used))).scalars().all()
+            messages = (await db.execute(select(func.count()).select_from(models.ChatMessage))).scalar()
+        await source.dispose()
+        await target.dispose()
+        return sessions, messages
+
+    sessions, messages = asyncio.run(scenario())
+    assert len(sessions) == 3 and RESERVATION_MARKER not in sessions
+    # Hatadan önce commit edilen partiler kalır, tampondaki son mesaj yazılmaz
+    assert messages == 6
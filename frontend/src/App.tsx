@@ -5,13 +5,18 @@ import axios from 'axios';
 import './App.css';
 import type { ChatSession } from './types'; // <- DEĞİŞİKLİK BURADA
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000/api';
+interface SessionsPage {
+  sessions: ChatSession[];
+  next_cursor: number | null;
+}
 interface ModelsResponse {
   available_models: Record<string, string>;
-  current_model: string;
+  default_model: string;
 }
 
 function App() {
   const [sessions, setSessions] = useState<ChatSession[]>([]);
+  const [nextSessionsCursor, setNextSessionsCursor] = useState<number | null>(null);
   const [activeSessionId, setActiveSessionId] = useState<number | null>(null);
   const [models, setModels] = useState<Record<string, string>>({});
   const [currentModel, setCurrentModel] = useState<string>('');
@@ -23,28 +28,36 @@ function App() {
     axios.get<ModelsResponse>(`${API_URL}/models`)
       .then(response => {
         setModels(response.data.available_models);
-        setCurrentModel(response.data.current_model);
+        setCurrentModel(response.data.default_model);
       })
       .catch(error => console.error("Error fetching models:", error))
       .finally(() => setIsLoadingModels(false));
   }, []);
 
   useEffect(() => {
-    axios.get(`${API_URL}/sessions`)
+    axios.get<SessionsPage>(`${API_URL}/sessions`)
       .then(response => {
-        setSessions(response.data);
+        setSessions(response.data.sessions);
+        setNextSessionsCursor(response.data.next_cursor);
       })
       .catch(error => console.error("Error fetching sessions:", error));
   }, []);
 
-  // Model seç
-  const handleModelChange = (modelId: string) => {
-    axios.post(`${API_URL}/models/select/${modelId}`)
+  // Kenar çubuğunda daha eski oturumları yükle (keyset sayfalama)
+  const handleLoadMoreSessions = () => {
+    if (nextSessionsCursor === null) return;
+    axios.get<SessionsPage>(`${API_URL}/sessions`, { params: { before_id: nextSessionsCursor } })
       .then(response => {
-        setCurrentModel(response.data.current_model);
-        console.log(`Model changed to: ${response.data.model_name}`);
+        setSessions(prevSessions => [...prevSessions, ...response.data.sessions]);
+        setNextSessionsCursor(response.data.next_cursor);
       })
-      .catch(error => console.error("Error changing model:", error));
+      .catch(error => console.error("Error fetching sessions:", error));
+  };
+
+  // Model seç: seçim istemcide tutulur ve sohbetin bir sonraki mesajıyla sunucuya gönderilir
+  const handleModelChange = (modelId: string) => {
+    setCurrentModel(modelId);
+    console.log(`Model changed to: ${models[modelId] ?? modelId}`);
   };
 
   const handleNewChat = () => {
@@ -81,10 +94,14 @@ function App() {
           onNewChat={handleNewChat}
           onSelectSession={setActiveSessionId}
           activeSessionId={activeSessionId}
+          hasMore={nextSessionsCursor !== null}
+          onLoadMore={handleLoadMoreSessions}
         />
         <ChatWindow 
           activeSessionId={activeSessionId}
+          selectedModel={currentModel}
           onSessionCreated={handleSessionCreated}
+          onSessionModelLoaded={setCurrentModel}
         />
       </div>
     </div>
@@ -7,13 +7,30 @@ import type { ChatSession, Message } from '../types';
 
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000/api';
 const WS_BASE_URL = import.meta.env.VITE_WS_URL || 'ws://localhost:8000/ws/chat';
+const CLIENT_ID_KEY = 'ai_chat_client_id';
+
+// Tarayıcıya özgü kalıcı kimlik; backend hafıza profilini yeni oturumlarda buna göre seçer
+const getClientId = () => {
+  let clientId = localStorage.getItem(CLIENT_ID_KEY);
+  if (!clientId) {
+    clientId = crypto.randomUUID();
+    localStorage.setItem(CLIENT_ID_KEY, clientId);
+  }
+  return clientId;
+};
+
+// Backend görselleri /api/blobs/{hash} referansı olarak döndürür; API sunucusunun adresine çevir
+const resolveImageUrl = (url: string) =>
+  url.startsWith('/api/') ? `${API_URL.replace(/\/api\/?$/, '')}${url}` : url;
 
 interface ChatWindowProps {
   activeSessionId: number | null;
+  selectedModel: string;
   onSessionCreated: (newSession: ChatSession) => void;
+  onSessionModelLoaded: (modelId: string) => void;
 }
 
-const ChatWindow: React.FC<ChatWindowProps> = ({ activeSessionId, onSessionCreated }) => {
+const ChatWindow: React.FC<ChatWindowProps> = ({ activeSessionId, selectedModel, onSessionCreated, onSessionModelLoaded }) => {
   const [messages, setMessages] = useState<Message[]>([]);
   const [input, setInput] = useState('');
   const [isLoading, setIsLoading] = useState(false);
@@ -21,6 +38,12 @@ const ChatWindow: React.FC<ChatWindowProps> = ({ activeSessionId, onSessionCreat
   const messagesEndRef = useRef<HTMLDivElement | null>(null);
   const [isNewSessionCreating, setIsNewSessionCreating] = useState(false);
   const currentSocketSessionId = useRef<number | null>(null);
+  const [olderMessagesCursor, setOlderMessagesCursor] = useState<number | null>(null);
+  // Upstream yoğunken sunucu isteği kuyruğa alır ve sırayı 'queue' olayıyla bildirir
+  const [queueStatus, setQueueStatus] = useState<{ position: number; waitMs: number } | null>(null);
+  // Süren akışın kimliği ve son alınan olay sırası; bağlantı koparsa buradan devam edilir
+  const streamResumeRef = useRef<{ streamId: string; lastSeq: number } | null>(null);
+  const reconnectTimerRef = useRef<number | null>(null);
   
   // Her mesaj eklendiğinde en alta kaydır
   useEffect(() => {
@@ -34,6 +57,9 @@ const ChatWindow: React.FC<ChatWindowProps> = ({ activeSessionId, onSessionCreat
       axios.get(`${API_URL}/sessions/${activeSessionId}`)
         .then(response => {
           setMessages(response.data.messages || []);
+          setOlderMessagesCursor(response.data.next_cursor ?? null);
+          // Model seçicisini açılan sohbetin modeline getir
+          if (response.data.model_used) onSessionModelLoaded(response.data.model_used);
         })
         .catch(error => {
           console.error("Error fetching messages:", error);
@@ -42,9 +68,144 @@ const ChatWindow: React.FC<ChatWindowProps> = ({ activeSessionId, onSessionCreat
         .finally(() => setIsLoading(false));
     } else if (activeSessionId === null && !isNewSessionCreating) {
       setMessages([]); // Yeni sohbet için ekranı temizle
+      setOlderMessagesCursor(null);
     }
   }, [activeSessionId, isNewSessionCreating]);
 
+  // Sayfalanmış geçmişte daha eski mesajları başa ekle
+  const loadOlderMessages = () => {
+    if (!activeSessionId || olderMessagesCursor === null) return;
+    axios.get(`${API_URL}/sessions/${activeSessionId}`, { params: { before_id: olderMessagesCursor } })
+      .then(response => {
+        setMessages(prev => [...(response.data.messages || []), ...prev]);
+        setOlderMessagesCursor(response.data.next_cursor ?? null);
+      })
+      .catch(error => console.error("Error fetching older messages:", error));
+  };
+
+  // Sunucudan gelen akış olaylarını işler (yeni sohbet ve mevcut sohbet bağlantıları aynı işleyiciyi kullanır)
+  const handleServerEvent = (data: any) => {
+    // Devam ettirilebilir akış: yeniden bağlanınca son görülen olaydan devam etmek için konum saklanır
+    if (data.type === 'stream_start') {
+      streamResumeRef.current = { streamId: data.stream_id, lastSeq: data.seq };
+      return;
+    }
+    // Resync'ten sonra tampondaki hata/bitiş olayları daha küçük seq ile gelebilir; konum geri gitmez
+    if (typeof data.seq === 'number' && streamResumeRef.current) {
+      streamResumeRef.current.lastSeq = Math.max(streamResumeRef.current.lastSeq, data.seq);
+    }
+
+    if (data.type === 'session_created') {
+      // Backend'den yeni session ID'si geldi, App.tsx'i bilgilendir
+      // Ancak mevcut WebSocket bağlantısını KAPATMIYORUZ!
+      // Backend aynı bağlantıyı kullanmaya devam edecek
+      currentSocketSessionId.current = data.session_id;
+      setIsNewSessionCreating(true);
+      onSessionCreated({ id: data.session_id, created_at: new Date().toISOString() });
+      setIsNewSessionCreating(false);
+      console.log(`Session created with ID: ${data.session_id}, keeping WebSocket connection open`);
+    } else if (data.type === 'chat_history') {
+      // Bu session'a ait geçmiş mesajlar ilk bağlantıda gönderilir
+      setMessages(data.messages || []);
+      setIsLoading(false);
+    } else if (data.type === 'chat_message') {
+      setIsLoading(true);
+      setMessages((prev) => {
+        const lastMessage = prev[prev.length - 1];
+        if (lastMessage?.role === 'assistant') {
+          return [...prev.slice(0, -1), { ...lastMessage, content: lastMessage.content + data.content }];
+        }
+        return [...prev, { role: 'assistant', content: data.content }];
+      });
+    } else if (data.type === 'reasoning') {
+      // Reasoning içeriği (GPT-5 gibi reasoning modelleri için)
+      setIsLoading(true);
+      setMessages((prev) => {
+        const lastMessage = prev[prev.length - 1];
+        if (lastMessage?.role === 'assistant') {
+          const existingReasoning = lastMessage.reasoning || '';
+          return [...prev.slice(0, -1), { ...lastMessage, reasoning: existingReasoning + data.content }];
+        }
+        return [...prev, { role: 'assistant', content: '', reasoning: data.content }];
+      });
+    } else if (data.type === 'resync') {
+      // Kaçırılan olaylar sunucu tamponundan düşmüş: cevabın o ana kadarki hali tek seferde gelir
+      setIsLoading(true);
+      setMessages((prev) => {
+        const snapshot: Message = { role: 'assistant', content: data.content, reasoning: data.reasoning || undefined, images: data.images };
+        const lastMessage = prev[prev.length - 1];
+        return lastMessage?.role === 'assistant' ? [...prev.slice(0, -1), snapshot] : [...prev, snapshot];
+      });
+    } else if (data.type === 'image') {
+      // Görsel mesajı ekle
+      setMessages((prev) => {
+        const lastMessage = prev[prev.length - 1];
+        if (lastMessage?.role === 'assistant') {
+          const existingImages = lastMessage.images || [];
+          if (!existingImages.includes(data.image_url)) {
+            return [...prev.slice(0, -1), { ...lastMessage, images: [...existingImages, data.image_url] }];
+          }
+          return prev;
+        }
+        return [...prev, { role: 'assistant', content: '', images: [data.image_url] }];
+      });
+    } else if (data.type === 'queue') {
+      setQueueStatus(data.position > 0 ? { position: data.position, waitMs: data.wait_ms } : null);
+    } else if (data.type === 'stream_end') {
+      streamResumeRef.current = null;
+      setQueueStatus(null);
+      setIsLoading(false);
+    } else if (data.type === 'error') {
+      console.error("Backend Error:", data.message);
+      setQueueStatus(null);
+      setIsLoading(false);
+    }
+  };
+
+  const attachSocketHandlers = (socket: WebSocket) => {
+    socket.onmessage = (event) => {
+      try {
+        handleServerEvent(JSON.parse(event.data));
+      } catch (e) {
+        console.error("Failed to parse message or process chunk:", e, event.data);
+        setIsLoading(false);
+      }
+    };
+    socket.onerror = (error) => console.error('WebSocket error:', error);
+    socket.onclose = () => {
+      console.log(`WebSocket for session ${currentSocketSessionId.current} disconnected`);
+      // Cevap akarken bağlantı koptuysa kısa bir süre sonra kaldığımız yerden devam et;
+      // sunucu üretimi sürdürür ve kaçırılan olayları yeniden gönderir
+      const sessionId = currentSocketSessionId.current;
+      if (sessionId !== null && streamResumeRef.current) {
+        reconnectTimerRef.current = window.setTimeout(() => openSessionSocket(sessionId), 1000);
+      }
+    };
+  };
+
+  const openSessionSocket = (sessionId: number) => {
+    const resume = streamResumeRef.current;
+    const resumeQuery = resume ? `?stream_id=${resume.streamId}&last_seq=${resume.lastSeq}` : '';
+    const socket = new WebSocket(`${WS_BASE_URL}/${sessionId}${resumeQuery}`);
+    socketRef.current = socket;
+    currentSocketSessionId.current = sessionId;
+    socket.onopen = () => console.log(`WebSocket connected for session ${sessionId}`);
+    attachSocketHandlers(socket);
+    return socket;
+  };
+
+  const closeSocket = () => {
+    if (reconnectTimerRef.current !== null) {
+      window.clearTimeout(reconnectTimerRef.current);
+      reconnectTimerRef.current = null;
+    }
+    if (socketRef.current) {
+      socketRef.current.onclose = null; // Reconnect döngüsünü engellemek için
+      socketRef.current.close();
+      socketRef.current = null;
+    }
+  };
+
   // WebSocket bağlantısını yöneten ana useEffect
   useEffect(() => {
     // Bu useEffect, activeSessionId değiştiğinde çalışır.
@@ -53,12 +214,9 @@ const ChatWindow: React.FC<ChatWindowProps> = ({ activeSessionId, onSessionCreat
     // "Yeni sohbet" modundaysak (kullanıcı henüz mesaj göndermedi), bağlantı kurma.
     if (activeSessionId === null) {
       // Önceki bağlantıyı kapat
-      if (socketRef.current) {
-        socketRef.current.onclose = null;
-        socketRef.current.close();
-        socketRef.current = null;
-      }
+      closeSocket();
       currentSocketSessionId.current = null;
+      streamResumeRef.current = null;
       return;
     }
 
@@ -70,84 +228,16 @@ const ChatWindow: React.FC<ChatWindowProps> = ({ activeSessionId, onSessionCreat
       return;
     }
     
-    // Önceki bağlantıyı kapat (eğer farklı bir session için açıksa)
-    if (socketRef.current) {
-      socketRef.current.onclose = null; // Reconnect döngüsünü engellemek için
-      socketRef.current.close();
-    }
+    // Önceki bağlantıyı kapat (eğer farklı bir session için açıksa).
+    // Başka bir sohbete geçiliyor: sunucu o sohbette süren bir üretim varsa baştan oynatır
+    closeSocket();
+    streamResumeRef.current = null;
 
     // Mevcut bir sohbet için yeni bağlantı kur
-    const socket = new WebSocket(`${WS_BASE_URL}/${activeSessionId}`);
-    socketRef.current = socket;
-    currentSocketSessionId.current = activeSessionId;
-
-    socket.onopen = () => console.log(`WebSocket connected for session ${activeSessionId}`);
-
-    socket.onmessage = (event) => {
-      // Mesaj işleme mantığını buraya taşıyoruz, useCallback'den çıkarıyoruz
-      try {
-        const data = JSON.parse(event.data);
-        
-        // Bu session'a ait geçmiş mesajlar ilk bağlantıda gönderilir
-        if (data.type === 'chat_history') {
-            setMessages(data.messages || []);
-            setIsLoading(false);
-            return;
-        }
-
-        if (data.type === 'chat_message') {
-          if (!isLoading) setIsLoading(true); // Bunu onmessage içinde yönetmek daha güvenli
-          setMessages((prev) => {
-            const lastMessage = prev[prev.length - 1];
-            if (lastMessage?.role === 'assistant') {
-              return [...prev.slice(0, -1), { ...lastMessage, content: lastMessage.content + data.content }];
-            }
-            return [...prev, { role: 'assistant', content: data.content }];
-          });
-        } else if (data.type === 'reasoning') {
-          // Reasoning içeriği (GPT-5 gibi reasoning modelleri için)
-          if (!isLoading) setIsLoading(true);
-          setMessages((prev) => {
-            const lastMessage = prev[prev.length - 1];
-            if (lastMessage?.role === 'assistant') {
-              const existingReasoning = lastMessage.reasoning || '';
-              return [...prev.slice(0, -1), { ...lastMessage, reasoning: existingReasoning + data.content }];
-            }
-            return [...prev, { role: 'assistant', content: '', reasoning: data.content }];
-          });
-        } else if (data.type === 'image') {
-          // Görsel mesajı ekle
-          setMessages((prev) => {
-            const lastMessage = prev[prev.length - 1];
-            if (lastMessage?.role === 'assistant') {
-              const existingImages = lastMessage.images || [];
-              if (!existingImages.includes(data.image_url)) {
-                return [...prev.slice(0, -1), { ...lastMessage, images: [...existingImages, data.image_url] }];
-              }
-              return prev;
-            }
-            return [...prev, { role: 'assistant', content: '', images: [data.image_url] }];
-          });
-        } else if (data.type === 'stream_end') {
-          setIsLoading(false);
-        } else if (data.type === 'error') {
-          console.error("Backend Error:", data.message);
-          setIsLoading(false);
-        }
-      } catch (e) {
-        console.error("Failed to parse message or process chunk:", e, event.data);
-        setIsLoading(false);
-      }
-    };
-
-    socket.onerror = (error) => console.error('WebSocket error:', error);
-    socket.onclose = () => console.log(`WebSocket for session ${activeSessionId} disconnected`);
+    openSessionSocket(activeSessionId);
 
     // Component unmount olduğunda veya ID değiştiğinde bu cleanup fonksiyonu çalışır
-    return () => {
-      socket.onclose = null; // Reconnect döngüsünü engellemek için
-      socket.close();
-    };
+    return () => closeSocket();
   }, [activeSessionId]); // Sadece activeSessionId değiştiğinde çalışsın
 
   const handleSubmit = (e: FormEvent) => {
@@ -156,6 +246,8 @@ const ChatWindow: React.FC<ChatWindowProps> = ({ activeSessionId, onSessionCreat
 
     const userMessage: Message = { role: 'user', content: input };
     const newMessages = [...messages, userMessage];
+    // Sadece yeni mesaj gönderilir; geçmiş sunucu tarafında tutulur. Model oturum başına mesajla birlikte gider
+    const outgoingFrame = JSON.stringify({ type: 'message', content: userMessage.content, model: selectedModel || undefined });
 
     setMessages(newMessages);
     setInput('');
@@ -163,82 +255,21 @@ const ChatWindow: React.FC<ChatWindowProps> = ({ activeSessionId, onSessionCreat
 
     // Eğer bu yeni bir sohbetse (activeSessionId null ise), /new adresine bağlan ve ilk mesajı gönder
     if (activeSessionId === null) {
-      const newSocket = new WebSocket(`${WS_BASE_URL}/new`);
+      const params = new URLSearchParams({ client_id: getClientId() });
+      if (selectedModel) params.set('model', selectedModel);
+      const newSocket = new WebSocket(`${WS_BASE_URL}/new?${params}`);
       socketRef.current = newSocket;
 
       newSocket.onopen = () => {
-        newSocket.send(JSON.stringify(newMessages));
+        newSocket.send(outgoingFrame);
       };
 
       // Bu yeni soketin de mesajları işlemesi lazım
-      newSocket.onmessage = (event) => {
-        try {
-          const data = JSON.parse(event.data);
-          
-          if (data.type === 'session_created') {
-            // Backend'den yeni session ID'si geldi, App.tsx'i bilgilendir
-            // Ancak mevcut WebSocket bağlantısını KAPATMIYORUZ!
-            // Backend aynı bağlantıyı kullanmaya devam edecek
-            currentSocketSessionId.current = data.session_id;
-            setIsNewSessionCreating(true);
-            onSessionCreated({ id: data.session_id, created_at: new Date().toISOString() });
-            setIsNewSessionCreating(false);
-            console.log(`Session created with ID: ${data.session_id}, keeping WebSocket connection open`);
-            return;
-          }
-          
-          // Normal mesaj işleme mantığı
-          if (data.type === 'chat_message') {
-            if (!isLoading) setIsLoading(true);
-            setMessages((prev) => {
-              const lastMessage = prev[prev.length - 1];
-              if (lastMessage?.role === 'assistant') {
-                return [...prev.slice(0, -1), { ...lastMessage, content: lastMessage.content + data.content }];
-              }
-              return [...prev, { role: 'assistant', content: data.content }];
-            });
-          } else if (data.type === 'reasoning') {
-            // Reasoning içeriği (GPT-5 gibi reasoning modelleri için)
-            if (!isLoading) setIsLoading(true);
-            setMessages((prev) => {
-              const lastMessage = prev[prev.length - 1];
-              if (lastMessage?.role === 'assistant') {
-                const existingReasoning = lastMessage.reasoning || '';
-                return [...prev.slice(0, -1), { ...lastMessage, reasoning: existingReasoning + data.content }];
-              }
-              return [...prev, { role: 'assistant', content: '', reasoning: data.content }];
-            });
-          } else if (data.type === 'image') {
-            // Görsel mesajı ekle
-            setMessages((prev) => {
-              const lastMessage = prev[prev.length - 1];
-              if (lastMessage?.role === 'assistant') {
-                const existingImages = lastMessage.images || [];
-                if (!existingImages.includes(data.image_url)) {
-                  return [...prev.slice(0, -1), { ...lastMessage, images: [...existingImages, data.image_url] }];
-                }
-                return prev;
-              }
-              return [...prev, { role: 'assistant', content: '', images: [data.image_url] }];
-            });
-          } else if (data.type === 'stream_end') {
-            setIsLoading(false);
-          } else if (data.type === 'error') {
-            console.error("Backend Error:", data.message);
-            setIsLoading(false);
-          }
-        } catch (e) {
-          console.error("Failed to parse message or process chunk:", e, event.data);
-          setIsLoading(false);
-        }
-      };
-
-      newSocket.onerror = (error) => console.error('New chat WebSocket error:', error);
-      newSocket.onclose = () => console.log('New chat WebSocket disconnected');
+      attachSocketHandlers(newSocket);
     } 
     // Mevcut sohbetse, açık olan bağlantıdan gönder
     else if (socketRef.current && socketRef.current.readyState === WebSocket.OPEN) {
-      socketRef.current.send(JSON.stringify(newMessages));
+      socketRef.current.send(outgoingFrame);
     } else {
       console.error("WebSocket is not open. Reconnecting might be in progress.");
       setIsLoading(false);
@@ -250,6 +281,11 @@ const ChatWindow: React.FC<ChatWindowProps> = ({ activeSessionId, onSessionCreat
   return (
       <div className="chat-container">
         <div className="messages">
+          {olderMessagesCursor !== null && (
+            <button onClick={loadOlderMessages} className="load-more-btn">
+              Önceki mesajlar
+            </button>
+          )}
           {messages.map((msg, index) => (
             <div key={index}>
               {/* Cache sınırını göstermek için renkli çizgi */}
@@ -265,7 +301,7 @@ const ChatWindow: React.FC<ChatWindowProps> = ({ activeSessionId, onSessionCreat
                     {msg.images.map((imageUrl, imgIndex) => (
                       <img 
                         key={imgIndex} 
-                        src={imageUrl} 
+                        src={resolveImageUrl(imageUrl)} 
                         alt={`Generated image ${imgIndex + 1}`}
                         style={{ maxWidth: '100%', height: 'auto', marginBottom: '10px', borderRadius: '8px' }}
                       />
@@ -302,6 +338,11 @@ const ChatWindow: React.FC<ChatWindowProps> = ({ activeSessionId, onSessionCreat
               </div>
             </div>
           ))}
+          {queueStatus && (
+            <div className="queue-status">
+              Sırada {queueStatus.position}. (≈{Math.round(queueStatus.waitMs / 1000)} sn bekleniyor)
+            </div>
+          )}
           <div ref={messagesEndRef} />
         </div>
         <form onSubmit={handleSubmit} className="message-form">
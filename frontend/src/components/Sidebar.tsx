@@ -5,9 +5,11 @@ interface SidebarProps {
   onNewChat: () => void;
   onSelectSession: (id: number) => void;
   activeSessionId: number | null;
+  hasMore: boolean;
+  onLoadMore: () => void;
 }
 
-const Sidebar: React.FC<SidebarProps> = ({ sessions, onNewChat, onSelectSession, activeSessionId }) => {
+const Sidebar: React.FC<SidebarProps> = ({ sessions, onNewChat, onSelectSession, activeSessionId, hasMore, onLoadMore }) => {
 
     return (
     <div className="sidebar">
@@ -24,6 +26,11 @@ const Sidebar: React.FC<SidebarProps> = ({ sessions, onNewChat, onSelectSession,
             Chat #{session.id}
           </div>
         ))}
+        {hasMore && (
+          <button onClick={onLoadMore} className="load-more-btn">
+            Daha fazla
+          </button>
+        )}
       </div>
     </div>
   );